@@ -0,0 +1,937 @@
+"""
+Micro-benchmarks for the analytics code paths.
+
+    python bench.py optimizer [--sizes 5 10 25 50 100] [--days 500] [--repeat 3]
+    python bench.py spikes [--sizes 10 100 1000] [--repeat 3]
+    python bench.py signals [--sizes 5 20 100 500] [--days 252] [--repeat 20]
+    python bench.py diversity [--accounts 100 1000 10000] [--holdings 25]
+    python bench.py currency [--sizes 1000 100000] [--repeat 5]
+    python bench.py search [--symbols 50000] [--repeat 20]
+    python bench.py load [--url http://127.0.0.1:8787 | --spawn] [--concurrency 32] [--duration 10]
+    python bench.py suite [--sizes 5 25 100] [--periods 1y 2y 5y] [--http] [--out run.json] [--compare base.json]
+
+`suite` runs the public entry points end to end on a deterministic offline
+market (no network) and writes JSON; --compare exits non-zero when a timing
+is more than --tolerance slower than in the baseline run.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+def synthetic_returns(n_tickers: int, n_days: int = 500, seed: int = 0) -> np.ndarray:
+    """Daily returns from a 3-factor model with per-ticker drift, reproducible by seed."""
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0.0, 0.01, size=(n_days, 3))
+    loadings = rng.normal(0.8, 0.4, size=(3, n_tickers))
+    drift = rng.normal(0.0004, 0.0006, size=n_tickers)
+    noise = rng.normal(0.0, 0.015, size=(n_days, n_tickers))
+    return factors @ loadings + drift + noise
+
+
+def synthetic_prices(n_tickers: int, n_days: int = 1260, seed: int = 0, end: str = "2025-06-30"):
+    """Daily close DataFrame (business days ending at `end`) built from synthetic_returns."""
+    import pandas as pd
+
+    returns = synthetic_returns(n_tickers, n_days, seed)
+    closes = 100.0 * np.cumprod(1.0 + returns, axis=0)
+    index = pd.bdate_range(end=end, periods=n_days, name="Date")
+    return pd.DataFrame(closes, index=index, columns=[f"T{i:04d}" for i in range(n_tickers)])
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_optimizer(sizes: list[int], days: int, repeat: int, legacy_max: int) -> list[dict]:
+    from scipy.optimize import minimize
+
+    from optimize import SharpeProblem, neg_sharpe
+
+    def legacy(returns):
+        # Pre-engine path: covariance rebuilt per call, finite-difference gradients
+        n = returns.shape[1]
+        minimize(
+            neg_sharpe,
+            np.full(n, 1.0 / n),
+            args=(returns, 0.0),
+            method="SLSQP",
+            bounds=[(0.0, 1.0)] * n,
+            constraints={"type": "eq", "fun": lambda w: w.sum() - 1.0},
+            options={"ftol": 1e-9, "maxiter": 1000},
+        )
+
+    rows = []
+    for n in sizes:
+        returns = synthetic_returns(n, days)
+        row = {"tickers": n, "days": days}
+        if n <= legacy_max:
+            row["legacy_ms"] = round(_best_of(lambda: legacy(returns), repeat), 2)
+        row["slsqp_ms"] = round(_best_of(lambda: SharpeProblem(returns).solve("slsqp"), repeat), 2)
+        row["qp_ms"] = round(_best_of(lambda: SharpeProblem(returns).solve("qp"), repeat), 2)
+        rows.append(row)
+    return rows
+
+
+def _legacy_monthly_spike_patterns(close_5y, tickers: list[str]) -> dict:
+    """compute_monthly_spike_patterns before vectorization (iterrows + per-ticker groupby)."""
+    import pandas as pd
+
+    from compute_volatility import MONTH_NAMES
+
+    if close_5y.empty:
+        return {t: [] for t in tickers}
+    monthly = close_5y.resample('ME').last()
+    monthly_returns = monthly.pct_change().dropna()
+    if monthly_returns.empty or len(monthly_returns) < 6:
+        return {t: [] for t in tickers}
+
+    n = len(monthly_returns.columns)
+    external = pd.Series(False, index=monthly_returns.index)
+    if n >= 3:
+        for date, row in monthly_returns.iterrows():
+            vals = row.dropna()
+            if len(vals) < max(3, n * 0.5):
+                continue
+            big_up   = (vals >  0.03).sum() / len(vals)
+            big_down = (vals < -0.03).sum() / len(vals)
+            if big_up > 0.6 or big_down > 0.6:
+                external[date] = True
+
+    filtered = monthly_returns[~external]
+    result = {}
+    for ticker in tickers:
+        if ticker not in filtered.columns:
+            result[ticker] = []
+            continue
+        series = filtered[ticker].dropna()
+        if len(series) < 4:
+            result[ticker] = []
+            continue
+        monthly_avg   = series.groupby(series.index.month).mean()
+        monthly_count = series.groupby(series.index.month).count()
+        spike_months = []
+        for month_num, avg_ret in monthly_avg.items():
+            if monthly_count.get(month_num, 0) < 2:
+                continue
+            if abs(avg_ret) > 0.02:
+                spike_months.append({
+                    "month":     MONTH_NAMES[month_num - 1],
+                    "direction": "up" if avg_ret > 0 else "down",
+                    "avg_pct":   round(avg_ret * 100, 1),
+                })
+        spike_months.sort(key=lambda x: abs(x["avg_pct"]), reverse=True)
+        result[ticker] = spike_months[:4]
+    return result
+
+
+def bench_spikes(sizes: list[int], repeat: int) -> list[dict]:
+    from compute_volatility import monthly_spike_patterns_from_prices
+
+    rows = []
+    for n in sizes:
+        close = synthetic_prices(n, seed=n)
+        tickers = list(close.columns)
+        legacy = _legacy_monthly_spike_patterns(close, tickers)
+        vectorized = monthly_spike_patterns_from_prices(close, tickers)
+        rows.append({
+            "tickers": n,
+            "legacy_ms": round(_best_of(lambda: _legacy_monthly_spike_patterns(close, tickers), repeat), 2),
+            "vector_ms": round(_best_of(lambda: monthly_spike_patterns_from_prices(close, tickers), repeat), 2),
+            "identical": legacy == vectorized,
+        })
+    return rows
+
+
+def _legacy_volatility_signals(close_prices) -> dict:
+    """compute_volatility_signals before the latest-only engine (full rolling series)."""
+    daily_returns = close_prices.pct_change().dropna()
+    vol20  = daily_returns.rolling(20).std().iloc[-1]  * np.sqrt(252)
+    vol120 = daily_returns.rolling(120).std().iloc[-1] * np.sqrt(252)
+    ret20  = (1 + daily_returns).rolling(20).apply(np.prod, raw=True).iloc[-1] - 1
+    out = {}
+    for ticker in daily_returns.columns:
+        v20, v120, r20 = vol20.get(ticker, np.nan), vol120.get(ticker, np.nan), ret20.get(ticker, np.nan)
+        spike = bool(np.isfinite(v20) and np.isfinite(v120) and v20 > 1.5 * v120)
+        out[ticker] = {
+            "vol20":            round(float(v20),  6) if np.isfinite(v20)  else None,
+            "vol120":           round(float(v120), 6) if np.isfinite(v120) else None,
+            "volatility_spike": spike,
+            "spike_direction":  ("up" if r20 >= 0 else "down") if (spike and np.isfinite(r20)) else None,
+        }
+    return out
+
+
+def bench_signals(sizes: list[int], days: int, repeat: int) -> list[dict]:
+    from compute_volatility import compute_volatility_history, compute_volatility_signals
+
+    rows = []
+    for n in sizes:
+        close = synthetic_prices(n, n_days=days, seed=n)
+        legacy = _legacy_volatility_signals(close)
+        latest = compute_volatility_signals(close)["annualized_volatility"]
+        latest = {t: {k: v for k, v in m.items() if k != "spike_months"} for t, m in latest.items()}
+
+        history = compute_volatility_history(close)
+        daily = close.pct_change().dropna()
+        reference = daily.rolling(120).std() * np.sqrt(252)
+        rows.append({
+            "tickers": n,
+            "legacy_ms": round(_best_of(lambda: _legacy_volatility_signals(close), repeat), 3),
+            "latest_ms": round(_best_of(lambda: compute_volatility_signals(close), repeat), 3),
+            "history_ms": round(_best_of(lambda: compute_volatility_history(close), repeat), 3),
+            "identical": legacy == latest,
+            "history_err": float(np.nanmax(np.abs(history["vol120"].to_numpy() - reference.to_numpy()))),
+        })
+    return rows
+
+
+_NAME_WORDS = [
+    "global", "american", "energy", "capital", "systems", "holdings", "pharma", "bank", "digital",
+    "resources", "industries", "technologies", "financial", "health", "motors", "foods", "networks",
+    "realty", "partners", "solutions", "semiconductor", "airlines", "retail", "mining", "therapeutics",
+]
+_SECTORS = ["Tech", "Energy", "Healthcare", "Finance", "Utilities & power", "Retail", "Other"]
+
+
+def synthetic_market_rows(n: int, seed: int = 0) -> list[dict[str, str]]:
+    """`n` unique reference rows shaped like stock_market.csv entries."""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    symbols: set[str] = set()
+    while len(symbols) < n:
+        length = int(rng.integers(1, 6))
+        symbols.add("".join(rng.choice(letters, size=length)))
+    rows = []
+    for symbol in sorted(symbols):
+        words = rng.choice(_NAME_WORDS, size=int(rng.integers(1, 4)), replace=False)
+        rows.append({
+            "name": f"{symbol.title()} " + " ".join(w.title() for w in words),
+            "symbol": symbol,
+            "sector": str(rng.choice(_SECTORS)),
+            "industry": "",
+            "market": "",
+        })
+    return rows
+
+
+def _legacy_list_stock_choices(rows, search=None, sector=None, limit=200):
+    """list_stock_choices before the index: linear scan + full sort per call."""
+    out = []
+    search_norm = (search or "").strip().lower()
+    sector_norm = (sector or "").strip().lower()
+    for item in rows:
+        if search_norm and search_norm not in f'{item["symbol"]} {item["name"]}'.lower():
+            continue
+        if sector_norm and item["sector"].lower() != sector_norm:
+            continue
+        out.append(item)
+    out.sort(key=lambda r: (r["symbol"], r["name"]))
+    return out[:limit] if limit is not None and limit > 0 else out
+
+
+def bench_search(n_symbols: int, repeat: int) -> list[dict]:
+    from stock_search import StockSearchIndex
+
+    rows = synthetic_market_rows(n_symbols)
+    start = time.perf_counter()
+    index = StockSearchIndex(rows)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    queries = [("a", None, 700), ("ab", None, 700), ("bank", None, 700), ("tech", None, 20),
+               ("ener", "Energy", 700), ("", "Finance", 700), ("zzzzz", None, 700), ("capital sys", None, 20)]
+    table = []
+    for search, sector, limit in queries:
+        same = (
+            {r["symbol"] for r in index.search(search, sector, None)}
+            == {r["symbol"] for r in _legacy_list_stock_choices(rows, search, sector, None)}
+        )
+        table.append({
+            "query": search or "-",
+            "sector": sector or "-",
+            "limit": limit,
+            "legacy_ms": round(_best_of(lambda: _legacy_list_stock_choices(rows, search, sector, limit), repeat), 3),
+            "index_ms": round(_best_of(lambda: index.search(search, sector, limit), repeat), 3),
+            "same_set": same,
+        })
+    print(f"{n_symbols} symbols, index build {build_ms:.0f} ms")
+    return table
+
+
+def synthetic_accounts(n_accounts: int, holdings: int = 25, seed: int = 0) -> list[list[dict]]:
+    """Broker-style holdings rows drawn from the reference symbols, with string currency values."""
+    from reference_data import SECURITIES
+
+    rng = np.random.default_rng(seed)
+    symbols = list(SECURITIES.symbols) + ["VTSAX", "FXAIX", "CASH"]
+    accounts = []
+    for _ in range(n_accounts):
+        picks = rng.choice(symbols, size=int(rng.integers(1, holdings + 1)))
+        values = rng.lognormal(8, 1.5, size=len(picks))
+        accounts.append([{"symbol": str(s), "currentValue": f"${v:,.2f}"} for s, v in zip(picks, values)])
+    return accounts
+
+
+def bench_diversity(sizes: list[int], holdings: int) -> list[dict]:
+    from diversity import portfolio_diversity, portfolio_diversity_batch
+
+    rows = []
+    for n in sizes:
+        accounts = synthetic_accounts(n, holdings, seed=n)
+        single_s = _best_of(lambda: [portfolio_diversity(a) for a in accounts], 3) / 1000
+        batch_s = _best_of(lambda: portfolio_diversity_batch(accounts), 3) / 1000
+        rows.append({
+            "accounts": n,
+            "single_acct_s": round(n / single_s),
+            "batch_acct_s": round(n / batch_s),
+            "identical": [portfolio_diversity(a) for a in accounts] == portfolio_diversity_batch(accounts),
+        })
+    return rows
+
+
+_CURRENCY_FORMATS = [
+    lambda v: f"${v:,.2f}",
+    lambda v: f"-${v:,.2f}",
+    lambda v: f"(${v:,.2f})",
+    lambda v: f"{v:.2f}",
+    lambda v: f"{v:,.2f} €".replace(",", " ").replace(".", ","),
+    lambda v: "--",
+]
+
+
+def synthetic_currency_cells(n: int, seed: int = 0, plain_share: float = 0.5) -> list:
+    """Holdings value cells: a mix of JSON numbers and the string formats brokers export."""
+    rng = np.random.default_rng(seed)
+    amounts = rng.lognormal(8, 1.5, size=n)
+    kinds = rng.integers(0, len(_CURRENCY_FORMATS), size=n)
+    numeric = rng.random(n) < plain_share / 2
+    return [
+        round(float(v), 2) if is_num else _CURRENCY_FORMATS[k](float(v))
+        for v, k, is_num in zip(amounts, kinds, numeric)
+    ]
+
+
+def _legacy_parse_num(v) -> float:
+    import re
+
+    if isinstance(v, (int, float)):
+        return float(v)
+    try:
+        return float(re.sub(r"[^0-9.\-]", "", str(v)))
+    except ValueError:
+        return 0.0
+
+
+def bench_currency(sizes: list[int], repeat: int) -> list[dict]:
+    from currency import _parse_text, parse_currency, parse_currency_column
+
+    def cold(fn):
+        def run():
+            _parse_text.cache_clear()
+            fn()
+        return run
+
+    rows = []
+    for n in sizes:
+        cells = synthetic_currency_cells(n, seed=n)
+        timings = {
+            "legacy": lambda: [_legacy_parse_num(v) for v in cells],
+            "scalar_cold": cold(lambda: [parse_currency(v) for v in cells]),
+            "scalar_warm": lambda: [parse_currency(v) for v in cells],
+            "column": cold(lambda: parse_currency_column(cells)),
+        }
+        row = {"cells": n}
+        for name, fn in timings.items():
+            fn()
+            row[f"{name}_M/s"] = round(n / _best_of(fn, repeat) / 1000, 2)
+        row["agree"] = bool(np.array_equal(parse_currency_column(cells), [parse_currency(v) for v in cells]))
+        rows.append(row)
+    return rows
+
+
+def _http(url: str, payload: dict | None = None, timeout: float = 60.0) -> tuple[int, float]:
+    """(status, latency ms) for a GET, or a JSON POST when payload is given."""
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as exc:
+        status = exc.code
+    except (urllib.error.URLError, TimeoutError):
+        status = 0
+    return status, (time.perf_counter() - start) * 1000
+
+
+def _percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {}
+    values = np.asarray(samples)
+    return {f"p{q}": round(float(np.percentile(values, q)), 2) for q in (50, 90, 99)} | {"n": len(samples)}
+
+
+def _spawn_server(port: int) -> subprocess.Popen:
+    """Start the API on `port` against the bundled offline prices."""
+    env = {**os.environ, "PRICE_SOURCE": "csv"}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+    )
+    for _ in range(100):
+        if _http(f"http://127.0.0.1:{port}/health", timeout=1.0)[0] == 200:
+            return proc
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("server did not become healthy")
+
+
+def bench_load(
+    url: str,
+    concurrency: int,
+    duration: float,
+    tickers: list[str],
+    heavy: list[tuple[str, dict]] | None = None,
+) -> dict:
+    """
+    Saturate the heavy endpoints with `concurrency` clients while probing the
+    cheap ones, and report probe latency plus heavy status counts (503 = shed).
+    """
+    if heavy is None:
+        heavy = [
+            ("/api/optimize", {"tickers": tickers, "period": "1y"}),
+            ("/api/volatality_anal", {"tickers": tickers, "period": "1y"}),
+        ]
+    deadline = time.perf_counter() + duration
+    heavy_status: dict[int, int] = {}
+    heavy_latency: list[float] = []
+    heavy_by_route: dict[str, list[float]] = {path: [] for path, _ in heavy}
+    probes: dict[str, list[float]] = {"/health": [], "/api/stocks?search=a&limit=20": []}
+    lock = threading.Lock()
+
+    def _heavy_client(k: int):
+        i = k
+        while time.perf_counter() < deadline:
+            path, payload = heavy[i % len(heavy)]
+            status, ms = _http(url + path, payload)
+            with lock:
+                heavy_status[status] = heavy_status.get(status, 0) + 1
+                if status == 200:
+                    heavy_latency.append(ms)
+                    heavy_by_route[path].append(ms)
+            if status == 503:
+                time.sleep(0.05)
+            i += 1
+
+    def _prober():
+        while time.perf_counter() < deadline:
+            for path, samples in probes.items():
+                status, ms = _http(url + path)
+                if status == 200:
+                    samples.append(ms)
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=_heavy_client, args=(k,)) for k in range(concurrency)]
+    threads.append(threading.Thread(target=_prober))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return {
+        "heavy_status": {str(k): v for k, v in sorted(heavy_status.items())},
+        "heavy_ms": _percentiles(heavy_latency),
+        "heavy_ms_by_route": {path: _percentiles(samples) for path, samples in heavy_by_route.items()},
+        **{f"probe {path}": _percentiles(samples) for path, samples in probes.items()},
+    }
+
+
+# ── Regression suite ────────────────────────────────────────────────────────
+
+class BenchFetcher:
+    """
+    Deterministic offline price provider for the suite.
+
+    Tickers in stocks_2y.csv are served from it unchanged. Every other ticker
+    gets a synthetic close series over the `n_days` business days ending on
+    the CSV's last date. The series is a beta to the CSV's equal-weight market
+    return (resampled to the longer calendar) plus idiosyncratic noise, at a
+    volatility drawn from the CSV tickers' residuals. Each series is seeded by
+    (seed, ticker), so it does not depend on what else is requested.
+    """
+
+    def __init__(self, n_days: int = 1320, seed: int = 0):
+        import pandas as pd
+
+        from price_store import CsvFetcher
+
+        self.csv = CsvFetcher()
+        self.seed = seed
+        self.calls = 0
+        self.last_date = self.csv.last_date
+        self.index = pd.bdate_range(end=self.csv.frame.index[-1], periods=n_days, name="Date")
+
+        returns = self.csv.frame.pct_change(fill_method=None).iloc[1:]
+        market = returns.mean(axis=1).fillna(0.0).to_numpy()
+        self.market = np.random.default_rng(seed).choice(market, size=n_days)
+        self.residual_vols = returns.sub(market, axis=0).std().dropna().to_numpy()
+        self._closes: dict[str, np.ndarray] = {}
+
+    def closes(self, ticker: str) -> np.ndarray:
+        if ticker not in self._closes:
+            rng = np.random.default_rng([self.seed, zlib.crc32(ticker.encode())])
+            beta = rng.normal(1.0, 0.3)
+            drift = rng.normal(0.0003, 0.0004)
+            vol = rng.choice(self.residual_vols)
+            returns = drift + beta * self.market + rng.normal(0.0, vol, size=len(self.market))
+            self._closes[ticker] = 100.0 * np.cumprod(1.0 + np.clip(returns, -0.9, None))
+        return self._closes[ticker]
+
+    def __call__(self, tickers: list[str], start, end):
+        import pandas as pd
+
+        self.calls += 1
+        real = [t for t in tickers if t in self.csv.frame.columns]
+        frame = pd.DataFrame({t: self.closes(t) for t in tickers if t not in real}, index=self.index)
+        if real:
+            frame = frame.join(self.csv.frame[real], how="outer")
+        return frame.loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+
+def use_bench_store(seed: int = 0):
+    """Point the shared price store (and with it the returns cache) at a fresh BenchFetcher."""
+    import price_store
+
+    fetcher = BenchFetcher(seed=seed)
+    store = price_store.PriceStore(cache_dir=None, fetcher=fetcher, today=lambda: fetcher.last_date)
+    price_store.set_store(store)
+    return store
+
+
+def bench_universe(n: int, seed: int = 0) -> list[str]:
+    """
+    `n` reference symbols in a seeded order, so holdings have real sectors and
+    simulate-add accepts them. Symbols in stocks_2y.csv are left out: their one
+    year of history would cap every longer period.
+    """
+    from price_store import CsvFetcher
+    from reference_data import SECURITIES
+
+    in_csv = set(CsvFetcher().frame.columns)
+    symbols = [s for s in dict.fromkeys(SECURITIES.symbols) if s not in in_csv]
+    order = np.random.default_rng(seed).permutation(len(symbols))
+    return [symbols[i] for i in order[:n]]
+
+
+def _once_ms(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def _holdings(tickers: list[str], seed: int = 0) -> list[dict]:
+    values = np.random.default_rng(seed).lognormal(8, 1.0, size=len(tickers))
+    return [{"symbol": t, "currentValue": f"${v:,.2f}"} for t, v in zip(tickers, values)]
+
+
+def suite_optimize(store, sizes: list[int], periods: list[str], repeat: int) -> list[dict]:
+    from optimize import optimize_sharpe
+    from returns_cache import get_cache, get_moments
+
+    rows = []
+    for period in periods:
+        for n in sizes:
+            tickers = bench_universe(n)
+            store.get_close_prices(tickers, period)  # prices in memory; timings cover alignment onwards
+            get_cache().invalidate()
+            cold = _once_ms(lambda: optimize_sharpe(tickers, period))
+            result = optimize_sharpe(tickers, period)
+            rows.append({
+                "tickers": n,
+                "period": period,
+                "days": len(get_moments(tickers, period).returns),
+                "cold_ms": round(cold, 2),
+                "warm_ms": round(_best_of(lambda: optimize_sharpe(tickers, period), repeat), 2),
+                "sharpe": result["sharpe"],
+            })
+    return rows
+
+
+def suite_estimators(store, sizes: list[int], repeat: int) -> list[dict]:
+    from covariance import ESTIMATORS
+    from optimize import _load_moments, optimize_sharpe_moments
+
+    rows = []
+    for n in sizes:
+        tickers = bench_universe(n)
+        for estimator in ESTIMATORS:
+            moments = _load_moments(tickers, "1y", estimator)
+            solve = lambda: optimize_sharpe_moments(moments.mu, moments.cov, moments.tickers, method="qp")
+            rows.append({
+                "tickers": n,
+                "estimator": estimator,
+                "estimate_ms": round(_best_of(lambda: _load_moments(tickers, "1y", estimator), repeat), 2),
+                "solve_ms": round(_best_of(solve, repeat), 2),
+                "sharpe": solve()["sharpe"],
+            })
+    return rows
+
+
+def suite_volatility(store, sizes: list[int], periods: list[str], repeat: int) -> list[dict]:
+    from compute_volatility import analyze_tickers_volatility
+
+    rows = []
+    for period in periods:
+        for n in sizes:
+            tickers = bench_universe(n)
+            store.get_close_prices(tickers, "5y")
+            rows.append({
+                "tickers": n,
+                "period": period,
+                "warm_ms": round(_best_of(lambda: analyze_tickers_volatility(tickers, period), repeat), 2),
+            })
+    return rows
+
+
+def suite_simulate_add(store, sizes: list[int], repeat: int) -> list[dict]:
+    from returns_cache import get_cache
+    from test_stock import simulate_add_stock
+
+    rows = []
+    for n in sizes:
+        *tickers, added = bench_universe(n + 1)
+        holdings = _holdings(tickers)
+        store.get_close_prices([*tickers, added], "5y")
+        get_cache().invalidate()
+        cold = _once_ms(lambda: simulate_add_stock(holdings, added, 10_000.0))
+        result = simulate_add_stock(holdings, added, 10_000.0)
+        rows.append({
+            "holdings": n,
+            "cold_ms": round(cold, 2),
+            "warm_ms": round(_best_of(lambda: simulate_add_stock(holdings, added, 10_000.0), repeat), 2),
+            "sim_sharpe": result["simulated"]["optimize"].get("sharpe"),
+        })
+    return rows
+
+
+def suite_screen(store, sizes: list[int], repeat: int) -> list[dict]:
+    from returns_cache import get_cache
+    from screener import screen_additions
+
+    rows = []
+    for n in sizes:
+        holdings = _holdings(bench_universe(n))
+        get_cache().invalidate()
+        cold = _once_ms(lambda: screen_additions(holdings, 10_000.0))
+        result = screen_additions(holdings, 10_000.0, top_k=1)
+        rows.append({
+            "holdings": n,
+            "candidates": result["screened"],
+            "cold_ms": round(cold, 2),
+            "warm_ms": round(_best_of(lambda: screen_additions(holdings, 10_000.0), repeat), 2),
+            "top": result["results"][0]["symbol"],
+        })
+    return rows
+
+
+def suite_risk(store, sizes: list[int], repeat: int, paths: int = 100_000) -> list[dict]:
+    from returns_cache import get_moments
+    from risk import METHODS, portfolio_returns, simulate_risk
+
+    rows = []
+    for n in sizes:
+        moments = get_moments(bench_universe(n), "1y")
+        k = len(moments.tickers)
+        port = portfolio_returns(moments.returns, np.column_stack([np.full(k, 1 / k), np.eye(k)[0]]))
+        for method in METHODS:
+            result = simulate_risk(port, ["equal", "single"], method, paths)
+            rows.append({
+                "tickers": n,
+                "method": method,
+                "paths": paths,
+                "sim_ms": round(_best_of(lambda: simulate_risk(port, ["equal", "single"], method, paths), repeat), 2),
+                "var_95": result["equal"]["var_cvar"]["0.95"]["var"],
+            })
+    return rows
+
+
+def suite_clusters(store, sizes: list[int], repeat: int) -> list[dict]:
+    from clusters import ClusterCache, cluster_tickers
+
+    rows = []
+    for n in sizes:
+        tickers = bench_universe(n + 1)
+        store.get_close_prices(tickers, "1y")
+        cache = ClusterCache(store=store)
+        cold = _once_ms(lambda: cluster_tickers(tickers[:n], cache=cache))
+        added = _once_ms(lambda: cluster_tickers(tickers, cache=cache))
+        rows.append({
+            "tickers": n,
+            "cold_ms": round(cold, 2),
+            "add_one_ms": round(added, 2),
+            "recut_ms": round(_best_of(lambda: cluster_tickers(tickers, n_clusters=5, cache=cache), repeat), 2),
+            "clusters": cluster_tickers(tickers[:n], cache=cache)["n_clusters"],
+        })
+    return rows
+
+
+def suite_diversity(client, sizes: list[int], repeat: int) -> list[dict]:
+    rows = []
+    for n in sizes:
+        payload = {"holdings": _holdings(bench_universe(n), seed=n)}
+        response = client.post("/api/diversity", json=payload)
+        rows.append({
+            "holdings": n,
+            "warm_ms": round(_best_of(lambda: client.post("/api/diversity", json=payload), repeat), 3),
+            "hhi": response.json()["metrics"].get("hhi"),
+        })
+    return rows
+
+
+def suite_stock_choices(repeat: int) -> list[dict]:
+    from test_stock import list_stock_choices
+
+    rows = []
+    for search, sector, limit in [("", None, 200), ("a", None, 200), ("tech", None, 20), ("MSFT", None, 20),
+                                  ("", "Health & life science", 200), ("corp", None, None)]:
+        rows.append({
+            "query": search or "-",
+            "sector": sector or "-",
+            "limit": limit or "all",
+            "warm_ms": round(_best_of(lambda: list_stock_choices(search, sector, limit), repeat), 3),
+            "matches": len(list_stock_choices(search, sector, limit)),
+        })
+    return rows
+
+
+def suite_http(port: int, concurrency: int, duration: float) -> list[dict]:
+    """End-to-end load against a spawned server on the bundled CSV prices; one row per route."""
+    tickers = ["MSFT", "AMZN", "NFLX", "IBM", "AMD", "INTC", "GLD", "O"]
+    heavy = [
+        ("/api/optimize", {"tickers": tickers, "period": "1y"}),
+        ("/api/volatality_anal", {"tickers": tickers, "period": "1y"}),
+        ("/api/simulate-add", {"holdings": _holdings(tickers[:-1]), "added_symbol": tickers[-1], "added_value": 10_000.0}),
+        ("/api/diversity", {"holdings": _holdings(tickers)}),
+    ]
+    server = _spawn_server(port)
+    try:
+        report = bench_load(f"http://127.0.0.1:{port}", concurrency, duration, tickers, heavy)
+    finally:
+        server.terminate()
+        server.wait()
+    routes = {**report["heavy_ms_by_route"], **{k.removeprefix("probe "): v for k, v in report.items() if k.startswith("probe ")}}
+    return [
+        {"route": route, "concurrency": concurrency, **{f"{q}_ms": v for q, v in stats.items() if q != "n"}, "n": stats.get("n", 0)}
+        for route, stats in routes.items()
+    ] + [{"route": "status", **report["heavy_status"]}]
+
+
+_PARAM_FIELDS = ("tickers", "period", "holdings", "method", "estimator", "query", "sector", "limit", "route", "concurrency")
+
+
+def _row_key(row: dict) -> tuple:
+    return tuple((k, row[k]) for k in _PARAM_FIELDS if k in row)
+
+
+def compare_runs(current: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """Timings (fields ending in _ms) more than `tolerance` slower than the baseline row with the same parameters."""
+    regressions = []
+    for bench, rows in current["results"].items():
+        base_rows = {_row_key(r): r for r in baseline.get("results", {}).get(bench, [])}
+        for row in rows:
+            old = base_rows.get(_row_key(row))
+            if old is None:
+                continue
+            for field, value in row.items():
+                before = old.get(field)
+                if field.endswith("_ms") and isinstance(before, (int, float)) and before > 0 and value > before * (1 + tolerance):
+                    regressions.append({
+                        "bench": bench,
+                        **dict(_row_key(row)),
+                        "field": field,
+                        "baseline": before,
+                        "current": value,
+                        "ratio": round(value / before, 2),
+                    })
+    return regressions
+
+
+def _versions() -> dict:
+    import pandas as pd
+    import scipy
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scipy": scipy.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run_suite(sizes: list[int], periods: list[str], holdings: list[int], repeat: int, seed: int,
+              http: bool = False, port: int = 8799, concurrency: int = 16, duration: float = 10.0) -> dict:
+    from fastapi.testclient import TestClient
+
+    import main
+
+    store = use_bench_store(seed)
+    client = TestClient(main.app)
+    results = {}
+    for name, bench in [
+        ("optimize_sharpe", lambda: suite_optimize(store, sizes, periods, repeat)),
+        ("cov_estimators", lambda: suite_estimators(store, sizes, repeat)),
+        ("analyze_tickers_volatility", lambda: suite_volatility(store, sizes, periods, repeat)),
+        ("simulate_add_stock", lambda: suite_simulate_add(store, sizes, repeat)),
+        ("screen_additions", lambda: suite_screen(store, sizes, repeat)),
+        ("risk_simulate", lambda: suite_risk(store, sizes, repeat)),
+        ("cluster_tickers", lambda: suite_clusters(store, sizes, repeat)),
+        ("api_diversity", lambda: suite_diversity(client, holdings, repeat)),
+        ("list_stock_choices", lambda: suite_stock_choices(repeat)),
+    ]:
+        print(f"[bench] {name}", file=sys.stderr)
+        results[name] = bench()
+    if http:
+        print("[bench] http_load", file=sys.stderr)
+        results["http_load"] = suite_http(port, concurrency, duration)
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {"sizes": sizes, "periods": periods, "holdings": holdings, "repeat": repeat, "seed": seed},
+        "versions": _versions(),
+        "results": results,
+    }
+
+
+def _print_table(rows: list[dict]) -> None:
+    columns = list(dict.fromkeys(k for row in rows for k in row))
+    print("  ".join(f"{c:>10}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{str(row.get(c, '-')):>10}" for c in columns))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="suite", required=True)
+
+    opt = sub.add_parser("optimizer", help="max-Sharpe solve time vs ticker count")
+    opt.add_argument("--sizes", type=int, nargs="+", default=[5, 10, 25, 50, 100, 200])
+    opt.add_argument("--days", type=int, default=500)
+    opt.add_argument("--repeat", type=int, default=3)
+    opt.add_argument("--legacy-max", type=int, default=100, help="skip the legacy solver above this size")
+
+    spikes = sub.add_parser("spikes", help="monthly spike patterns, legacy vs vectorized")
+    spikes.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    spikes.add_argument("--repeat", type=int, default=3)
+
+    signals = sub.add_parser("signals", help="volatility signals, rolling vs latest-only")
+    signals.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 100, 500])
+    signals.add_argument("--days", type=int, default=252)
+    signals.add_argument("--repeat", type=int, default=20)
+
+    div = sub.add_parser("diversity", help="diversity scoring throughput, per-account vs batch")
+    div.add_argument("--accounts", type=int, nargs="+", default=[100, 1000, 10000])
+    div.add_argument("--holdings", type=int, default=25)
+
+    cur = sub.add_parser("currency", help="holdings value parsing, regex vs shared parser vs column variant")
+    cur.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    cur.add_argument("--repeat", type=int, default=5)
+
+    search = sub.add_parser("search", help="/api/stocks search, linear scan vs prebuilt index")
+    search.add_argument("--symbols", type=int, default=50000)
+    search.add_argument("--repeat", type=int, default=20)
+
+    load = sub.add_parser("load", help="HTTP load test: cheap endpoint latency while heavy ones are saturated")
+    load.add_argument("--url", default="http://127.0.0.1:8787")
+    load.add_argument("--spawn", action="store_true", help="start a local offline server for the run")
+    load.add_argument("--port", type=int, default=8799)
+    load.add_argument("--concurrency", type=int, default=32)
+    load.add_argument("--duration", type=float, default=10.0)
+    load.add_argument("--tickers", nargs="+", default=["MSFT", "AMZN", "NFLX", "IBM", "AMD", "INTC", "GLD", "O"])
+
+    suite = sub.add_parser("suite", help="offline regression suite over the public entry points, as JSON")
+    suite.add_argument("--sizes", type=int, nargs="+", default=[5, 25, 100], help="ticker counts")
+    suite.add_argument("--periods", nargs="+", default=["1y", "2y", "5y"])
+    suite.add_argument("--holdings", type=int, nargs="+", default=[10, 100, 500], help="/api/diversity sizes")
+    suite.add_argument("--repeat", type=int, default=3)
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--http", action="store_true", help="also load-test a spawned offline server")
+    suite.add_argument("--port", type=int, default=8799)
+    suite.add_argument("--concurrency", type=int, default=16)
+    suite.add_argument("--duration", type=float, default=10.0)
+    suite.add_argument("--out", help="write the JSON here instead of stdout")
+    suite.add_argument("--compare", help="baseline JSON from an earlier run")
+    suite.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+
+    args = parser.parse_args()
+    if args.suite == "optimizer":
+        _print_table(bench_optimizer(args.sizes, args.days, args.repeat, args.legacy_max))
+    elif args.suite == "spikes":
+        _print_table(bench_spikes(args.sizes, args.repeat))
+    elif args.suite == "signals":
+        _print_table(bench_signals(args.sizes, args.days, args.repeat))
+    elif args.suite == "diversity":
+        _print_table(bench_diversity(args.accounts, args.holdings))
+    elif args.suite == "currency":
+        _print_table(bench_currency(args.sizes, args.repeat))
+    elif args.suite == "search":
+        _print_table(bench_search(args.symbols, args.repeat))
+    elif args.suite == "load":
+        server = _spawn_server(args.port) if args.spawn else None
+        url = f"http://127.0.0.1:{args.port}" if args.spawn else args.url.rstrip("/")
+        try:
+            print(json.dumps(bench_load(url, args.concurrency, args.duration, args.tickers), indent=2))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+    elif args.suite == "suite":
+        report = run_suite(
+            args.sizes, args.periods, args.holdings, args.repeat, args.seed,
+            http=args.http, port=args.port, concurrency=args.concurrency, duration=args.duration,
+        )
+        regressions = []
+        if args.compare:
+            with open(args.compare) as f:
+                regressions = compare_runs(report, json.load(f), args.tolerance)
+            report["regressions"] = regressions
+        text = json.dumps(report, indent=2)
+        if args.out:
+            with open(args.out, "w") as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+        for r in regressions:
+            print(f"REGRESSION {r}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import price_store
+
+# ---------------------------------------------------------------------------
+# Correlation clustering of tickers, with cached distance matrices
+#
+# The distance between two tickers is sqrt((1 - rho) / 2), rho being the
+# correlation of their daily returns over the days both have one (0 for pairs
+# with fewer than MIN_OVERLAP such days), so it runs from 0 (moving together)
+# through 0.71 (uncorrelated) to 1 (opposite).  Each ticker's returns are
+# taken on its own trading days, so a ticker that trades every day (crypto)
+# leaves the stock-to-stock distances as they were.
+#
+# Each ticker set keeps its condensed distance matrix (the upper triangle,
+# row by row, as scipy's linkage takes it) and the linkages built from it,
+# so re-cutting the tree at another threshold is only an fcluster call.  New
+# tickers go in front: the condensed matrix of [new, *old] is the new ticker's
+# row followed by the old matrix unchanged, so adding a ticker to a cached set
+# computes that one row.  A subset of a cached set is read out of its matrix.
+# Both only happen when the cached set was priced on the same dates.
+#
+# Entries are evicted least-recently-used once their total size passes
+# max_bytes, and dropped when the price store merges bars inside their date
+# range for one of their tickers.
+# ---------------------------------------------------------------------------
+
+METHODS = ("average", "complete", "single", "ward")
+
+MIN_OVERLAP = 20
+
+_Key = tuple[tuple[str, ...], date, date]
+
+
+def _returns(close: pd.DataFrame) -> np.ndarray:
+    """Each column's returns between its own consecutive closes, on close's dates (NaN where it has none)."""
+    own = {t: close[t].dropna().pct_change(fill_method=None) for t in close.columns}
+    return pd.DataFrame(own, index=close.index, columns=close.columns).to_numpy(dtype=float)
+
+
+def _priced(close: pd.DataFrame) -> tuple[list[str], pd.Index, np.ndarray]:
+    """The tickers with at least one return, the dates any of them has a close, and their returns."""
+    priced = [t for t in close.columns if close[t].notna().sum() >= 2]
+    close = close[priced].dropna(how="all")
+    return priced, close.index, _returns(close)
+
+
+def _pairwise_corr(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(a columns x b columns) correlations, each pair over the rows where both have a value."""
+    ma, mb = ~np.isnan(a), ~np.isnan(b)
+    xa, xb = np.where(ma, a, 0.0), np.where(mb, b, 0.0)
+    fa, fb = ma.astype(float), mb.astype(float)
+    n = fa.T @ fb
+    sa, sb = xa.T @ fb, fa.T @ xb          # sum of a (resp. b) over the rows both have
+    saa, sbb = (xa * xa).T @ fb, fa.T @ (xb * xb)
+    sab = xa.T @ xb
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sab - sa * sb / n
+        var = (saa - sa * sa / n) * (sbb - sb * sb / n)
+        corr = cov / np.sqrt(var)
+    corr[(n < MIN_OVERLAP) | ~np.isfinite(corr)] = 0.0
+    return np.clip(corr, -1.0, 1.0)
+
+
+def _distance(corr: np.ndarray) -> np.ndarray:
+    return np.sqrt(np.clip((1.0 - corr) / 2.0, 0.0, None))
+
+
+def _condensed_index(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Position of pair (i, j), i < j, in the condensed matrix of n items."""
+    return n * i - i * (i + 1) // 2 + (j - i - 1)
+
+
+class _Entry:
+    __slots__ = ("tickers", "index", "returns", "condensed", "linkages", "nbytes")
+
+    def __init__(self, tickers: list[str], index: pd.Index, returns: np.ndarray, condensed: np.ndarray):
+        self.tickers = tickers
+        self.index = index                 # close-price dates, one returns row each
+        self.returns = returns
+        self.condensed = condensed
+        self.linkages: dict[str, np.ndarray] = {}
+        self.nbytes = returns.nbytes + condensed.nbytes + index.nbytes
+
+    @classmethod
+    def build(cls, tickers: list[str], index: pd.Index, returns: np.ndarray) -> "_Entry":
+        i, j = np.triu_indices(len(tickers), 1)
+        return cls(tickers, index, returns, _distance(_pairwise_corr(returns, returns))[i, j])
+
+    def restrict(self, keep: list[str]) -> "_Entry":
+        pos = {t: k for k, t in enumerate(self.tickers)}
+        idx = np.array([pos[t] for t in keep], dtype=int)  # keep is in entry order, so idx ascends
+        i, j = np.triu_indices(len(idx), 1)
+        condensed = self.condensed[_condensed_index(len(self.tickers), idx[i], idx[j])]
+        return _Entry(keep, self.index, self.returns[:, idx], condensed)
+
+    def prepend(self, tickers: list[str], returns: np.ndarray) -> "_Entry":
+        """Entry for [*tickers, *self.tickers]: only the new tickers' rows are computed."""
+        d_new = _distance(_pairwise_corr(returns, returns))
+        d_old = _distance(_pairwise_corr(returns, self.returns))
+        rows = [np.concatenate([d_new[k, k + 1:], d_old[k]]) for k in range(len(tickers))]
+        return _Entry(
+            [*tickers, *self.tickers],
+            self.index,
+            np.hstack([returns, self.returns]),
+            np.concatenate([*rows, self.condensed]),
+        )
+
+    def linkage(self, method: str) -> np.ndarray:
+        Z = self.linkages.get(method)
+        if Z is None:
+            Z = self.linkages[method] = build_linkage(self.condensed, method)
+        return Z
+
+
+def build_linkage(condensed: np.ndarray, method: str) -> np.ndarray:
+    from scipy.cluster.hierarchy import linkage
+
+    with metrics.span("cluster"):
+        return linkage(condensed, method=method)
+
+
+class _Job(NamedTuple):
+    """What ClusterCache.prepare hands to build_entry, and finish() needs to cache the result."""
+
+    requested: _Key
+    versions: dict[str, int]
+    generation: int
+    priced: list[str]
+    index: pd.Index
+    returns: np.ndarray
+    base: _Entry | None
+
+
+def build_entry(priced: list[str], index: pd.Index, returns: np.ndarray, base: _Entry | None = None) -> tuple[_Entry, int]:
+    """
+    (entry for `priced`, distance rows computed): from scratch, or from `base`
+    (priced on the same dates) computing only the rows of tickers it lacks.
+    """
+    with metrics.span("distance_matrix"):
+        if base is None:
+            return _Entry.build(priced, index, returns), len(priced)
+        entry = base.restrict([t for t in base.tickers if t in set(priced)])
+        new = [k for k, t in enumerate(priced) if t not in set(base.tickers)]
+        if new:
+            entry = entry.prepend([priced[k] for k in new], returns[:, new])
+        return entry, len(new)
+
+
+class ClusterCache:
+    """LRU cache of condensed correlation-distance matrices per ticker set, bounded by memory."""
+
+    def __init__(self, max_bytes: int | None = None, store: price_store.PriceStore | None = None):
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("CLUSTER_CACHE_MB", "64")) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._store = store
+        self._subscribed: price_store.PriceStore | None = None
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[_Key, _Entry] = OrderedDict()
+        self._aliases: dict[_Key, _Key] = {}  # requested ticker set -> the priced set it resolved to
+        self._versions: dict[str, int] = {}
+        self._generation = 0
+        self.bytes = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "derived": 0,
+            "rows_computed": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, tickers: list[str], period: str = "1y") -> _Entry:
+        """Entry for the tickers that have prices over `period` (in the entry's own order)."""
+        entry, job = self.prepare(tickers, period)
+        if job is None:
+            return entry
+        return self.finish(job, build_entry(job.priced, job.index, job.returns, job.base))
+
+    def prepare(self, tickers: list[str], period: str = "1y") -> tuple[_Entry | None, _Job | None]:
+        """
+        The I/O half of get(): (entry, None) on a hit, else (None, job), job
+        holding the returns and closest cached entry that build_entry needs.
+        Callers that run build_entry elsewhere (the compute pool) pass its
+        result back through finish().
+        """
+        store = self._get_store()
+        start, end = store.period_range(period)
+        requested: _Key = (tuple(sorted(set(tickers))), start, end)
+
+        with self._lock:
+            key = self._aliases.get(requested)
+            entry = self._entries.get(key) if key is not None else None
+        if entry is not None and store.is_current(entry.tickers, start, end):
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+            return entry, None
+
+        store.ensure(list(requested[0]), start, end)
+        versions, generation = self._snapshot(requested[0])
+        priced, index, returns = _priced(store.get_range(list(requested[0]), start, end))
+        if len(priced) < 2:
+            raise ValueError("Need at least 2 tickers with price history to cluster.")
+        base = self._closest(set(priced), index, start, end)
+        return None, _Job(requested, versions, generation, priced, index, returns, base)
+
+    def finish(self, job: _Job, built: tuple[_Entry, int]) -> _Entry:
+        """Cache what build_entry returned for `job` and return the entry."""
+        entry, rows = built
+        kind = "misses" if job.base is None else "derived"
+        requested, versions, generation = job.requested, job.versions, job.generation
+        start, end = requested[1], requested[2]
+        valid: _Key = (tuple(sorted(entry.tickers)), start, end)
+        with self._lock:
+            self.stats[kind] += 1
+            self.stats["rows_computed"] += rows
+            if self._unchanged(valid[0], versions, generation):
+                self._put(valid, entry)
+                self._aliases[requested] = valid
+        return entry
+
+    def invalidate(self, tickers: list[str] | None = None, start: date | None = None, end: date | None = None) -> None:
+        """Drop every entry that contains one of `tickers` (all entries if None) and overlaps start..end."""
+        with self._lock:
+            if tickers is None:
+                self._generation += 1
+                dropped = list(self._entries)
+            else:
+                names = set(tickers)
+                for t in names:
+                    self._versions[t] = self._versions.get(t, 0) + 1
+                dropped = [
+                    (key_names, s, e) for key_names, s, e in self._entries
+                    if names.intersection(key_names) and (start is None or start <= e) and (end is None or end >= s)
+                ]
+            for key in dropped:
+                self.bytes -= self._entries.pop(key).nbytes
+            if dropped:
+                self._aliases = {a: k for a, k in self._aliases.items() if k in self._entries}
+                self.stats["invalidations"] += len(dropped)
+
+    def info(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["derived"]
+            return {
+                **self.stats,
+                "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # ── Internals ───────────────────────────────────────────────────────────
+
+    def _get_store(self) -> price_store.PriceStore:
+        store = self._store or price_store.get_store()
+        if store is not self._subscribed:
+            self.invalidate()
+            store.subscribe(self.invalidate)
+            self._subscribed = store
+        return store
+
+    def _closest(self, names: set[str], index: pd.Index, start: date, end: date) -> _Entry | None:
+        """
+        The cached entry priced on `index` sharing the most tickers with `names`
+        (at least 2), fewest extra ones on ties.
+        """
+        with self._lock:
+            best, best_score = None, None
+            for (key_names, s, e), entry in self._entries.items():
+                if s != start or e != end or not entry.index.equals(index):
+                    continue
+                shared = len(names.intersection(key_names))
+                score = (shared, -len(key_names))
+                if shared >= 2 and (best_score is None or score > best_score):
+                    best, best_score = entry, score
+            return best
+
+    def _snapshot(self, tickers: tuple[str, ...]) -> tuple[dict[str, int], int]:
+        with self._lock:
+            return {t: self._versions.get(t, 0) for t in tickers}, self._generation
+
+    def _unchanged(self, tickers: tuple[str, ...], versions: dict[str, int], generation: int) -> bool:
+        return generation == self._generation and all(self._versions.get(t, 0) == versions.get(t, 0) for t in tickers)
+
+    def _put(self, key: _Key, entry: _Entry) -> None:
+        if entry.nbytes > self.max_bytes:
+            return
+        if key in self._entries:
+            self.bytes -= self._entries.pop(key).nbytes
+        self._entries[key] = entry
+        self.bytes += entry.nbytes
+        while self.bytes > self.max_bytes:
+            old_key, old = self._entries.popitem(last=False)
+            self.bytes -= old.nbytes
+            self.stats["evictions"] += 1
+        self._aliases = {a: k for a, k in self._aliases.items() if k in self._entries}
+
+
+_default_cache: ClusterCache | None = None
+_default_lock = threading.Lock()
+
+
+def get_cache() -> ClusterCache:
+    """Shared cache over the shared price store; CLUSTER_CACHE_MB sets its size (default 64)."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ClusterCache()
+        return _default_cache
+
+
+def cluster_tickers(
+    tickers: list[str],
+    period: str = "1y",
+    method: str = "average",
+    threshold: float | None = None,
+    n_clusters: int | None = None,
+    cache: ClusterCache | None = None,
+) -> dict:
+    """
+    Hierarchical clustering of `tickers` by correlation distance.
+
+    The tree is cut at distance `threshold` (default 0.5, i.e. rho 0.5), or
+    into at most `n_clusters` clusters when that is given. Clusters are
+    numbered in dendrogram order; `order` is the dendrogram's leaf order and
+    `linkage` the merge list ([left, right, distance, size] per merge, as
+    scipy.cluster.hierarchy.linkage numbers them over `tickers`).
+
+    The API runs the same steps with the distance matrix and linkage on the
+    compute pool: check_request, ClusterCache.prepare / build_entry / finish,
+    build_linkage, cut_tree.
+    """
+    order_in = check_request(tickers, method, threshold, n_clusters)
+    started = time.perf_counter()
+    entry = (cache or get_cache()).get(order_in, period)
+    distances_ms = round((time.perf_counter() - started) * 1000, 2)
+    result = cut_tree(entry.tickers, entry.linkage(method), order_in, period, method, threshold, n_clusters)
+    result["timings"] = {"distances": distances_ms, "total": round((time.perf_counter() - started) * 1000, 2)}
+    return result
+
+
+def check_request(tickers: list[str], method: str, threshold: float | None, n_clusters: int | None) -> list[str]:
+    """Validated arguments of cluster_tickers; the stripped, upper-cased tickers without repeats."""
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}.")
+    if n_clusters is not None and n_clusters < 1:
+        raise ValueError("n_clusters must be >= 1.")
+    if threshold is not None and threshold < 0:
+        raise ValueError("threshold must be >= 0.")
+    order_in = list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+    if len(order_in) < 2:
+        raise ValueError("Need at least 2 tickers to cluster.")
+    return order_in
+
+
+def cut_tree(
+    tickers: list[str],
+    Z: np.ndarray,
+    order_in: list[str],
+    period: str,
+    method: str,
+    threshold: float | None,
+    n_clusters: int | None,
+) -> dict:
+    """The cluster_tickers response (without timings) for linkage Z over `tickers`."""
+    from scipy.cluster.hierarchy import fcluster, leaves_list
+
+    with metrics.span("cluster"):
+        if n_clusters is not None:
+            labels = fcluster(Z, t=n_clusters, criterion="maxclust")
+        else:
+            labels = fcluster(Z, t=0.5 if threshold is None else threshold, criterion="distance")
+        leaves = leaves_list(Z)
+
+    # Renumber clusters 1.. in the order they appear along the dendrogram
+    renumber: dict[int, int] = {}
+    for leaf in leaves:
+        renumber.setdefault(int(labels[leaf]), len(renumber) + 1)
+    clusters: dict[int, list[str]] = {}
+    for leaf in leaves:
+        clusters.setdefault(renumber[int(labels[leaf])], []).append(tickers[leaf])
+
+    return {
+        "tickers": tickers,
+        "skipped": [t for t in order_in if t not in set(tickers)],
+        "period": period,
+        "method": method,
+        "threshold": None if n_clusters is not None else (0.5 if threshold is None else threshold),
+        "n_clusters": len(clusters),
+        "assignment": {t: renumber[int(c)] for t, c in zip(tickers, labels)},
+        "clusters": [{"id": k, "tickers": v} for k, v in clusters.items()],
+        "order": [tickers[i] for i in leaves],
+        "linkage": [[int(a), int(b), round(float(d), 6), int(n)] for a, b, d, n in Z],
+    }
+
+
+if __name__ == "__main__":
+    from scipy.spatial.distance import squareform
+
+    store = price_store.PriceStore.offline()
+    cache = ClusterCache(store=store)
+    universe = list(price_store.CsvFetcher().frame.columns)
+
+    def fresh(tickers, store=store):
+        close = store.get_close_prices(tickers, "1y")
+        returns = pd.DataFrame({t: close[t].dropna().pct_change(fill_method=None) for t in close.columns})
+        corr = returns.corr(min_periods=MIN_OVERLAP).fillna(0.0)
+        return list(returns.columns), squareform(_distance(corr.to_numpy()), checks=False)
+
+    def check(cache, tickers, label, store=store):
+        entry = cache.get(tickers)
+        columns, expected = fresh(entry.tickers, store)
+        assert columns == entry.tickers and np.allclose(entry.condensed, expected, atol=1e-9), label
+        return entry
+
+    for label, tickers in [
+        ("miss", universe[:10]),
+        ("recut", universe[:10]),
+        ("add one", universe[:11]),
+        ("subset", universe[2:8]),
+        ("swap", universe[3:12] + universe[:1]),
+    ]:
+        start = time.perf_counter()
+        result = cluster_tickers(tickers, threshold=0.6, cache=cache)
+        ms = (time.perf_counter() - start) * 1000
+        entry = check(cache, tickers, label)
+        print(f"{label:>8}: {len(entry.tickers)} tickers in {ms:.2f} ms -> {result['clusters']}")
+
+    # A ticker trading every day next to business-day ones: derived entries
+    # match fresh ones, and the stocks' distances to each other don't move
+    fetcher = price_store.CsvFetcher()
+    fetcher.frame = fetcher.frame.reindex(pd.date_range(fetcher.frame.index[0], fetcher.frame.index[-1]))
+    steps = np.random.default_rng(0).normal(0, 0.03, len(fetcher.frame))
+    fetcher.frame["BTC-USD"] = 30_000 * np.exp(np.cumsum(steps))
+    last = fetcher.last_date
+    mixed_store = price_store.PriceStore(fetcher=fetcher, today=lambda: last)
+    mixed = ClusterCache(store=mixed_store)
+    stocks = check(mixed, universe[:4], "stocks", mixed_store)
+    for tickers in [
+        ["BTC-USD", *universe[:4]],
+        universe[:3],
+        ["BTC-USD", *universe[:3]],
+        ["BTC-USD", *universe[:6]],
+    ]:
+        check(mixed, tickers, tickers, mixed_store)
+    with_btc = mixed.get(["BTC-USD", *universe[:4]])
+    assert np.allclose(with_btc.restrict(stocks.tickers).condensed, stocks.condensed, atol=1e-12)
+    print(f"   mixed: {mixed.info()}")
+
+    print(cache.info())
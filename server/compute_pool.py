@@ -0,0 +1,89 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import metrics
+
+
+class PoolSaturated(Exception):
+    """Raised when the compute pool already has as many jobs as it will queue."""
+
+
+class ComputePool:
+    """
+    Bounded executor for CPU-heavy analytics, awaited from async routes.
+
+    Jobs run on a process pool (threads when workers=0) so SciPy/pandas work
+    never occupies the event loop or the request threadpool. At most
+    workers + max_queue jobs are admitted at once; beyond that `run` raises
+    PoolSaturated so the caller can shed load with a 503.
+
+    Defaults come from COMPUTE_WORKERS and COMPUTE_QUEUE.
+    """
+
+    def __init__(self, workers: int | None = None, max_queue: int | None = None):
+        if workers is None:
+            workers = int(os.environ.get("COMPUTE_WORKERS", os.cpu_count() or 1))
+        if max_queue is None:
+            max_queue = int(os.environ.get("COMPUTE_QUEUE", 2 * max(workers, 1)))
+        self.workers = workers
+        self.max_queue = max_queue
+        self.capacity = max(workers, 1) + max_queue
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self.stats = {"completed": 0, "rejected": 0, "failed": 0}
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.workers > 0:
+                    # spawn: forking a process that already runs threads is not safe
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compute")
+            return self._executor
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the pool; fn and its arguments must be picklable.
+
+        Metrics and spans the job records are shipped back and replayed here, so
+        they show up in /metrics and the calling request's Server-Timing.
+        """
+        with self._lock:
+            if self._inflight >= self.capacity:
+                self.stats["rejected"] += 1
+                raise PoolSaturated(f"Compute pool busy ({self._inflight} jobs in flight).")
+            self._inflight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            with metrics.span("compute_pool"):
+                result, recorded = await loop.run_in_executor(
+                    self._get_executor(), partial(metrics.run_captured, fn, *args, **kwargs)
+                )
+            metrics.replay(recorded)
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight -= 1
+        self.stats["completed"] += 1
+        return result
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
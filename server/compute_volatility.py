@@ -1,22 +1,23 @@
+import math
+
 import numpy as np
 import pandas as pd
-import yfinance as yf
+
+import metrics
+import price_store
 
 MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
                'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
 
 
 def get_close_prices(tickers: list[str], period: str = "1y"):
-    data = yf.download(tickers, period=period, auto_adjust=True, progress=False)["Close"]
-    if len(tickers) == 1:
-        data = data.to_frame(name=tickers[0])
-    available = [t for t in tickers if t in data.columns]
-    return data[available]
+    # Served from the local store; only ranges it has not seen yet hit the network
+    return price_store.get_close_prices(tickers, period)
 
 
 def compute_monthly_spike_patterns(tickers: list[str]) -> dict:
     """
-    Download 5 years of data and return per-ticker list of calendar months
+    Load 5 years of data and return per-ticker list of calendar months
     where each stock historically tends to spike.
 
     Months where most stocks moved together (external macro events) are
@@ -25,6 +26,17 @@ def compute_monthly_spike_patterns(tickers: list[str]) -> dict:
     dropped from individual analysis.
     """
     close_5y = get_close_prices(tickers, period="5y")
+    return monthly_spike_patterns_from_prices(close_5y, tickers)
+
+
+def monthly_spike_patterns_from_prices(close_5y: pd.DataFrame, tickers: list[str]) -> dict:
+    """
+    compute_monthly_spike_patterns on already loaded daily closes.
+
+    Event detection and the per-ticker month statistics are computed for all
+    tickers and months at once with masked array ops; Python only builds the
+    (at most 4 per ticker) output entries.
+    """
     if close_5y.empty:
         return {t: [] for t in tickers}
 
@@ -34,83 +46,112 @@ def compute_monthly_spike_patterns(tickers: list[str]) -> dict:
     if monthly_returns.empty or len(monthly_returns) < 6:
         return {t: [] for t in tickers}
 
-    n = len(monthly_returns.columns)
+    values = monthly_returns.to_numpy(dtype=float)
+    present = ~np.isnan(values)
+    n = values.shape[1]
 
-    # Detect external event months
-    external = pd.Series(False, index=monthly_returns.index)
+    # Detect external event months: enough tickers reporting and >60% of them
+    # moving more than 3% in the same direction
+    external = np.zeros(len(values), dtype=bool)
     if n >= 3:
-        for date, row in monthly_returns.iterrows():
-            vals = row.dropna()
-            if len(vals) < max(3, n * 0.5):
-                continue
-            big_up   = (vals >  0.03).sum() / len(vals)
-            big_down = (vals < -0.03).sum() / len(vals)
-            if big_up > 0.6 or big_down > 0.6:
-                external[date] = True
-
-    filtered = monthly_returns[~external]
-
+        counts = present.sum(axis=1)
+        enough = counts >= max(3, n * 0.5)
+        safe = np.where(counts > 0, counts, 1)
+        big_up = (values > 0.03).sum(axis=1) / safe
+        big_down = (values < -0.03).sum(axis=1) / safe
+        external = enough & ((big_up > 0.6) | (big_down > 0.6))
+
+    kept = values[~external]
+    kept_present = present[~external]
+    months = monthly_returns.index.month.to_numpy()[~external] - 1
+
+    # Per (calendar month, ticker) sums and counts in one pass
+    month_onehot = np.zeros((12, len(kept)))
+    month_onehot[months, np.arange(len(kept))] = 1.0
+    month_count = month_onehot @ kept_present
+    month_sum = month_onehot @ np.where(kept_present, kept, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        month_avg = month_sum / month_count
+
+    eligible = kept_present.sum(axis=0) >= 4
+    spikes = (month_count >= 2) & (np.abs(month_avg) > 0.02) & eligible[None, :]
+
+    columns = {t: j for j, t in enumerate(monthly_returns.columns)}
     result = {}
     for ticker in tickers:
-        if ticker not in filtered.columns:
+        j = columns.get(ticker)
+        if j is None or not spikes[:, j].any():
             result[ticker] = []
             continue
+        spike_months = [
+            {
+                "month":     MONTH_NAMES[m],
+                "direction": "up" if month_avg[m, j] > 0 else "down",
+                "avg_pct":   round(float(month_avg[m, j]) * 100, 1),
+            }
+            for m in np.flatnonzero(spikes[:, j])
+        ]
+        spike_months.sort(key=lambda x: abs(x["avg_pct"]), reverse=True)
+        result[ticker] = spike_months[:4]
 
-        series = filtered[ticker].dropna()
-        if len(series) < 4:
-            result[ticker] = []
-            continue
+    return result
 
-        monthly_avg   = series.groupby(series.index.month).mean()
-        monthly_count = series.groupby(series.index.month).count()
 
-        spike_months = []
-        for month_num, avg_ret in monthly_avg.items():
-            if monthly_count.get(month_num, 0) < 2:
-                continue
-            if abs(avg_ret) > 0.02:  # >2% average move in that month
-                spike_months.append({
-                    "month":     MONTH_NAMES[month_num - 1],
-                    "direction": "up" if avg_ret > 0 else "down",
-                    "avg_pct":   round(avg_ret * 100, 1),
-                })
+def _daily_returns(close_prices: pd.DataFrame) -> np.ndarray:
+    """close.pct_change().dropna() as a plain array: rows with any gap are dropped."""
+    values = close_prices.to_numpy(dtype=float)
+    if len(values) < 2:
+        return np.empty((0, values.shape[1]))
+    returns = values[1:] / values[:-1] - 1
+    return returns[~np.isnan(returns).any(axis=1)]
 
-        spike_months.sort(key=lambda x: abs(x["avg_pct"]), reverse=True)
-        result[ticker] = spike_months[:4]
 
-    return result
+def _latest_vol(returns: np.ndarray, window: int) -> np.ndarray:
+    """Annualized std of the trailing `window` rows per column (NaN if fewer rows)."""
+    if len(returns) < window:
+        return np.full(returns.shape[1], np.nan)
+    return returns[-window:].std(axis=0, ddof=1) * np.sqrt(252)
+
+
+def _latest_compound_return(returns: np.ndarray, window: int) -> np.ndarray:
+    if len(returns) < window:
+        return np.full(returns.shape[1], np.nan)
+    return np.prod(1 + returns[-window:], axis=0) - 1
 
 
 def compute_volatility_signals(close_prices, monthly_patterns=None) -> dict:
-    daily_returns = close_prices.pct_change().dropna()
-    if daily_returns.empty:
+    """
+    Latest-bar volatility signals per ticker. Only the trailing 20/120-day
+    windows are read, so cost does not grow with the history length.
+    """
+    daily_returns = _daily_returns(close_prices)
+    if not len(daily_returns):
         return {
             "annualized_volatility": {},
             "spike_tickers": [],
             "portfolio_risk_alert": None,
         }
 
-    vol20  = daily_returns.rolling(20).std().iloc[-1]  * np.sqrt(252)
-    vol120 = daily_returns.rolling(120).std().iloc[-1] * np.sqrt(252)
-    ret20  = (1 + daily_returns).rolling(20).apply(np.prod, raw=True).iloc[-1] - 1
+    vol20  = _latest_vol(daily_returns, 20)
+    vol120 = _latest_vol(daily_returns, 120)
+    ret20  = _latest_compound_return(daily_returns, 20)
+    spikes = np.isfinite(vol20) & np.isfinite(vol120) & (vol20 > 1.5 * vol120)
 
     ticker_metrics = {}
     spike_tickers  = []
 
-    for ticker in daily_returns.columns:
-        v20  = vol20.get(ticker, np.nan)
-        v120 = vol120.get(ticker, np.nan)
-        spike = bool(np.isfinite(v20) and np.isfinite(v120) and v20 > 1.5 * v120)
+    for j, ticker in enumerate(close_prices.columns):
+        v20, v120, r20 = float(vol20[j]), float(vol120[j]), float(ret20[j])
+        spike = bool(spikes[j])
 
         if spike:
             spike_tickers.append(ticker)
 
-        r20 = ret20.get(ticker, np.nan)
-        spike_direction = ("up" if r20 >= 0 else "down") if (spike and np.isfinite(r20)) else None
+        spike_direction = ("up" if r20 >= 0 else "down") if (spike and math.isfinite(r20)) else None
 
         ticker_metrics[ticker] = {
-            "vol20":            round(float(v20),  6) if np.isfinite(v20)  else None,
-            "vol120":           round(float(v120), 6) if np.isfinite(v120) else None,
+            "vol20":            round(v20,  6) if math.isfinite(v20)  else None,
+            "vol120":           round(v120, 6) if math.isfinite(v120) else None,
             "volatility_spike": spike,
             "spike_direction":  spike_direction,
             "spike_months":     (monthly_patterns or {}).get(ticker, []),
@@ -128,13 +169,53 @@ def compute_volatility_signals(close_prices, monthly_patterns=None) -> dict:
     }
 
 
+def compute_volatility_history(close_prices) -> dict[str, pd.DataFrame]:
+    """
+    Full-history vol20 / vol120 / ret20 series from cumulative sums.
+
+    Rolling variance comes from windowed sums of (demeaned) x and x^2, and the
+    compounded 20-day return from windowed sums of log1p(x), so every window is
+    O(1) instead of a Python callback per window and column.
+    """
+    returns = close_prices.pct_change().dropna()
+    values = returns.to_numpy(dtype=float)
+    centered = values - values.mean(axis=0) if len(values) else values
+    zeros = np.zeros((1, values.shape[1]))
+    c1 = np.vstack([zeros, np.cumsum(centered, axis=0)])
+    c2 = np.vstack([zeros, np.cumsum(centered ** 2, axis=0)])
+    clog = np.vstack([zeros, np.cumsum(np.log1p(values), axis=0)])
+
+    def _windowed(cum: np.ndarray, window: int) -> np.ndarray:
+        out = np.full(values.shape, np.nan)
+        if len(values) >= window:
+            out[window - 1:] = cum[window:] - cum[:-window]
+        return out
+
+    history = {}
+    for name, window in (("vol20", 20), ("vol120", 120)):
+        s1, s2 = _windowed(c1, window), _windowed(c2, window)
+        var = np.clip((s2 - s1 * s1 / window) / (window - 1), 0.0, None)
+        history[name] = pd.DataFrame(np.sqrt(var) * np.sqrt(252), index=returns.index, columns=returns.columns)
+    history["ret20"] = pd.DataFrame(np.expm1(_windowed(clog, 20)), index=returns.index, columns=returns.columns)
+    return history
+
+
 def analyze_tickers_volatility(tickers: list[str], period: str = "1y") -> dict:
-    close_prices     = get_close_prices(tickers, period)
-    monthly_patterns = compute_monthly_spike_patterns(tickers)
+    close_prices = get_close_prices(tickers, period)
+    close_5y     = get_close_prices(tickers, period="5y")
+    return analyze_prices_volatility(tickers, period, close_prices, close_5y)
+
+
+def analyze_prices_volatility(tickers: list[str], period: str, close_prices, close_5y) -> dict:
+    """analyze_tickers_volatility on preloaded `period` and 5-year closes (no I/O)."""
+    with metrics.span("monthly_patterns"):
+        monthly_patterns = monthly_spike_patterns_from_prices(close_5y, tickers)
+    with metrics.span("volatility_signals"):
+        signals = compute_volatility_signals(close_prices, monthly_patterns)
     return {
         "tickers":             tickers,
         "period":              period,
-        "volatility_analysis": compute_volatility_signals(close_prices, monthly_patterns),
+        "volatility_analysis": signals,
     }
 
 
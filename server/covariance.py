@@ -0,0 +1,169 @@
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# Covariance estimators for the optimizer
+#
+# The sample covariance needs more days than tickers to be well conditioned;
+# at 1y (~250 days) and a few hundred tickers it is close to singular, and
+# SLSQP crawls or fails on it.  Alternatives, all annualized like the sample
+# one and built from the aligned returns the returns cache already holds:
+#
+#   ledoit_wolf  sample covariance shrunk toward a scaled identity, with the
+#                Ledoit-Wolf (2004) intensity.  Dense, but well conditioned.
+#   sector       one factor per sector of stock_market.csv (the equal-weight
+#                return of its members); each ticker loads on its own sector.
+#   pca          the first PCA_FACTORS principal components of the returns.
+#
+# The factor models are kept as FactorCov (B F B' + diag(d)), which never
+# forms the n x n matrix: products cost O(n k) and solves go through the
+# Woodbury identity in O(n k^2).  FactorCov supports `@` and solve() the way
+# SharpeProblem uses the dense matrix, so the optimizer takes either.
+# ---------------------------------------------------------------------------
+
+ESTIMATORS = ("sample", "ledoit_wolf", "sector", "pca")
+
+PCA_FACTORS = 10
+
+# Specific variances are floored at this share of the average variance, so a
+# ticker its factors explain completely (a one-member sector) stays invertible
+_SPECIFIC_FLOOR = 1e-4
+
+
+class FactorCov:
+    """cov = B F B' + diag(d), stored factored; n x n products and solves without the n x n matrix."""
+
+    __array_ufunc__ = None  # so `w @ cov` with an ndarray on the left calls __rmatmul__
+
+    def __init__(self, loadings: np.ndarray, factor_cov: np.ndarray, specific: np.ndarray):
+        self.loadings = loadings        # B, n x k
+        self.factor_cov = factor_cov    # F, k x k
+        self.specific = specific        # d, n
+        self.shape = (len(specific), len(specific))
+
+    def __matmul__(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=float)
+        d = self.specific if x.ndim == 1 else self.specific[:, None]
+        return self.loadings @ (self.factor_cov @ (self.loadings.T @ x)) + d * x
+
+    def __rmatmul__(self, x: np.ndarray) -> np.ndarray:
+        return (self @ np.asarray(x, dtype=float).T).T  # symmetric
+
+    def diagonal(self) -> np.ndarray:
+        return np.einsum("ik,kl,il->i", self.loadings, self.factor_cov, self.loadings) + self.specific
+
+    def solve(self, b: np.ndarray) -> np.ndarray:
+        """cov^-1 b via Woodbury: D^-1 b - D^-1 B F (I + B' D^-1 B F)^-1 B' D^-1 b."""
+        b = np.asarray(b, dtype=float)
+        d = self.specific if b.ndim == 1 else self.specific[:, None]
+        db = b / d
+        B, F = self.loadings, self.factor_cov
+        inner = np.eye(F.shape[0]) + (B.T / self.specific) @ B @ F
+        return db - (B / self.specific[:, None]) @ (F @ np.linalg.solve(inner, B.T @ db))
+
+    def dense(self) -> np.ndarray:
+        return self.loadings @ self.factor_cov @ self.loadings.T + np.diag(self.specific)
+
+    @property
+    def nbytes(self) -> int:
+        return self.loadings.nbytes + self.factor_cov.nbytes + self.specific.nbytes
+
+
+def solve(cov, b: np.ndarray) -> np.ndarray:
+    """cov^-1 b for a dense covariance or a FactorCov."""
+    return cov.solve(b) if isinstance(cov, FactorCov) else np.linalg.solve(cov, b)
+
+
+def ledoit_wolf(returns: np.ndarray, sample_cov: np.ndarray | None = None) -> tuple[np.ndarray, float]:
+    """(annualized shrunk covariance, shrinkage intensity) for a (days x tickers) returns matrix."""
+    T, n = returns.shape
+    X = returns - returns.mean(axis=0)
+    if sample_cov is None:
+        sample_cov = X.T @ X / (T - 1) * 252
+    S = sample_cov * ((T - 1) / T / 252)  # the 1/T daily covariance the intensity is defined on
+    m = np.trace(S) / n
+    delta = (np.sum(S * S) - 2 * m * np.trace(S) + n * m * m) / n
+    beta = (np.sum(np.sum(X * X, axis=1) ** 2) / T - np.sum(S * S)) / (n * T)
+    shrinkage = 0.0 if delta <= 0 else min(beta, delta) / delta
+    target = np.trace(sample_cov) / n
+    cov = (1 - shrinkage) * sample_cov
+    cov[np.diag_indices(n)] += shrinkage * target
+    return cov, float(shrinkage)
+
+
+def _specific(total_var: np.ndarray, explained: np.ndarray) -> np.ndarray:
+    return np.maximum(total_var - explained, _SPECIFIC_FLOOR * total_var.mean())
+
+
+def pca_factors(returns: np.ndarray, factors: int = PCA_FACTORS) -> FactorCov:
+    T, n = returns.shape
+    X = returns - returns.mean(axis=0)
+    k = max(1, min(factors, n - 1, T - 1))
+    _, s, vt = np.linalg.svd(X, full_matrices=False)
+    B = vt[:k].T * (s[:k] / np.sqrt(T - 1) * np.sqrt(252))
+    total_var = (X * X).sum(axis=0) / (T - 1) * 252
+    return FactorCov(B, np.eye(k), _specific(total_var, (B * B).sum(axis=1)))
+
+
+def sector_factors(returns: np.ndarray, sectors: list[str]) -> FactorCov:
+    T, n = returns.shape
+    X = returns - returns.mean(axis=0)
+    names = list(dict.fromkeys(sectors))
+    col = np.array([names.index(s) for s in sectors])
+    members = np.zeros((n, len(names)))
+    members[np.arange(n), col] = 1.0
+    f = X @ (members / members.sum(axis=0))          # equal-weight sector returns, T x k
+    F = np.atleast_2d(f.T @ f / (T - 1) * 252)
+    f_var = np.diag(F)
+    cov_own = (X * f[:, col]).sum(axis=0) / (T - 1) * 252
+    beta = np.divide(cov_own, f_var[col], out=np.zeros(n), where=f_var[col] > 0)
+    total_var = (X * X).sum(axis=0) / (T - 1) * 252
+    return FactorCov(members * beta[:, None], F, _specific(total_var, beta * beta * f_var[col]))
+
+
+def estimate(moments, estimator: str = "sample"):
+    """
+    Covariance of `moments` (returns_cache.Moments) under `estimator`: the
+    cached sample matrix, a shrunk dense matrix, or a FactorCov.
+    """
+    if estimator not in ESTIMATORS:
+        raise ValueError(f"cov_estimator must be one of {', '.join(ESTIMATORS)}.")
+    if estimator == "sample":
+        return moments.cov
+    returns = moments.returns.to_numpy(dtype=float)
+    if estimator == "ledoit_wolf":
+        return ledoit_wolf(returns, moments.cov)[0]
+    if estimator == "pca":
+        return pca_factors(returns)
+    from reference_data import SECURITIES
+
+    return sector_factors(returns, [SECURITIES.sector(t) or "Unknown" for t in moments.tickers])
+
+
+if __name__ == "__main__":
+    import time
+
+    from bench import synthetic_returns
+
+    for n in (50, 400):
+        returns = synthetic_returns(n, 250, seed=3)
+        sample = np.cov(returns.T) * 252
+        shrunk, intensity = ledoit_wolf(returns)
+        print(f"n={n}: cond sample {np.linalg.cond(sample):.3g}, ledoit_wolf {np.linalg.cond(shrunk):.3g} (shrinkage {intensity:.3f})")
+
+        sectors = [f"s{i % 7}" for i in range(n)]
+        for name, fc in [("pca", pca_factors(returns)), ("sector", sector_factors(returns, sectors))]:
+            dense = fc.dense()
+            w = np.random.default_rng(0).random((n, 3))
+            assert np.allclose(fc @ w, dense @ w) and np.allclose(w.T @ fc, w.T @ dense)
+            assert np.allclose(fc @ w[:, 0], dense @ w[:, 0]) and np.allclose(fc.diagonal(), np.diag(dense))
+            assert np.allclose(fc.solve(w), np.linalg.solve(dense, w), rtol=1e-6, atol=1e-8)
+            assert np.allclose(np.diag(dense), np.diag(sample), rtol=1e-9) or name == "sector"
+            start = time.perf_counter()
+            for _ in range(1000):
+                fc @ w[:, 0]
+            factored_us = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            for _ in range(1000):
+                dense @ w[:, 0]
+            print(f"  {name:>6}: {fc.nbytes / 1e3:.0f} kB vs {dense.nbytes / 1e3:.0f} kB dense; "
+                  f"matvec {factored_us:.1f} us vs {(time.perf_counter() - start) * 1000:.1f} us dense")
@@ -0,0 +1,179 @@
+import re
+from functools import lru_cache
+from typing import Any, Sequence
+
+# ---------------------------------------------------------------------------
+# Currency / number parsing for broker holdings exports
+#
+# Scraped cells arrive as "$1,234.56", "-$12.00", "($1,234.56)", "1.234,56 €",
+# "CHF 1'234.50", "--" and so on.  Plain numbers go straight to float() and
+# US-formatted or parenthesised amounts take a single fullmatch, both without
+# touching the cache; everything else is cached (exports are re-posted on
+# every page view) and goes through a slower path that strips
+# currency symbols and codes, reads the sign (leading/trailing minus or
+# parentheses) and works out which of "," / "." is the decimal separator.
+# Unparseable cells give the caller's default (0.0).
+# ---------------------------------------------------------------------------
+
+# Optional sign, optional "$", US digit grouping: "-$1,234.56", "+$12.34", "1234.5";
+# or an unsigned amount in accounting parentheses: "($1,234.56)"
+_US_DIGITS = r"\$?(?:[0-9]{1,3}(?:,[0-9]{3})+|[0-9]+)(?:\.[0-9]+)?"
+_US_AMOUNT = re.compile(rf"[-+]?{_US_DIGITS}|\({_US_DIGITS}\)").fullmatch
+_JUNK = re.compile(r"[^0-9.,()\-]+")  # currency symbols/codes, spaces, apostrophes, %, +
+_PLAIN = "0123456789.+- \t\n\r"  # all a plain number may hold; float() alone also takes "1e5", "nan", "1_000"
+_PLAIN_NON_DIGITS = ".+- \t\n\r"
+
+
+def _normalize_separators(s: str) -> str:
+    """Drop thousands separators and make "." the decimal point."""
+    comma, dot = s.rfind(","), s.rfind(".")
+    if comma == -1 and dot == -1:
+        return s
+    if comma != -1 and dot != -1:
+        # Both present: whichever comes last is the decimal separator
+        decimal = "," if comma > dot else "."
+        grouping = "." if decimal == "," else ","
+    else:
+        sep = "," if comma != -1 else "."
+        if s.count(sep) > 1:
+            decimal, grouping = "", sep            # 1,234,567 / 1.234.567
+        elif sep == ",":
+            # 1,234 is US grouping; 12,5 and 1234,56 are decimal commas
+            decimal, grouping = ("", ",") if len(s) - comma == 4 else (",", "")
+        else:
+            decimal, grouping = ".", ""
+    if grouping:
+        s = s.replace(grouping, "")
+    return s.replace(decimal, ".") if decimal and decimal != "." else s
+
+
+@lru_cache(maxsize=65536)
+def _parse_text(text: str) -> float | None:
+    stripped = text.strip()
+    # parse_currency has already tried the unpadded text as a US amount
+    if len(stripped) != len(text) and _US_AMOUNT(stripped):
+        return _us_amount(stripped)
+    return _parse_loose(stripped)
+
+
+def _us_amount(text: str) -> float:
+    """float() of text that _US_AMOUNT matched."""
+    if text[0] == "(":
+        return -float(text[1:-1].replace(",", "").replace("$", ""))
+    return float(text.replace(",", "").replace("$", ""))
+
+
+def _parse_loose(text: str) -> float | None:
+    if not text.isascii():
+        text = text.replace("−", "-").replace("‒", "-").replace("–", "-")
+    s = _JUNK.sub("", text)
+    negative = False
+    if s.startswith("(") and s.endswith(")"):
+        negative, s = True, s[1:-1]
+    elif "(" in s or ")" in s:
+        s = s.replace("(", "").replace(")", "")
+    if s.startswith("-"):
+        negative, s = True, s[1:]
+    elif s.endswith("-"):
+        negative, s = True, s[:-1]
+    if not s or "-" in s:
+        return None
+    try:
+        value = float(_normalize_separators(s))
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def parse_currency(value: Any, default: float = 0.0) -> float:
+    """
+    '$1,234.56' → 1234.56, '($1,234.56)' → -1234.56, '1.234,56 €' → 1234.56.
+
+    Numbers pass through; None, blanks and placeholders like '--' or 'n/a'
+    give `default`.
+    """
+    if isinstance(value, str):
+        text = value
+    elif isinstance(value, (int, float)):
+        return float(value)
+    elif value is None:
+        return default
+    else:
+        text = str(value)
+    # Plain and US-formatted numbers are cheaper to parse than to look up in the cache
+    if not text.strip(_PLAIN):
+        # Placeholders like "--" or "-" hold no digit to end on; leave them to the cache
+        if text.rstrip(_PLAIN_NON_DIGITS):
+            try:
+                return float(text)
+            except ValueError:
+                pass
+    elif _US_AMOUNT(text):
+        return _us_amount(text)
+    parsed = _parse_text(text)
+    return default if parsed is None else parsed
+
+
+def parse_currency_column(values: Sequence[Any], default: float = 0.0):
+    """
+    parse_currency over a whole column, as a float64 array.
+
+    Cells are parsed in a single pass straight into the array: JSON floats
+    are taken as they are, everything else goes through parse_currency, whose
+    cache serves repeated cells (placeholders, round amounts), so there is no
+    separate de-duplication pass.
+    """
+    import numpy as np
+
+    parsed = [v if type(v) is float else parse_currency(v, default) for v in values]
+    return np.array(parsed, dtype=float)
+
+
+if __name__ == "__main__":
+    import math
+
+    # Cells as they appear in Fidelity / Schwab / Vanguard / Robinhood exports and EU/CH brokers
+    cases = [
+        (1234, 1234.0),
+        (12.5, 12.5),
+        (None, 0.0),
+        ("", 0.0),
+        ("--", 0.0),
+        ("-", 0.0),
+        ("—", 0.0),
+        ("n/a", 0.0),
+        ("1234.56", 1234.56),
+        ("$1,234.56", 1234.56),
+        (" $1,234,567.89 ", 1234567.89),
+        ("-$1,234.56", -1234.56),
+        ("$-1,234.56", -1234.56),
+        ("+$12.34", 12.34),
+        ("($1,234.56)", -1234.56),
+        ("(1,234.56)", -1234.56),
+        ("1,234.56-", -1234.56),
+        ("−1,234.56", -1234.56),
+        ("USD 1,234.56", 1234.56),
+        ("$1,234", 1234.0),
+        ("$0.00", 0.0),
+        (".5", 0.5),
+        ("12.5%", 12.5),
+        ("1.234,56 €", 1234.56),
+        ("1.234.567,89", 1234567.89),
+        ("€ 12,5", 12.5),
+        ("1234,56", 1234.56),
+        ("1 234,56 €", 1234.56),
+        ("1 234,56", 1234.56),
+        ("CHF 1'234.50", 1234.5),
+        ("£1,000", 1000.0),
+        ("1.234.567", 1234567.0),
+        ("12-34", 0.0),
+        ("1,234.567.8", 0.0),
+    ]
+    failures = [(raw, want, parse_currency(raw)) for raw, want in cases if not math.isclose(parse_currency(raw), want)]
+    column = parse_currency_column([raw for raw, _ in cases])
+    mismatched = [raw for (raw, _), got in zip(cases, column) if not math.isclose(got, parse_currency(raw))]
+
+    for raw, want, got in failures:
+        print(f"FAIL {raw!r}: expected {want}, got {got}")
+    print(f"{len(cases) - len(failures)}/{len(cases)} cases ok; column mismatches: {mismatched}")
+    assert not failures and not mismatched
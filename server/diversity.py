@@ -1,24 +1,44 @@
 import math
-import re
-import pandas as pd
-from pathlib import Path
-from typing import Any
-
-# ---------------------------------------------------------------------------
-# Load stock market reference data once at import time
-# ---------------------------------------------------------------------------
-_CSV_PATH = Path(__file__).parent / "stock_market.csv"
-
-try:
-    _stock_df = pd.read_csv(_CSV_PATH, dtype=str).fillna("")
-    # Build symbol → sector lookup (upper-cased symbols for robust matching)
-    _SYMBOL_TO_INDUSTRY: dict[str, str] = dict(
-        zip(_stock_df["ticker"].str.upper(), _stock_df["sector"])
-    )
-    print(f"[diversity] Loaded {len(_SYMBOL_TO_INDUSTRY)} sector mappings from CSV")
-except Exception as e:
-    print(f"[diversity] CSV load failed: {e}")
-    _SYMBOL_TO_INDUSTRY = {}
+from functools import lru_cache
+from itertools import compress, repeat
+from typing import Any, Iterator
+
+from currency import parse_currency, parse_currency_column
+from reference_data import SECURITIES
+
+print(f"[diversity] Loaded {len(SECURITIES)} sector mappings from {SECURITIES.source}")
+
+
+# UI artifact rows with no investment value — always drop
+_SKIP = {"ACCOUNT:", "PENDING ACTIVITY", "ACCOUNT TOTAL", "GRAND TOTAL"}
+
+# Gold & silver ETFs always map to Natural Resources
+_NATURAL_RESOURCES = {"GLD", "IAU", "SLV", "SIVR", "SGOL", "BAR", "PHYS", "PSLV", "PPLT", "PALL"}
+
+# Other fixed sector overrides
+_SPECIAL_SECTORS: dict[str, str] = {
+    "CASH": "Cash & Equivalents",
+}
+
+_VALUE_KEYS = ("value", "currentValue", "curVal", "cur_val", "current_value")
+
+
+def _is_mutual_fund(sym: str) -> bool:
+    # US mutual funds are almost always 5-letter tickers ending in X
+    # and won't appear in the stock CSV (which covers ETFs/stocks)
+    return len(sym) == 5 and sym.endswith("X") and sym not in SECURITIES
+
+
+@lru_cache(maxsize=65536)
+def _classify_symbol(symbol: str) -> tuple[str, bool]:
+    """(industry, mutual_fund) for a symbol; industry is "" when the row's own field should be used."""
+    if symbol in _NATURAL_RESOURCES:
+        return "Natural Resources", False
+    if symbol in _SPECIAL_SECTORS:
+        return _SPECIAL_SECTORS[symbol], False
+    if _is_mutual_fund(symbol):
+        return "Mutual Funds", True
+    return SECURITIES.sector(symbol), False
 
 
 def clean_holdings(raw_holdings: list) -> list:
@@ -29,71 +49,43 @@ def clean_holdings(raw_holdings: list) -> list:
     of those fields as the numeric value and strip out dollars/commas.  If no
     numeric field is present or the parsed amount is non‑finite we skip the row.
     """
+    if not isinstance(raw_holdings, list):
+        return []
+    return [
+        {"symbol": symbol, "industry": industry, "value": value, "mutual_fund": mutual_fund}
+        for symbol, industry, value, mutual_fund in _iter_clean(raw_holdings)
+    ]
 
-    def _parse_num(v: Any) -> float:
-        # accept ints/floats directly
-        if isinstance(v, (int, float)):
-            return float(v)
-        s = str(v)
-        # remove currency symbols, commas, spaces, etc.
-        s = re.sub(r"[^0-9.\-]", "", s)
-        try:
-            return float(s)
-        except ValueError:
-            return 0.0
-
-    # UI artifact rows with no investment value — always drop
-    _SKIP = {"ACCOUNT:", "PENDING ACTIVITY", "ACCOUNT TOTAL", "GRAND TOTAL"}
-
-    # Gold & silver ETFs always map to Natural Resources
-    _NATURAL_RESOURCES = {"GLD", "IAU", "SLV", "SIVR", "SGOL", "BAR", "PHYS", "PSLV", "PPLT", "PALL"}
-
-    # Other fixed sector overrides
-    _SPECIAL_SECTORS: dict[str, str] = {
-        "CASH": "Cash & Equivalents",
-    }
 
-    def _is_mutual_fund(sym: str) -> bool:
-        # US mutual funds are almost always 5-letter tickers ending in X
-        # and won't appear in the stock CSV (which covers ETFs/stocks)
-        return len(sym) == 5 and sym.endswith("X") and sym not in _SYMBOL_TO_INDUSTRY
+def _iter_clean(raw_holdings: list) -> Iterator[tuple[str, str, float, bool]]:
+    """clean_holdings as (symbol, industry, value, mutual_fund) tuples, without per-row dicts."""
+    for symbol, industry, value_field, mutual_fund in _iter_rows(raw_holdings):
+        value = parse_currency(value_field)
+        if math.isfinite(value) and value >= 0:
+            yield symbol, industry, value, mutual_fund
 
-    if not isinstance(raw_holdings, list):
-        return []
-    result: list[dict[str, Any]] = []
+
+def _iter_rows(raw_holdings: list) -> Iterator[tuple[str, str, Any, bool]]:
+    """Rows that carry a value field, as (symbol, industry, raw value cell, mutual_fund)."""
     for h in raw_holdings:
         symbol = str(h.get("symbol", "") or "").strip().upper()
 
         if symbol in _SKIP:
             continue
 
-        mutual_fund = False
-
-        if symbol in _NATURAL_RESOURCES:
-            industry = "Natural Resources"
-        elif symbol in _SPECIAL_SECTORS:
-            industry = _SPECIAL_SECTORS[symbol]
-        elif _is_mutual_fund(symbol):
-            industry = "Mutual Funds"
-            mutual_fund = True
-        else:
-            industry = _SYMBOL_TO_INDUSTRY.get(symbol, "")
-            if not industry:
-                industry = str(h.get("industry", "") or "").strip()
-            industry = industry or "Unknown"
+        industry, mutual_fund = _classify_symbol(symbol)
+        if not industry:
+            industry = str(h.get("industry", "") or "").strip() or "Unknown"
 
         # look for any supported value key
         value_field: Any = None
-        for key in ("value", "currentValue", "curVal", "cur_val", "current_value"):
+        for key in _VALUE_KEYS:
             if key in h:
                 value_field = h.get(key)
                 break
         if value_field is None:
             continue
-        value = _parse_num(value_field)
-        if math.isfinite(value) and value >= 0:
-            result.append({"symbol": symbol, "industry": industry, "value": value, "mutual_fund": mutual_fund})
-    return result
+        yield symbol, industry, value_field, mutual_fund
 
 
 def calc_industry_totals(holdings: list) -> dict:
@@ -141,6 +133,263 @@ def rating_from_hhi(hhi: float) -> str:
     return "Concentrated"
 
 
+def portfolio_diversity(raw_holdings: list) -> dict:
+    """Industry breakdown and concentration metrics for one account (the /api/diversity payload)."""
+    holdings = clean_holdings(raw_holdings)
+
+    # Mutual funds are listed but excluded from diversity metrics
+    active  = [h for h in holdings if not h["mutual_fund"]]
+    fund_value = sum(h["value"] for h in holdings if h["mutual_fund"])
+
+    result = calc_industry_totals(active)
+    breakdown = result["breakdown"]
+    active_total = result["total_value"]
+    total_value = active_total + fund_value
+
+    # Metrics use only active (non-mutual-fund) holdings
+    hhi = calc_hhi(breakdown)
+    entropy = calc_entropy(breakdown)
+    effective_industries = math.exp(entropy) if entropy > 0 else 0
+    top_industry_weight = breakdown[0]["weight_pct"] if breakdown else 0
+
+    # Build industry → [symbols] mapping for frontend drill-down
+    industry_stocks: dict[str, list[str]] = {}
+    for h in holdings:
+        sym = h.get("symbol", "")
+        if sym:
+            ind = "Mutual Funds" if h["mutual_fund"] else h["industry"]
+            industry_stocks.setdefault(ind, []).append(sym)
+
+    # Build display breakdown: weight_pct relative to full portfolio
+    display = [
+        {
+            "industry": r["industry"],
+            "value": round(r["value"], 2),
+            "weight_pct": round(r["value"] / total_value * 100, 2) if total_value > 0 else 0.0,
+        }
+        for r in breakdown
+    ]
+    if fund_value > 0:
+        display.append({
+            "industry": "Mutual Funds",
+            "value": round(fund_value, 2),
+            "weight_pct": round(fund_value / total_value * 100, 2) if total_value > 0 else 0.0,
+        })
+    display.sort(key=lambda x: x["value"], reverse=True)
+
+    return {
+        "total_value": total_value,
+        "industry_breakdown": display,
+        "industry_stocks": industry_stocks,
+        "metrics": {
+            "hhi": round(hhi),
+            "entropy": round(entropy, 4),
+            "effective_industries": round(effective_industries, 2),
+            "top_industry_weight_pct": round(top_industry_weight, 2),
+            "rating": rating_from_hhi(hhi),
+        },
+    }
+
+
+@lru_cache(maxsize=1)
+def _industry_codes() -> tuple[dict[str, int], tuple[str, ...]]:
+    """
+    Symbol → industry code for every symbol _classify_symbol resolves without
+    the row's own industry field, plus the code → industry name table.
+
+    Built once from SECURITIES and the override tables. Symbols missing here
+    (mutual funds, unknown tickers, blank sectors) go through _classify_symbol.
+    """
+    names: dict[str, int] = {}
+    codes: dict[str, int] = {}
+    for symbol, sector in zip(SECURITIES.symbols, SECURITIES.sectors):
+        if sector and symbol not in codes:
+            codes[symbol] = names.setdefault(sector, len(names))
+    for symbol in _NATURAL_RESOURCES:
+        codes[symbol] = names.setdefault("Natural Resources", len(names))
+    for symbol, sector in _SPECIAL_SECTORS.items():
+        codes[symbol] = names.setdefault(sector, len(names))
+    return codes, tuple(names)
+
+
+def _round2(values) -> list[float]:
+    """[round(v, 2) for v in values] for a float array, bit-identical to the builtin."""
+    import numpy as np
+
+    scaled = values * 100
+    rounded = np.rint(scaled) / 100
+    # rint(x * 100) / 100 is the double nearest k / 100, as round() is, whenever x * 100
+    # lands clearly off a half; near-halves (and non-finite values) take the builtin
+    ties = ~(np.abs(scaled - np.floor(scaled) - 0.5) > 1e-6)
+    out = rounded.tolist()
+    for i in np.flatnonzero(ties).tolist():
+        out[i] = round(float(values[i]), 2)
+    return out
+
+
+def _value_cell(h: dict) -> Any:
+    for key in _VALUE_KEYS:
+        if key in h:
+            return h.get(key)
+    return None
+
+
+def portfolio_diversity_batch(accounts: list[list]) -> list[dict]:
+    """
+    portfolio_diversity for many accounts at once.
+
+    All accounts' holdings are flattened into parallel columns (account id,
+    industry code, value, fund flag); symbols map to industry codes through a
+    table built once from SECURITIES, so only unlisted symbols are classified
+    row by row. Industry totals come from one bincount over the occupied
+    (account, industry) cells, HHI / entropy / top weight are segment
+    reductions over those cells, and the drill-down groups are sorted the same
+    way, so the per-account loop only slices precomputed lists.
+    """
+    import numpy as np
+
+    n_accounts = len(accounts)
+    lists = [raw if isinstance(raw, list) else [] for raw in accounts]
+    sizes = np.fromiter(map(len, lists), dtype=np.int64, count=n_accounts)
+    rows = [h for raw in lists for h in raw]
+    account = np.repeat(np.arange(n_accounts, dtype=np.int64), sizes)
+
+    symbols = [str(h.get("symbol", "") or "").strip().upper() for h in rows]
+    cells = [_value_cell(h) for h in rows]
+    keep = np.fromiter(
+        (c is not None and s not in _SKIP for s, c in zip(symbols, cells)), dtype=bool, count=len(rows)
+    )
+    values = np.full(len(rows), np.nan)
+    if keep.any():
+        mask = keep.tolist()
+        values[keep] = parse_currency_column(list(compress(cells, mask)))
+    # Drop the rows clean_holdings would: skipped symbols, no value field, unparseable or negative amounts
+    keep &= np.isfinite(values) & (values >= 0)
+    mask = keep.tolist()
+    rows, symbols = list(compress(rows, mask)), list(compress(symbols, mask))
+    account, values = account[keep], values[keep]
+    n = len(symbols)
+
+    # Industry code per row: table lookup, then _classify_symbol for the misses
+    table, listed = _industry_codes()
+    names = list(listed)
+    codes = dict(zip(listed, range(len(listed))))
+    industry = np.fromiter(map(table.get, symbols, repeat(-1)), dtype=np.int64, count=n)
+    fund = np.zeros(n, dtype=bool)
+    for r in np.flatnonzero(industry < 0).tolist():
+        name, fund[r] = _classify_symbol(symbols[r])
+        if not name:
+            name = str(rows[r].get("industry", "") or "").strip() or "Unknown"
+        industry[r] = codes.setdefault(name, len(codes))
+    if len(codes) > len(names):
+        names = list(codes)
+
+    active = ~fund
+    active_total = np.bincount(account[active], weights=values[active], minlength=n_accounts)
+    fund_total = np.bincount(account[fund], weights=values[fund], minlength=n_accounts)
+
+    # Occupied (account, industry) cells; cell ids sort by account, so each account is contiguous
+    n_codes = max(len(codes), 1)
+    cell_ids, inverse = np.unique(account[active] * n_codes + industry[active], return_inverse=True)
+    cell_value = np.bincount(inverse, weights=values[active], minlength=len(cell_ids))
+    first_seen = np.full(len(cell_ids), n, dtype=np.int64)
+    np.minimum.at(first_seen, inverse, np.flatnonzero(active))
+    cell_account = cell_ids // n_codes
+    cell_industry = cell_ids % n_codes
+
+    # Breakdown order per account: value desc, ties by first appearance
+    order = np.lexsort((first_seen, -cell_value, cell_account))
+    cell_value, cell_account, cell_industry = cell_value[order], cell_account[order], cell_industry[order]
+
+    denom = active_total[cell_account]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weight_pct = np.where(denom > 0, cell_value / denom * 100, 0.0)
+    p = weight_pct / 100
+    with np.errstate(divide="ignore", invalid="ignore"):
+        plogp = np.where(p > 0, -p * np.log(p), 0.0)
+
+    hhi = np.bincount(cell_account, weights=weight_pct ** 2, minlength=n_accounts)
+    entropy = np.bincount(cell_account, weights=plogp, minlength=n_accounts)
+    bounds = np.searchsorted(cell_account, np.arange(n_accounts + 1), side="left").tolist()
+
+    # Drill-down groups: rows with a symbol, grouped by (account, display industry) in first-seen order
+    fund_code = codes.setdefault("Mutual Funds", len(codes))
+    if fund_code == len(names):
+        names.append("Mutual Funds")
+    named = np.flatnonzero(np.fromiter(map(bool, symbols), dtype=bool, count=n))
+    shown = np.where(fund, fund_code, industry)[named]
+    group_ids, group_first, group_of = np.unique(
+        account[named] * len(names) + shown, return_index=True, return_inverse=True
+    )
+    by_first = np.argsort(group_first, kind="stable")
+    rank = np.empty_like(by_first)
+    rank[by_first] = np.arange(len(by_first))
+    stock_order = named[np.argsort(rank[group_of], kind="stable")]
+    grouped_symbols = [symbols[r] for r in stock_order.tolist()]
+    group_sizes = np.bincount(group_of, minlength=len(group_ids))[by_first]
+    group_bounds = np.concatenate(([0], np.cumsum(group_sizes))).tolist()
+    group_ids = group_ids[by_first]
+    group_names = [names[c] for c in (group_ids % len(names)).tolist()]
+    group_account_bounds = np.searchsorted(
+        group_ids // len(names), np.arange(n_accounts + 1), side="left"
+    ).tolist()
+
+    # Display rows, rounded in bulk; weights are relative to the full portfolio including funds
+    portfolio_total = (active_total + fund_total)[cell_account]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        display_pct = np.where(portfolio_total > 0, cell_value / portfolio_total * 100, 0.0)
+    cell_names = [names[c] for c in cell_industry.tolist()]
+    display_rows = [
+        {"industry": name, "value": v, "weight_pct": w}
+        for name, v, w in zip(cell_names, _round2(cell_value), _round2(display_pct))
+    ]
+
+    top_weights = weight_pct.tolist()
+    active_totals = active_total.tolist()
+    fund_totals = fund_total.tolist()
+    hhis = hhi.tolist()
+    entropies = entropy.tolist()
+
+    results = []
+    for a in range(n_accounts):
+        lo, hi = bounds[a], bounds[a + 1]
+        fund_value = fund_totals[a]
+        total_value = active_totals[a] + fund_value
+        account_hhi = hhis[a]
+        account_entropy = entropies[a]
+        effective_industries = math.exp(account_entropy) if account_entropy > 0 else 0
+        top_industry_weight = top_weights[lo] if hi > lo else 0
+
+        industry_stocks = {
+            group_names[g]: grouped_symbols[group_bounds[g]:group_bounds[g + 1]]
+            for g in range(group_account_bounds[a], group_account_bounds[a + 1])
+        }
+
+        display = display_rows[lo:hi]
+        # Cells are already in value order; only the fund row needs placing
+        if fund_value > 0:
+            display.append({
+                "industry": "Mutual Funds",
+                "value": round(fund_value, 2),
+                "weight_pct": round(fund_value / total_value * 100, 2) if total_value > 0 else 0.0,
+            })
+            display.sort(key=lambda x: x["value"], reverse=True)
+
+        results.append({
+            "total_value": total_value,
+            "industry_breakdown": display,
+            "industry_stocks": industry_stocks,
+            "metrics": {
+                "hhi": round(account_hhi),
+                "entropy": round(account_entropy, 4),
+                "effective_industries": round(effective_industries, 2),
+                "top_industry_weight_pct": round(top_industry_weight, 2),
+                "rating": rating_from_hhi(account_hhi),
+            },
+        })
+    return results
+
+
 if __name__ == "__main__":
     import json
 
@@ -0,0 +1,181 @@
+import json
+import sqlite3
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+# ---------------------------------------------------------------------------
+# Append-only history of saved holdings snapshots
+#
+# Every /api/save-holdings call appends one row to a SQLite table in WAL mode
+# (one small write, readers never block writers); rows are never updated or
+# deleted.  Timestamps are stored as fixed-width UTC ISO strings, so the
+# index on saved_at answers "latest as of" and range queries with a single
+# seek.  Concurrent saves (several extension tabs, several server workers)
+# are serialized by SQLite's own write lock.
+# ---------------------------------------------------------------------------
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    saved_at TEXT    NOT NULL,
+    rows     INTEGER NOT NULL,
+    data     TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_saved_at ON snapshots (saved_at, id);
+"""
+
+
+def _stamp(moment: datetime) -> str:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _bound(value: date | datetime | None, end: bool) -> str | None:
+    """Timestamp bound for a query; a bare date covers that whole UTC day."""
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.combine(value + timedelta(days=1) if end else value, time(), tzinfo=timezone.utc)
+        return _stamp(value - timedelta(microseconds=1) if end else value)
+    return _stamp(value)
+
+
+class HoldingsStore:
+    """
+    Snapshot store behind /api/save-holdings and the history endpoints.
+
+    append() records a snapshot; latest(as_of) returns the newest snapshot
+    saved at or before a date/datetime; history(start, end) lists snapshot
+    metadata in a range without loading the payloads.
+    """
+
+    def __init__(self, path: Path | str, legacy_file: Path | str | None = None):
+        self.path = Path(path)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+        if legacy_file is not None:
+            self._import_legacy(Path(legacy_file))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # One connection per thread; timeout waits out another writer's lock instead of failing
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, data: list[Any], saved_at: datetime | None = None) -> dict:
+        stamp = _stamp(saved_at or datetime.now(timezone.utc))
+        cursor = self._connect().execute(
+            "INSERT INTO snapshots (saved_at, rows, data) VALUES (?, ?, ?)",
+            (stamp, len(data), json.dumps(data)),
+        )
+        return {"id": cursor.lastrowid, "timestamp": stamp, "rows": len(data)}
+
+    def latest(self, as_of: date | datetime | None = None) -> dict | None:
+        """Newest snapshot saved at or before `as_of` (end of day for a date), or the newest overall."""
+        bound = _bound(as_of, end=True)
+        if bound is None:
+            row = self._connect().execute(
+                "SELECT id, saved_at, rows, data FROM snapshots ORDER BY saved_at DESC, id DESC LIMIT 1"
+            ).fetchone()
+        else:
+            row = self._connect().execute(
+                "SELECT id, saved_at, rows, data FROM snapshots WHERE saved_at <= ?"
+                " ORDER BY saved_at DESC, id DESC LIMIT 1",
+                (bound,),
+            ).fetchone()
+        return _snapshot(row) if row else None
+
+    def get(self, snapshot_id: int) -> dict | None:
+        row = self._connect().execute(
+            "SELECT id, saved_at, rows, data FROM snapshots WHERE id = ?", (snapshot_id,)
+        ).fetchone()
+        return _snapshot(row) if row else None
+
+    def history(
+        self,
+        start: date | datetime | None = None,
+        end: date | datetime | None = None,
+        limit: int | None = 100,
+        include_data: bool = False,
+    ) -> list[dict]:
+        """Snapshots saved in [start, end] (whole days for dates), newest first."""
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("saved_at >= ?")
+            params.append(_bound(start, end=False))
+        if end is not None:
+            clauses.append("saved_at <= ?")
+            params.append(_bound(end, end=True))
+        columns = "id, saved_at, rows, data" if include_data else "id, saved_at, rows"
+        sql = f"SELECT {columns} FROM snapshots"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY saved_at DESC, id DESC"
+        if limit is not None and limit > 0:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [_snapshot(row) for row in self._connect().execute(sql, params)]
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+
+    def _import_legacy(self, legacy_file: Path) -> None:
+        """Carry over the single snapshot the old holdings.json kept, once."""
+        if not legacy_file.exists() or self.count():
+            return
+        try:
+            entry = json.loads(legacy_file.read_text())
+            saved_at = datetime.fromisoformat(entry["timestamp"])
+            data = entry.get("data", [])
+        except (ValueError, KeyError, TypeError):
+            return
+        self.append(data, saved_at)
+
+
+def _snapshot(row: tuple) -> dict:
+    snapshot = {"id": row[0], "timestamp": row[1], "rows": row[2]}
+    if len(row) > 3:
+        snapshot["data"] = json.loads(row[3])
+    return snapshot
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _save_many(path: str, worker: int, n: int) -> None:
+        store = HoldingsStore(path)
+        for i in range(n):
+            store.append([{"symbol": "MSFT", "currentValue": f"${worker * 1000 + i:,}.00"}])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "holdings.db")
+        store = HoldingsStore(path)
+
+        # Concurrent saves: 8 threads and 4 processes, none may be lost
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda w: _save_many(path, w, 50), range(8)))
+        procs = [multiprocessing.Process(target=_save_many, args=(path, 100 + w, 50)) for w in range(4)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        print(f"{store.count()} snapshots after 600 concurrent saves")
+        assert store.count() == 600
+
+        store.append([{"symbol": "AAPL", "value": 1}], datetime(2025, 1, 2, 15, 30, tzinfo=timezone.utc))
+        store.append([{"symbol": "NVDA", "value": 2}], datetime(2025, 1, 3, 9, 0, tzinfo=timezone.utc))
+        assert store.latest(date(2025, 1, 2))["data"][0]["symbol"] == "AAPL"
+        assert store.latest(date(2025, 1, 3))["data"][0]["symbol"] == "NVDA"
+        assert store.latest(date(2025, 1, 1)) is None
+        assert [s["rows"] for s in store.history(date(2025, 1, 2), date(2025, 1, 3))] == [1, 1]
+        print(store.history(limit=3))
@@ -1,28 +1,81 @@
+import startup_profile  # first, so the startup clock starts before anything heavy
+
+import asyncio
 import json
-import math
-import re
-from datetime import datetime, timezone
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
 from pathlib import Path
 from typing import Any
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from compute_volatility import analyze_tickers_volatility, get_close_prices
-from diversity import calc_entropy, calc_hhi, calc_industry_totals, clean_holdings, rating_from_hhi
-from optimize import optimize_sharpe
-from test_stock import list_stock_choices, simulate_add_stock
+import metrics
+from compute_pool import ComputePool, PoolSaturated
+from currency import parse_currency
+from diversity import portfolio_diversity, portfolio_diversity_batch
+from holdings_store import HoldingsStore
+from test_stock import list_stock_choices, load_simulation, simulate_from_inputs
+from volatility_stream import VolatilityStream
+
+# numpy/pandas/scipy-backed modules (optimize, compute_volatility, price_store)
+# are imported inside the routes that need them so /health is up before they load
+_HEAVY_MODULES = ["numpy", "pandas", "scipy.optimize", "price_store", "optimize", "returns_cache", "compute_volatility", "screener", "risk", "clusters", "solution_cache"]
+
+# CPU-heavy analytics run here; sized by COMPUTE_WORKERS / COMPUTE_QUEUE
+compute_pool = ComputePool()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_profile.mark("startup_complete")
+    # API_WARMUP=0 skips background loading of the analytics stack
+    if os.environ.get("API_WARMUP", "1") != "0":
+        startup_profile.warm_up(_HEAVY_MODULES)
+    yield
+    compute_pool.shutdown()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
+startup_profile.mark("app_created")
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["Content-Type"],
+    expose_headers=["Content-Disposition", "X-Snapshot-Id", "X-Snapshot-Timestamp", "Server-Timing"],
 )
 
-HOLDINGS_FILE = Path("holdings.json")
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """Per-route latency histogram; adds Server-Timing with the request's stages when SERVER_TIMING=1."""
+    started = time.perf_counter()
+    token, stages = metrics.start_request()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        route = request.scope.get("route")
+        # Route templates, not raw paths, so /api/holdings/{snapshot_id} is one series
+        metrics.end_request(token, getattr(route, "path", "unmatched"), request.method, status, elapsed)
+    if metrics.SERVER_TIMING:
+        response.headers["Server-Timing"] = metrics.server_timing(stages, elapsed)
+    return response
+
+HOLDINGS_FILE = Path("holdings.json")  # pre-history single snapshot, imported into the store once
+HOLDINGS_DB = Path("holdings.db")
+VOLATILITY_STATE_FILE = Path("volatility_state.json")
+
+holdings_store = HoldingsStore(HOLDINGS_DB, legacy_file=HOLDINGS_FILE)
+volatility_stream = VolatilityStream(VOLATILITY_STATE_FILE)
 
 
 # ── Request models ────────────────────────────────────────────────────────────
@@ -31,10 +84,39 @@ class DiversityRequest(BaseModel):
     holdings: list[Any] = []
 
 
+class DiversityBatchRequest(BaseModel):
+    accounts: list[DiversityRequest]
+
+
 class OptimizeRequest(BaseModel):
     tickers: list[str]
     period: str = "2y"
     risk_free: float = 0.0
+    method: str = "slsqp"
+    cov_estimator: str = "sample"  # sample | ledoit_wolf | sector | pca
+
+
+class VolatilityBar(BaseModel):
+    ticker: str
+    close: float
+    date: str | None = None  # ISO date of the bar, defaults to today
+
+
+class VolatilityUpdateRequest(BaseModel):
+    bars: list[VolatilityBar]
+
+
+class BatchOptimizeRequest(BaseModel):
+    problems: list[OptimizeRequest]
+
+
+class FrontierRequest(BaseModel):
+    tickers: list[str]
+    period: str = "2y"
+    risk_free: float = 0.0
+    points: int = 20
+    stream: bool = False
+    cov_estimator: str = "sample"
 
 
 class SaveHoldingsRequest(BaseModel):
@@ -45,6 +127,8 @@ class OptimizeFromHoldingsRequest(BaseModel):
     data: list[Any]
     period: str = "2y"
     risk_free: float = 0.0
+    method: str = "slsqp"
+    cov_estimator: str = "sample"
 
 
 class SimulateAddRequest(BaseModel):
@@ -55,118 +139,254 @@ class SimulateAddRequest(BaseModel):
     risk_free: float = 0.0
 
 
+class ScreenAdditionsRequest(BaseModel):
+    holdings: list[Any] = []
+    added_value: float
+    period: str = "1y"
+    risk_free: float = 0.0
+    sector: str | None = None
+    top_k: int = 20
+    rank_by: str = "sharpe"  # sharpe | vol | hhi
+
+
+class ClustersRequest(BaseModel):
+    holdings: list[Any] = []     # held tickers from currentValue, or
+    tickers: list[str] = []
+    period: str = "1y"
+    method: str = "average"      # average | complete | single | ward
+    threshold: float | None = None
+    n_clusters: int | None = None
+
+
+class RiskSimulateRequest(BaseModel):
+    holdings: list[Any] = []                # current weights from currentValue, or
+    tickers: list[str] = []                 # tickers with `weights` (default equal weight)
+    weights: dict[str, float] | None = None
+    period: str = "2y"
+    risk_free: float = 0.0
+    method: str = "slsqp"                   # optimizer for the optimized weights
+    simulation: str = "bootstrap"           # bootstrap | mvn
+    paths: int = 10_000
+    horizon_days: int = 21
+    block_size: int = 5
+    seed: int = 0
+    confidence: list[float] = [0.95, 0.99]
+    parallel: bool = False                  # spread the paths over the compute pool's workers
+
+
 # ── Routes ────────────────────────────────────────────────────────────────────
 
+def _busy(e: PoolSaturated) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+
 @app.get("/health")
-def health():
+async def health():
+    startup_profile.mark("first_health")
     return {"ok": True}
 
 
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+def _cache_metrics():
+    """Cache hit/miss counters for /metrics, from the stats the modules already keep (only if loaded)."""
+    hits: list[tuple[dict, float]] = []
+    misses: list[tuple[dict, float]] = []
+    ratios: list[tuple[dict, float]] = []
+
+    def add(cache: str, hit: int, miss: int) -> None:
+        hits.append(({"cache": cache}, hit))
+        misses.append(({"cache": cache}, miss))
+        if hit + miss:
+            ratios.append(({"cache": cache}, round(hit / (hit + miss), 6)))
+
+    info = sys.modules["currency"]._parse_text.cache_info()
+    add("currency_parse", info.hits, info.misses)
+    if "returns_cache" in sys.modules:
+        stats = sys.modules["returns_cache"].get_cache().info()
+        add("returns", stats["hits"], stats["misses"] + stats["derived_superset"] + stats["derived_subset"])
+    if "solution_cache" in sys.modules:
+        stats = sys.modules["solution_cache"].get_cache().info()
+        add("optimize_solutions", stats["hits"], stats["misses"])
+    if "clusters" in sys.modules:
+        stats = sys.modules["clusters"].get_cache().info()
+        add("cluster_distances", stats["hits"], stats["misses"] + stats["derived"])
+    if "price_store" in sys.modules:
+        fetches = sys.modules["price_store"].get_store().fetch_stats().values()
+        # A request that joined another caller's in-flight download is a hit on that download
+        add("price_fetch", sum(f.get("coalesced", 0) for f in fetches), sum(f.get("issued", 0) for f in fetches))
+
+    yield "cache_hits_total", "counter", "Lookups answered from a cache.", hits
+    yield "cache_misses_total", "counter", "Lookups that had to compute or fetch (derived returns-cache entries count here).", misses
+    yield "cache_hit_ratio", "gauge", "hits / (hits + misses) since start.", ratios
+    if "solution_cache" in sys.modules:
+        yield "optimizer_iterations_saved_total", "counter", "SLSQP iterations avoided by warm starts and memoized solutions.", [
+            ({}, sys.modules["solution_cache"].get_cache().stats["iterations_saved"])
+        ]
+    yield "compute_pool_inflight", "gauge", "Jobs running or queued on the compute pool.", [({}, compute_pool.inflight)]
+    yield "compute_pool_jobs_total", "counter", "Compute pool jobs by outcome.", [
+        ({"outcome": outcome}, n) for outcome, n in compute_pool.stats.items()
+    ]
+
+
+metrics.register_collector(_cache_metrics)
+
+
+@app.get("/api/startup-profile")
+async def startup_profile_report():
+    return startup_profile.report()
+
+
 @app.post("/api/diversity")
 def diversity(req: DiversityRequest):
-    holdings = clean_holdings(req.holdings)
-
-    # Mutual funds are listed but excluded from diversity metrics
-    active  = [h for h in holdings if not h["mutual_fund"]]
-    fund_value = sum(h["value"] for h in holdings if h["mutual_fund"])
-
-    result = calc_industry_totals(active)
-    breakdown = result["breakdown"]
-    active_total = result["total_value"]
-    total_value = active_total + fund_value
-
-    # Metrics use only active (non-mutual-fund) holdings
-    hhi = calc_hhi(breakdown)
-    entropy = calc_entropy(breakdown)
-    effective_industries = math.exp(entropy) if entropy > 0 else 0
-    top_industry_weight = breakdown[0]["weight_pct"] if breakdown else 0
-
-    # Build industry → [symbols] mapping for frontend drill-down
-    industry_stocks: dict[str, list[str]] = {}
-    for h in holdings:
-        sym = h.get("symbol", "")
-        if sym:
-            ind = "Mutual Funds" if h["mutual_fund"] else h["industry"]
-            industry_stocks.setdefault(ind, []).append(sym)
-
-    # Build display breakdown: weight_pct relative to full portfolio
-    display = [
-        {
-            "industry": r["industry"],
-            "value": round(r["value"], 2),
-            "weight_pct": round(r["value"] / total_value * 100, 2) if total_value > 0 else 0.0,
-        }
-        for r in breakdown
-    ]
-    if fund_value > 0:
-        display.append({
-            "industry": "Mutual Funds",
-            "value": round(fund_value, 2),
-            "weight_pct": round(fund_value / total_value * 100, 2) if total_value > 0 else 0.0,
-        })
-    display.sort(key=lambda x: x["value"], reverse=True)
+    return portfolio_diversity(req.holdings)
 
+
+@app.post("/api/diversity/batch")
+async def diversity_batch(req: DiversityBatchRequest):
+    started = time.perf_counter()
+    try:
+        results = await compute_pool.run(portfolio_diversity_batch, [a.holdings for a in req.accounts])
+    except PoolSaturated as e:
+        raise _busy(e)
+    elapsed = time.perf_counter() - started
     return {
-        "total_value": total_value,
-        "industry_breakdown": display,
-        "industry_stocks": industry_stocks,
-        "metrics": {
-            "hhi": round(hhi),
-            "entropy": round(entropy, 4),
-            "effective_industries": round(effective_industries, 2),
-            "top_industry_weight_pct": round(top_industry_weight, 2),
-            "rating": rating_from_hhi(hhi),
+        "results": results,
+        "stats": {
+            "accounts": len(results),
+            "elapsed_ms": round(elapsed * 1000, 2),
+            "accounts_per_second": round(len(results) / elapsed, 1) if elapsed > 0 else None,
         },
     }
 
 
+async def _optimize(tickers: list[str], period: str, risk_free: float, method: str, cov_estimator: str = "sample") -> dict:
+    from optimize import _load_moments, normalize_tickers, optimize_sharpe_moments
+
+    tickers = normalize_tickers(tickers)
+    # Price I/O, cached moments and the covariance estimate off the event loop,
+    # the solve itself on the compute pool (factor covariances ship factored)
+    moments = await asyncio.to_thread(_load_moments, tickers, period, cov_estimator)
+    return await compute_pool.run(optimize_sharpe_moments, moments.mu, moments.cov, moments.tickers, risk_free, method)
+
+
+def _check_estimator(cov_estimator: str) -> None:
+    from covariance import ESTIMATORS
+
+    if cov_estimator not in ESTIMATORS:
+        raise HTTPException(status_code=400, detail=f"cov_estimator must be one of {', '.join(ESTIMATORS)}.")
+
+
 @app.post("/api/optimize")
-def optimize(req: OptimizeRequest):
+async def optimize(req: OptimizeRequest):
+    _check_estimator(req.cov_estimator)
     try:
-        result = optimize_sharpe(req.tickers, req.period, req.risk_free)
-        return result
+        return await _optimize(req.tickers, req.period, req.risk_free, req.method, req.cov_estimator)
+    except PoolSaturated as e:
+        raise _busy(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/optimize/batch")
+async def optimize_batch(req: BatchOptimizeRequest):
+    from optimize import load_batch, solve_batch
+
+    try:
+        # Prices and shared covariances through this process's store and cache,
+        # only the solves on the compute pool
+        specs, shared = await asyncio.to_thread(load_batch, [p.model_dump() for p in req.problems])
+        results = await compute_pool.run(solve_batch, specs, shared)
+    except PoolSaturated as e:
+        raise _busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return {"results": results}
+
+
+@app.post("/api/efficient-frontier")
+async def frontier(req: FrontierRequest):
+    from optimize import _load_moments, frontier_points
+
+    if not 1 <= req.points <= 500:
+        raise HTTPException(status_code=400, detail="points must be between 1 and 500.")
+    try:
+        # Up to 500 solves: on the compute pool, not the threadpool /health and /api/stocks share
+        moments = await asyncio.to_thread(_load_moments, req.tickers, req.period, req.cov_estimator)
+        points = await compute_pool.run(
+            frontier_points, moments.mu, moments.cov, moments.tickers, req.risk_free, req.points
+        )
+    except PoolSaturated as e:
+        raise _busy(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not req.stream:
+        return {"tickers": moments.tickers, "points": points}
+
+    # NDJSON: a header line with the tickers, then one line per solved point
+    def _lines():
+        yield json.dumps({"tickers": moments.tickers}) + "\n"
+        for point in points:
+            yield json.dumps(point) + "\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
 
 
 @app.post("/api/save-holdings")
 def save_holdings(req: SaveHoldingsRequest):
-    entry = {
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "data": req.data,
-    }
-    with open(HOLDINGS_FILE, "w") as f:
-        f.write(json.dumps(entry) + "\n")
-    return {"ok": True, "rows_saved": len(req.data)}
+    saved = holdings_store.append(req.data)
+    return {"ok": True, "rows_saved": saved["rows"], "id": saved["id"], "timestamp": saved["timestamp"]}
 
 
-def _parse_currency(val: Any) -> float:
-    """'$1,234.56' → 1234.56, handles ints/floats too."""
-    if isinstance(val, (int, float)):
-        return float(val)
-    cleaned = re.sub(r"[^\d.]", "", str(val))
-    try:
-        return float(cleaned)
-    except ValueError:
-        return 0.0
+@app.get("/api/holdings/history")
+def holdings_history(start: date | None = None, end: date | None = None, limit: int = 100, include_data: bool = False):
+    """Saved snapshots between two dates (inclusive, UTC days), newest first."""
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end.")
+    return {"snapshots": holdings_store.history(start, end, limit=limit, include_data=include_data)}
+
+
+@app.get("/api/holdings/latest")
+def holdings_latest(as_of: date | None = None):
+    """The newest snapshot saved on or before `as_of` (default: the newest overall)."""
+    snapshot = holdings_store.latest(as_of)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No holdings saved yet." if as_of is None else f"No holdings saved on or before {as_of}.")
+    return snapshot
+
+
+@app.get("/api/holdings/{snapshot_id}")
+def holdings_snapshot(snapshot_id: int):
+    snapshot = holdings_store.get(snapshot_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"No snapshot {snapshot_id}.")
+    return snapshot
 
 
 _SKIP = {"pending activity", "account total", "grand total", "account:", "—", "-", "", "CASH"}
 
 
 @app.post("/api/optimize-from-holdings")
-def optimize_from_holdings(req: OptimizeFromHoldingsRequest):
+async def optimize_from_holdings(req: OptimizeFromHoldingsRequest):
+    _check_estimator(req.cov_estimator)
     tickers: list[str] = []
     values:  list[float] = []
 
-    for h in req.data:
-        sym = str(h.get("symbol", "") or "").strip().upper()
-        if sym.lower() in _SKIP or not sym:
-            continue
-        val = _parse_currency(h.get("currentValue", 0))
-        if val > 0:
-            tickers.append(sym)
-            values.append(val)
+    with metrics.span("parse_holdings"):
+        for h in req.data:
+            sym = str(h.get("symbol", "") or "").strip().upper()
+            if sym.lower() in _SKIP or not sym:
+                continue
+            val = parse_currency(h.get("currentValue", 0))
+            if val > 0:
+                tickers.append(sym)
+                values.append(val)
 
     if len(tickers) < 2:
         raise HTTPException(
@@ -174,8 +394,41 @@ def optimize_from_holdings(req: OptimizeFromHoldingsRequest):
             detail="Need at least 2 positions with a current value to optimize.",
         )
 
+    from optimize import _load_moments, optimize_sharpe_warm
+    from solution_cache import get_cache as get_solution_cache
+
     try:
-        result = optimize_sharpe(tickers, req.period, req.risk_free)
+        moments = await asyncio.to_thread(_load_moments, tickers, req.period, req.cov_estimator)
+        solutions = get_solution_cache()
+        set_key = solutions.set_key(moments.tickers, req.period, req.method, req.cov_estimator)
+        as_of = moments.returns.index[-1].date()
+
+        cached = solutions.get(set_key, req.risk_free, as_of)
+        if cached is not None:
+            # The whole solve is saved
+            result, saved = dict(cached[0]), cached[1]
+            warm_start = {"start": "memoized", "iterations": 0, "baseline_iterations": saved}
+        else:
+            # Start from the last optimum for these tickers, else from the current weights
+            starts = {}
+            previous = solutions.warm_start(set_key, moments.tickers)
+            if previous is not None:
+                starts["cached_optimum"] = previous
+            current = {t: v for t, v in zip(tickers, values)}
+            starts["current"] = [current.get(t, 0.0) for t in moments.tickers]
+            result = await compute_pool.run(
+                optimize_sharpe_warm, moments.mu, moments.cov, moments.tickers,
+                req.risk_free, req.method, starts,
+            )
+            warm_start = result.pop("solve")
+            # Savings only against a like-for-like solve: same tickers and rate, no optimum to start from
+            iterations = warm_start["iterations"]
+            baseline = solutions.baseline(set_key, req.risk_free) if warm_start["start"] == "cached_optimum" else None
+            saved = baseline - iterations if baseline is not None and iterations is not None else None
+            warm_start["baseline_iterations"] = baseline
+            solutions.put(set_key, req.risk_free, as_of, dict(result), warm_start["start"], iterations, saved)
+    except PoolSaturated as e:
+        raise _busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -185,11 +438,90 @@ def optimize_from_holdings(req: OptimizeFromHoldingsRequest):
     valid_values = {t: v for t, v in zip(tickers, values) if t in valid_set}
     valid_total = sum(valid_values.values()) or 1.0
     result["current_weights"] = {t: round(v / valid_total, 6) for t, v in valid_values.items()}
+    result["warm_start"] = {**warm_start, "iterations_saved": saved, "as_of": as_of.isoformat()}
     return result
 
 @app.post("/api/volatality_anal")
-def volatility_stocks(req: OptimizeRequest):
-    return(analyze_tickers_volatility(req.tickers, req.period))
+async def volatility_stocks(req: OptimizeRequest):
+    from compute_volatility import analyze_prices_volatility, get_close_prices
+
+    close_prices, close_5y = await asyncio.gather(
+        asyncio.to_thread(get_close_prices, req.tickers, req.period),
+        asyncio.to_thread(get_close_prices, req.tickers, "5y"),
+    )
+    try:
+        return await compute_pool.run(analyze_prices_volatility, req.tickers, req.period, close_prices, close_5y)
+    except PoolSaturated as e:
+        raise _busy(e)
+
+
+@app.post("/api/volatility/update")
+def volatility_update(req: VolatilityUpdateRequest):
+    from price_store import get_close_prices
+
+    today = datetime.now(timezone.utc).date()
+    try:
+        bars = [
+            {
+                "ticker": b.ticker.strip().upper(),
+                "close": b.close,
+                "date": date.fromisoformat(b.date) if b.date else today,
+            }
+            for b in req.bars
+            if b.ticker.strip()
+        ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Unseen tickers are seeded from the last year of history before the bar is applied
+    signals = volatility_stream.update(bars, history=lambda tickers: get_close_prices(tickers, "1y"))
+    spike_tickers = [t for t, m in signals.items() if m["volatility_spike"]]
+    return {
+        "annualized_volatility": signals,
+        "spike_tickers": spike_tickers,
+        "portfolio_risk_alert": (
+            f"Volatility spike in {', '.join(spike_tickers)}; portfolio risk elevated." if spike_tickers else None
+        ),
+    }
+
+
+@app.get("/api/price-store/stats")
+def price_store_stats():
+    from price_store import get_store
+
+    store = get_store()
+    return {"store": store.stats, "fetches": store.fetch_stats()}
+
+
+@app.get("/api/returns-cache/stats")
+def returns_cache_stats():
+    from returns_cache import get_cache
+
+    return get_cache().info()
+
+
+@app.get("/api/solution-cache/stats")
+def solution_cache_stats():
+    from solution_cache import get_cache
+
+    return get_cache().info()
+
+
+@app.get("/api/clusters/stats")
+def clusters_stats():
+    from clusters import get_cache
+
+    return get_cache().info()
+
+
+@app.get("/api/compute-pool/stats")
+async def compute_pool_stats():
+    return {
+        "workers": compute_pool.workers,
+        "capacity": compute_pool.capacity,
+        "inflight": compute_pool.inflight,
+        **compute_pool.stats,
+    }
 
 
 @app.get("/api/stocks")
@@ -198,38 +530,249 @@ def stocks(search: str | None = None, sector: str | None = None, limit: int = 20
 
 
 @app.post("/api/simulate-add")
-def simulate_add(req: SimulateAddRequest):
+async def simulate_add(req: SimulateAddRequest):
     try:
-        return simulate_add_stock(
-            holdings=req.holdings,
-            added_symbol=req.added_symbol,
-            added_value=req.added_value,
-            period=req.period,
-            risk_free=req.risk_free,
+        # Prices and moments through this process's store and cache, the
+        # optimize and volatility branches on the compute pool
+        inputs = await asyncio.to_thread(load_simulation, req.holdings, req.added_symbol, req.added_value, req.period)
+        return await compute_pool.run(simulate_from_inputs, inputs, req.risk_free)
+    except PoolSaturated as e:
+        raise _busy(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/screen-additions")
+async def screen_additions(req: ScreenAdditionsRequest):
+    from screener import load_screen, score_screen
+
+    if not 1 <= req.top_k <= 1000:
+        raise HTTPException(status_code=400, detail="top_k must be between 1 and 1000.")
+    try:
+        # Universe prices and covariance through this process's store and
+        # returns cache, so repeated screens reuse them; scoring on the pool
+        inputs = await asyncio.to_thread(
+            load_screen, req.holdings, req.added_value, req.period, req.sector, req.rank_by
+        )
+        return await compute_pool.run(score_screen, inputs, req.risk_free, req.top_k)
+    except PoolSaturated as e:
+        raise _busy(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/clusters")
+async def clusters(req: ClustersRequest):
+    from clusters import build_entry, build_linkage, check_request, cut_tree, get_cache
+    from test_stock import _extract_weighted_tickers
+
+    tickers = _extract_weighted_tickers(req.holdings)[0] if req.holdings else req.tickers
+    try:
+        order_in = check_request(tickers, req.method, req.threshold, req.n_clusters)
+        started = time.perf_counter()
+        # The distance-matrix cache lives in this process: lookups and price I/O
+        # here, the distance rows and linkage it is missing on the compute pool
+        cache = get_cache()
+        entry, job = await asyncio.to_thread(cache.prepare, order_in, req.period)
+        if job is not None:
+            built = await compute_pool.run(build_entry, job.priced, job.index, job.returns, job.base)
+            entry = cache.finish(job, built)
+        distances_ms = round((time.perf_counter() - started) * 1000, 2)
+        Z = entry.linkages.get(req.method)
+        if Z is None:
+            Z = entry.linkages[req.method] = await compute_pool.run(build_linkage, entry.condensed, req.method)
+        result = cut_tree(entry.tickers, Z, order_in, req.period, req.method, req.threshold, req.n_clusters)
+        result["timings"] = {"distances": distances_ms, "total": round((time.perf_counter() - started) * 1000, 2)}
+        return result
+    except PoolSaturated as e:
+        raise _busy(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/risk/simulate")
+async def risk_simulate(req: RiskSimulateRequest):
+    import numpy as np
+    from optimize import optimize_sharpe_moments
+    from returns_cache import get_moments
+    from risk import METHODS, portfolio_returns, simulate_chunks, simulate_risk, split_chunks, summarize
+    from test_stock import _extract_weighted_tickers
+
+    if req.simulation not in METHODS:
+        raise HTTPException(status_code=400, detail=f"simulation must be one of {', '.join(METHODS)}.")
+    if not 1 <= req.paths <= 2_000_000:
+        raise HTTPException(status_code=400, detail="paths must be between 1 and 2,000,000.")
+    if not 1 <= req.horizon_days <= 756 or req.block_size < 1:
+        raise HTTPException(status_code=400, detail="horizon_days must be between 1 and 756 and block_size >= 1.")
+    if not req.confidence or not all(0 < q < 1 for q in req.confidence):
+        raise HTTPException(status_code=400, detail="confidence levels must be between 0 and 1.")
+
+    if req.holdings:
+        tickers, values = _extract_weighted_tickers(req.holdings)
+    else:
+        tickers = list(dict.fromkeys(t.strip().upper() for t in req.tickers if t.strip()))
+        weights = {k.strip().upper(): v for k, v in (req.weights or {}).items()}
+        values = {t: weights.get(t, 0.0 if weights else 1.0) for t in tickers}
+    if len(tickers) < 2:
+        raise HTTPException(status_code=400, detail="Need at least 2 tickers to simulate.")
+
+    try:
+        moments = await asyncio.to_thread(get_moments, tickers, req.period)
+        optimized = await compute_pool.run(
+            optimize_sharpe_moments, moments.mu, moments.cov, moments.tickers, req.risk_free, req.method
         )
+
+        # Current weights renormalized to the tickers that have prices, as optimize-from-holdings does
+        current = np.array([max(values.get(t, 0.0), 0.0) for t in moments.tickers])
+        if current.sum() <= 0:
+            raise ValueError("None of the weighted tickers have price history.")
+        current = current / current.sum()
+        best = np.array([optimized["weights"][t] for t in moments.tickers])
+        port = portfolio_returns(moments.returns, np.column_stack([current, best]))
+        names = ["current", "optimized"]
+
+        chunk_paths = 5000
+        args = (req.simulation, req.paths, req.horizon_days, req.block_size, req.seed, chunk_paths)
+        jobs = split_chunks(req.paths, chunk_paths, compute_pool.workers if req.parallel else 1)
+        if len(jobs) == 1:
+            risk = await compute_pool.run(simulate_risk, port, names, *args, req.confidence)
+        else:
+            parts = await asyncio.gather(*(compute_pool.run(simulate_chunks, port, *args, chunks) for chunks in jobs))
+            terminal = np.concatenate([p[0] for p in parts])
+            drawdown = np.concatenate([p[1] for p in parts])
+            risk = await asyncio.to_thread(summarize, terminal, drawdown, names, req.confidence)
+    except PoolSaturated as e:
+        raise _busy(e)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    return {
+        "tickers": moments.tickers,
+        "days": len(moments.returns),
+        "simulation": {
+            "method": req.simulation,
+            "paths": req.paths,
+            "horizon_days": req.horizon_days,
+            "block_size": req.block_size if req.simulation == "bootstrap" else None,
+            "seed": req.seed,
+            "jobs": len(jobs),
+        },
+        "weights": {
+            "current": {t: round(float(w), 6) for t, w in zip(moments.tickers, current)},
+            "optimized": optimized["weights"],
+        },
+        "optimized": {k: optimized[k] for k in ("sharpe", "annual_return", "annual_vol")},
+        "risk": risk,
+    }
+
+
+def _price_download(
+    request: Request,
+    tickers: list[str],
+    start: date,
+    end: date,
+    fmt: str,
+    gzip: bool | None,
+    chunk_rows: int,
+    stem: str,
+    headers: dict[str, str] | None = None,
+) -> StreamingResponse:
+    """Stream closes for tickers over start..end in `fmt`, gzipped if asked for or if the client accepts it."""
+    from price_export import FORMATS, ExportFormatUnavailable, encode, gzip_stream
+    from price_store import get_store
+
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}.")
+    try:
+        # Fetches anything missing before the response starts, so failures still get a status code
+        body = encode(get_store().iter_frames(tickers, start, end, chunk_rows), fmt)
+    except ExportFormatUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    media_type, ext = FORMATS[fmt]
+    headers = {"Content-Disposition": f'attachment; filename="{stem}.{ext}"', **(headers or {})}
+    if gzip is None:
+        gzip = "gzip" in request.headers.get("accept-encoding", "")
+    if gzip:
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+
+@app.get("/api/prices/export")
+def export_prices(
+    request: Request,
+    tickers: str,
+    period: str = "1y",
+    start: date | None = None,
+    end: date | None = None,
+    fmt: str = Query("csv", alias="format"),
+    gzip: bool | None = None,
+    chunk_rows: int = 1000,
+):
+    """
+    Close-price history as a download, streamed in chunks of `chunk_rows` dates.
+
+    `tickers` is comma-separated; start/end override `period`. format is csv,
+    arrow (IPC stream) or parquet; the latter two need pyarrow.
+    """
+    from price_store import get_store
+
+    symbols = list(dict.fromkeys(t.strip().upper() for t in tickers.split(",") if t.strip()))
+    if not symbols:
+        raise HTTPException(status_code=400, detail="Provide at least one ticker.")
+    try:
+        period_from, period_to = get_store().period_range(period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    start, end = start or period_from, end or period_to
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end.")
+    return _price_download(request, symbols, start, end, fmt, gzip, chunk_rows, stem=f"prices_{start}_{end}")
+
+
 @app.get("/api/get-csv-of-stocks/{date}")
-def get_stocks_csv(date: str):
-    if not HOLDINGS_FILE.exists():
-        raise HTTPException(status_code=404, detail="No holdings saved yet.")
-    with open(HOLDINGS_FILE) as f:
-        entry = json.load(f)
-    holdings_data = entry.get("data", [])
-    arr = list({
+def get_stocks_csv(
+    request: Request,
+    date: str,
+    fmt: str = Query("csv", alias="format"),
+    gzip: bool | None = None,
+    chunk_rows: int = 1000,
+):
+    """One year of closes up to `date` for the holdings saved as of that date, streamed as a download."""
+    from price_store import period_start
+
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD.")
+    snapshot = holdings_store.latest(day)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"No holdings saved on or before {date}.")
+    arr = list(dict.fromkeys(
         h.get("symbol", "").strip().upper()
-        for h in holdings_data
+        for h in snapshot["data"]
         if h.get("symbol", "").strip()
         and h.get("symbol", "").strip().upper() not in _SKIP
-    })
+    ))
     if not arr:
         raise HTTPException(status_code=400, detail="No valid tickers found in holdings.")
-    out_path = f"stocks_{date}.csv"
-    get_close_prices(arr, "1y").to_csv(out_path)
-    return {"ok": True, "file": out_path, "tickers": arr, "len" : len(arr)}
+    end = min(day, datetime.now(timezone.utc).date())
+    return _price_download(
+        request, arr, period_start("1y", end), end, fmt, gzip, chunk_rows,
+        stem=f"stocks_{date}",
+        headers={"X-Snapshot-Id": str(snapshot["id"]), "X-Snapshot-Timestamp": snapshot["timestamp"]},
+    )
 
 # ── Dev entry point ───────────────────────────────────────────────────────────
 
@@ -0,0 +1,240 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable
+
+# ---------------------------------------------------------------------------
+# Request / stage metrics in Prometheus text format
+#
+# Routes are timed by the HTTP middleware in main.py; code inside them marks
+# stages with `with span("download"): ...`.  Each span feeds the
+# stage_duration_seconds histogram and, while a request is being handled, that
+# request's stage list, which becomes its Server-Timing header when
+# SERVER_TIMING=1.
+#
+# Compute-pool jobs run in other processes, so run_captured() buffers what a
+# job records and hands it back with the result; replay() applies it in the
+# API process, where /metrics is served and the request's stages are kept.
+#
+# Cache sizes and hit counts are read at scrape time from collectors
+# registered by main.py, so nothing is counted twice.
+# ---------------------------------------------------------------------------
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ITERATION_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series: dict[_Labels, list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: _Labels = ()) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def lines(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                out.append(f"{self.name}_bucket{_fmt_labels(labels + (('le', _fmt_value(bound)),))} {cumulative}")
+            out.append(f"{self.name}_bucket{_fmt_labels(labels + (('le', '+Inf'),))} {series[-1]}")
+            out.append(f"{self.name}_sum{_fmt_labels(labels)} {_fmt_value(series[-2])}")
+            out.append(f"{self.name}_count{_fmt_labels(labels)} {series[-1]}")
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._series: dict[_Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, labels: _Labels = ()) -> None:
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def lines(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._series.items())
+        out.extend(f"{self.name}{_fmt_labels(labels)} {_fmt_value(value)}" for labels, value in items)
+        return out
+
+
+REQUESTS = Histogram("http_request_duration_seconds", "Time to handle a request, by route template, method and status.")
+STAGES = Histogram("stage_duration_seconds", "Time spent in a named stage (download, align, covariance, solve, ...).")
+ITERATIONS = Histogram("optimizer_iterations", "Iterations per SLSQP solve, by problem.", ITERATION_BUCKETS)
+SOLVES = Counter("optimizer_solves_total", "Optimizer solves by problem and outcome (closed_form, converged, failed).")
+
+_METRICS: dict[str, Histogram | Counter] = {m.name: m for m in (REQUESTS, STAGES, ITERATIONS, SOLVES)}
+_collectors: list[Callable[[], Iterable[tuple[str, str, str, list[tuple[dict, float]]]]]] = []
+
+# Stages of the request being handled (set by the middleware), and the buffer of
+# a compute-pool job being captured
+_request_stages: ContextVar[list[tuple[str, float]] | None] = ContextVar("request_stages", default=None)
+_captured: ContextVar[list[tuple] | None] = ContextVar("captured_metrics", default=None)
+
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+
+
+def _fmt_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: _Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels) + "}"
+
+
+def _record(name: str, value: float, labels: _Labels) -> None:
+    buffer = _captured.get()
+    if buffer is not None:
+        buffer.append((name, value, labels))
+        return
+    metric = _METRICS[name]
+    if isinstance(metric, Histogram):
+        metric.observe(value, labels)
+    else:
+        metric.inc(value, labels)
+    if metric is STAGES:
+        stages = _request_stages.get()
+        if stages is not None:
+            stages.append((labels[0][1], value))
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    """Record `value` on histogram `name` (or add it to counter `name`)."""
+    _record(name, value, tuple(sorted(labels.items())))
+
+
+@contextmanager
+def span(stage: str):
+    """Time the block as `stage`; nests freely, and each span is recorded on its own."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(STAGES.name, time.perf_counter() - start, (("stage", stage),))
+
+
+def observe_solve(problem: str, outcome: str, iterations: int | None = None) -> None:
+    """Count one optimizer solve; iterative ones also record their iteration count."""
+    _record(SOLVES.name, 1, (("outcome", outcome), ("problem", problem)))
+    if iterations is not None:
+        _record(ITERATIONS.name, iterations, (("problem", problem),))
+
+
+def register_collector(collect: Callable[[], Iterable[tuple[str, str, str, list[tuple[dict, float]]]]]) -> None:
+    """collect() yields (name, type, help, [(labels, value), ...]) for gauges/counters read at scrape time."""
+    _collectors.append(collect)
+
+
+# ── Compute-pool jobs ──────────────────────────────────────────────────────
+
+def run_captured(fn, *args, **kwargs):
+    """Run fn and return (result, recorded metrics) instead of recording them in this process."""
+    buffer: list[tuple] = []
+    token = _captured.set(buffer)
+    try:
+        return fn(*args, **kwargs), buffer
+    finally:
+        _captured.reset(token)
+
+
+def replay(recorded: list[tuple]) -> None:
+    for name, value, labels in recorded:
+        _record(name, value, labels)
+
+
+# ── Requests ───────────────────────────────────────────────────────────────
+
+def start_request() -> tuple[object, list[tuple[str, float]]]:
+    stages: list[tuple[str, float]] = []
+    return _request_stages.set(stages), stages
+
+
+def end_request(token, route: str, method: str, status: int, seconds: float) -> None:
+    _request_stages.reset(token)
+    REQUESTS.observe(seconds, (("method", method), ("route", route), ("status", str(status))))
+
+
+def server_timing(stages: list[tuple[str, float]], total: float) -> str:
+    """Server-Timing header value: one entry per stage (repeats summed, first-seen order) plus the total."""
+    summed: dict[str, float] = {}
+    for stage, seconds in stages:
+        summed[stage] = summed.get(stage, 0.0) + seconds
+    entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in summed.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def render() -> str:
+    """Everything in Prometheus text exposition format (version 0.0.4)."""
+    lines: list[str] = []
+    for metric in _METRICS.values():
+        lines.extend(metric.lines())
+    for collect in _collectors:
+        try:
+            families = list(collect())
+        except Exception as exc:
+            lines.append(f"# collector {getattr(collect, '__name__', collect)!s} failed: {exc}")
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_fmt_labels(tuple(sorted(labels.items())))} {_fmt_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    def _job(n: int) -> int:
+        with span("job"):
+            observe_solve("demo", "converged", n)
+            return n * n
+
+    token, stages = start_request()
+    with span("download"):
+        time.sleep(0.01)
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        for result, recorded in pool.map(partial(run_captured, _job), [3, 7]):
+            replay(recorded)
+    end_request(token, "/demo", "GET", 200, 0.02)
+
+    print(server_timing(stages, 0.02))
+    text = render()
+    print(text)
+    assert 'optimizer_iterations_count{problem="demo"} 2' in text
+    assert [s for s, _ in stages] == ["download", "job", "job"]
@@ -1,18 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-import yfinance as yf
 from scipy.optimize import minimize
 
+import covariance
+import metrics
+import price_store
+
 
-def _fetch_clean_returns(tickers: list[str], period: str) -> tuple[np.ndarray, list[str]]:
+def _load_moments(tickers: list[str], period: str, cov_estimator: str = "sample"):
     """
-    Download closing prices, drop tickers with insufficient data, and return
-    daily returns as a numpy array alongside the valid ticker list.
+    Aligned returns and annualized mean / covariance for the tickers with
+    enough data, from the shared returns cache (built from the price store on
+    a miss). cov is the `cov_estimator` estimate (see covariance.py).
     """
-    raw = yf.download(tickers, period=period, auto_adjust=True, progress=False)["Close"]
+    from returns_cache import get_moments  # returns_cache imports clean_returns from here
+
+    if cov_estimator not in covariance.ESTIMATORS:
+        raise ValueError(f"cov_estimator must be one of {', '.join(covariance.ESTIMATORS)}.")
+    moments = get_moments(tickers, period)
+    if cov_estimator == "sample":
+        return moments
+    with metrics.span("cov_estimate"):
+        return moments._replace(cov=covariance.estimate(moments, cov_estimator))
+
+
+def normalize_tickers(tickers: list[str]) -> list[str]:
+    """Stripped, upper-cased tickers without blanks or repeats, in first-seen order."""
+    return list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+
 
-    if len(tickers) == 1:
-        raw = raw.to_frame(name=tickers[0])
+def clean_returns(raw, tickers: list[str]):
+    """Aligned daily returns (DataFrame) for the tickers in `raw` with enough data."""
+    with metrics.span("align"):
+        return _clean_returns(raw, tickers)
 
+
+def _clean_returns(raw, tickers: list[str]):
     # Keep only columns that were actually downloaded and have enough data
     min_rows = 30
     valid = [t for t in tickers if t in raw.columns and raw[t].notna().sum() >= min_rows]
@@ -31,7 +55,7 @@ def _fetch_clean_returns(tickers: list[str], period: str) -> tuple[np.ndarray, l
             f"Only {len(returns)} clean trading days after aligning tickers — need at least {min_rows}."
         )
 
-    return returns.values, valid
+    return returns
 
 
 def sharpe_ratio(weights: np.ndarray, returns: np.ndarray, risk_free: float = 0.0) -> float:
@@ -47,18 +71,192 @@ def neg_sharpe(weights, returns, risk_free):
     return -sharpe_ratio(weights, returns, risk_free)
 
 
+class SharpeProblem:
+    """
+    Max-Sharpe problem on a fixed returns matrix.
+
+    Annualized mean and covariance are computed once up front; the objective
+    returns its analytic gradient so SLSQP does not rebuild the covariance for
+    every finite-difference step. cov may be a covariance.FactorCov, which is
+    only ever multiplied or solved with, never expanded.
+    """
+
+    def __init__(self, returns: np.ndarray, risk_free: float = 0.0):
+        self._set_moments(returns.mean(axis=0) * 252, np.atleast_2d(np.cov(returns.T)) * 252, risk_free)
+
+    @classmethod
+    def from_moments(cls, mu: np.ndarray, cov: np.ndarray, risk_free: float = 0.0) -> "SharpeProblem":
+        """Build from already annualized mean/covariance (shared between problems, not copied)."""
+        problem = cls.__new__(cls)
+        problem._set_moments(mu, cov, risk_free)
+        return problem
+
+    def _set_moments(self, mu: np.ndarray, cov: np.ndarray, risk_free: float) -> None:
+        self.mu = mu
+        self.cov = cov
+        self.risk_free = risk_free
+        self.n = mu.shape[0]
+        self.iterations: int | None = None  # SLSQP iterations of the last solve (None: closed form)
+
+    def annual_return(self, weights: np.ndarray) -> float:
+        return float(self.mu @ weights)
+
+    def annual_vol(self, weights: np.ndarray) -> float:
+        return float(np.sqrt(weights @ self.cov @ weights))
+
+    def sharpe(self, weights: np.ndarray) -> float:
+        vol = self.annual_vol(weights)
+        if vol == 0:
+            return 0.0
+        return (self.annual_return(weights) - self.risk_free) / vol
+
+    def neg_sharpe_and_grad(self, weights: np.ndarray) -> tuple[float, np.ndarray]:
+        cov_w = self.cov @ weights
+        var = float(weights @ cov_w)
+        if var <= 0:
+            return 0.0, np.zeros(self.n)
+        vol = np.sqrt(var)
+        excess = float(self.mu @ weights) - self.risk_free
+        # d/dw (excess / vol) = mu / vol - excess * cov_w / vol^3
+        grad = self.mu / vol - excess * cov_w / (var * vol)
+        return -excess / vol, -grad
+
+    def solve(self, method: str = "slsqp", x0: np.ndarray | None = None) -> np.ndarray:
+        """Long-only, fully invested max-Sharpe weights. method: 'slsqp' or 'qp'."""
+        if method not in ("qp", "slsqp"):
+            raise ValueError(f"Unknown optimizer method: {method!r}")
+        self.iterations = None
+        with metrics.span("solve"):
+            if method == "qp":
+                weights = self._solve_qp(x0)
+                if weights is not None:
+                    return weights
+            return self._solve_slsqp(x0)
+
+    def _solve_slsqp(self, x0: np.ndarray | None) -> np.ndarray:
+        n = self.n
+        result = minimize(
+            self.neg_sharpe_and_grad,
+            np.full(n, 1.0 / n) if x0 is None else x0,
+            jac=True,
+            method="SLSQP",
+            bounds=[(0.0, 1.0)] * n,
+            constraints={"type": "eq", "fun": lambda w: w.sum() - 1.0, "jac": lambda w: np.ones((1, n))},
+            options={"ftol": 1e-9, "maxiter": 1000},
+        )
+        metrics.observe_solve("max_sharpe", "converged" if result.success else "failed", result.nit)
+        self.iterations = result.nit
+        if not result.success:
+            raise RuntimeError(f"Optimization failed: {result.message}")
+        return result.x
+
+    def _solve_qp(self, x0: np.ndarray | None = None) -> np.ndarray | None:
+        """
+        Tangency portfolio via the convex reformulation
+            min y' cov y  s.t.  (mu - rf)' y = 1,  y >= 0,   w = y / sum(y).
+        Uses the closed form cov^-1 (mu - rf) when it is already long-only;
+        otherwise the QP starts from x0 (scaled onto the constraint) if given.
+        Returns None when no asset beats the risk-free rate (QP infeasible).
+        """
+        excess = self.mu - self.risk_free
+        if not np.any(excess > 0):
+            return None
+
+        try:
+            y = covariance.solve(self.cov, excess)
+        except np.linalg.LinAlgError:
+            y = None
+        if y is not None and np.all(y >= 0) and y.sum() > 0:
+            metrics.observe_solve("tangency_qp", "closed_form")
+            return y / y.sum()
+
+        n = self.n
+        if x0 is not None and excess @ x0 > 0:
+            y0 = x0 / (excess @ x0)
+        else:
+            y0 = np.where(excess > 0, excess, 0.0)
+            y0 /= excess @ y0
+        result = minimize(
+            lambda y: (y @ self.cov @ y, 2 * (self.cov @ y)),
+            y0,
+            jac=True,
+            method="SLSQP",
+            bounds=[(0.0, None)] * n,
+            constraints={"type": "eq", "fun": lambda y: excess @ y - 1.0, "jac": lambda y: excess[None, :]},
+            options={"ftol": 1e-12, "maxiter": 1000},
+        )
+        metrics.observe_solve("tangency_qp", "converged" if result.success else "failed", result.nit)
+        self.iterations = result.nit
+        if not result.success or result.x.sum() <= 0:
+            return None
+        y = np.clip(result.x, 0.0, None)
+        return y / y.sum()
+
+    def min_variance(self, target_return: float | None = None, x0: np.ndarray | None = None) -> np.ndarray:
+        """Long-only minimum-variance weights, optionally pinned to an annual target return."""
+        n = self.n
+        constraints = [{"type": "eq", "fun": lambda w: w.sum() - 1.0, "jac": lambda w: np.ones((1, n))}]
+        if target_return is not None:
+            constraints.append({
+                "type": "eq",
+                "fun": lambda w: self.mu @ w - target_return,
+                "jac": lambda w: self.mu[None, :],
+            })
+        result = minimize(
+            lambda w: (w @ self.cov @ w, 2 * (self.cov @ w)),
+            np.full(n, 1.0 / n) if x0 is None else x0,
+            jac=True,
+            method="SLSQP",
+            bounds=[(0.0, 1.0)] * n,
+            constraints=constraints,
+            options={"ftol": 1e-12, "maxiter": 1000},
+        )
+        metrics.observe_solve("min_variance", "converged" if result.success else "failed", result.nit)
+        if not result.success:
+            raise RuntimeError(f"Optimization failed: {result.message}")
+        return result.x
+
+    def frontier(self, points: int = 20):
+        """
+        Yield (target_return, weights) along the long-only efficient frontier,
+        from the minimum-variance portfolio up to the highest-return asset.
+        Each solve is warm-started from the previous point's weights.
+        """
+        weights = self.min_variance()
+        low, high = self.annual_return(weights), float(self.mu.max())
+        targets = np.linspace(low, high, points) if high > low else np.array([low])
+        for i, target in enumerate(targets):
+            if i > 0:
+                weights = self.min_variance(float(target), x0=weights)
+            yield float(target), weights
+
+    def result(self, tickers: list[str], weights: np.ndarray) -> dict:
+        return {
+            "tickers":       tickers,
+            "weights":       {t: round(float(w), 6) for t, w in zip(tickers, weights)},
+            "sharpe":        round(float(self.sharpe(weights)), 6),
+            "annual_return": round(self.annual_return(weights), 6),
+            "annual_vol":    round(self.annual_vol(weights), 6),
+        }
+
+
 def optimize_sharpe(
     tickers: list[str],
     period: str = "2y",
     risk_free: float = 0.0,
+    method: str = "slsqp",
+    cov_estimator: str = "sample",
 ) -> dict:
     """
     Optimize portfolio weights to maximize Sharpe ratio.
 
     Args:
-        tickers:    List of stock ticker symbols.
-        period:     Historical data window (e.g. '1y', '2y').
-        risk_free:  Annual risk-free rate (decimal, e.g. 0.05 for 5%).
+        tickers:        List of stock ticker symbols.
+        period:         Historical data window (e.g. '1y', '2y').
+        risk_free:      Annual risk-free rate (decimal, e.g. 0.05 for 5%).
+        method:         'slsqp' (analytic-gradient SLSQP) or 'qp' (tangency QP / closed form).
+        cov_estimator:  'sample', 'ledoit_wolf', 'sector' or 'pca' (factor models
+                        for large universes; see covariance.py).
 
     Returns:
         {
@@ -69,38 +267,231 @@ def optimize_sharpe(
             "annual_vol":    expected annual volatility,
         }
     """
-    returns, valid_tickers = _fetch_clean_returns(tickers, period)
-    n = len(valid_tickers)
-
-    x0 = np.full(n, 1.0 / n)
-    bounds = [(0.0, 1.0)] * n
-    constraints = {"type": "eq", "fun": lambda w: w.sum() - 1.0}
-
-    result = minimize(
-        neg_sharpe,
-        x0,
-        args=(returns, risk_free),
-        method="SLSQP",
-        bounds=bounds,
-        constraints=constraints,
-        options={"ftol": 1e-9, "maxiter": 1000},
-    )
-
-    if not result.success:
-        raise RuntimeError(f"Optimization failed: {result.message}")
-
-    weights = result.x
-    sr      = sharpe_ratio(weights, returns, risk_free)
-    ann_ret = np.dot(returns.mean(axis=0), weights) * 252
-    ann_vol = np.sqrt(weights @ (np.cov(returns.T) * 252) @ weights)
-
-    return {
-        "tickers":       valid_tickers,
-        "weights":       {t: round(float(w), 6) for t, w in zip(valid_tickers, weights)},
-        "sharpe":        round(float(sr), 6),
-        "annual_return": round(float(ann_ret), 6),
-        "annual_vol":    round(float(ann_vol), 6),
-    }
+    moments = _load_moments(tickers, period, cov_estimator)
+    return optimize_sharpe_moments(moments.mu, moments.cov, moments.tickers, risk_free, method=method)
+
+
+def optimize_sharpe_returns(
+    returns: np.ndarray,
+    valid_tickers: list[str],
+    risk_free: float = 0.0,
+    method: str = "slsqp",
+) -> dict:
+    """Same as optimize_sharpe, on an already aligned (days x tickers) returns matrix."""
+    problem = SharpeProblem(returns, risk_free)
+    return problem.result(valid_tickers, problem.solve(method))
+
+
+def optimize_sharpe_moments(
+    mu: np.ndarray,
+    cov: np.ndarray,
+    valid_tickers: list[str],
+    risk_free: float = 0.0,
+    method: str = "slsqp",
+) -> dict:
+    """Same as optimize_sharpe, on annualized mean / covariance (e.g. from the returns cache)."""
+    problem = SharpeProblem.from_moments(mu, cov, risk_free)
+    return problem.result(valid_tickers, problem.solve(method))
+
+
+def optimize_sharpe_warm(
+    mu: np.ndarray,
+    cov: np.ndarray,
+    valid_tickers: list[str],
+    risk_free: float = 0.0,
+    method: str = "slsqp",
+    starts: dict[str, np.ndarray] | None = None,
+) -> dict:
+    """
+    optimize_sharpe_moments started from the first usable entry of `starts`
+    (name -> weights over valid_tickers, in order of preference, e.g. a
+    previous optimum, then the current holdings), clipped to the long-only
+    simplex; from equal weights when none is usable.
+
+    The result gains "solve": {"start", "iterations"}.
+    """
+    problem = SharpeProblem.from_moments(mu, cov, risk_free)
+    name, x0 = "equal", None
+    for start_name, weights in (starts or {}).items():
+        weights = np.clip(np.asarray(weights, dtype=float), 0.0, None)
+        if weights.shape == (problem.n,) and weights.sum() > 0:
+            name, x0 = start_name, weights / weights.sum()
+            break
+
+    weights = problem.solve(method, x0)
+    result = problem.result(valid_tickers, weights)
+    result["solve"] = {"start": name, "iterations": problem.iterations}
+    return result
+
+
+def efficient_frontier(
+    tickers: list[str],
+    period: str = "2y",
+    risk_free: float = 0.0,
+    points: int = 20,
+    cov_estimator: str = "sample",
+):
+    """
+    Returns (valid_tickers, iterator of frontier points). Prices and covariance
+    are loaded eagerly so data errors surface before the first point is solved.
+
+    Each point: {"target_return", "annual_return", "annual_vol", "sharpe", "weights"}.
+    """
+    moments = _load_moments(tickers, period, cov_estimator)
+    problem = SharpeProblem.from_moments(moments.mu, moments.cov, risk_free)
+    return moments.tickers, _frontier(problem, moments.tickers, points)
+
+
+def frontier_points(mu: np.ndarray, cov, valid_tickers: list[str], risk_free: float = 0.0, points: int = 20) -> list[dict]:
+    """Every efficient_frontier point from preloaded moments, solved eagerly (one compute-pool job)."""
+    return list(_frontier(SharpeProblem.from_moments(mu, cov, risk_free), valid_tickers, points))
+
+
+def _frontier(problem: SharpeProblem, valid_tickers: list[str], points: int):
+    for target, weights in problem.frontier(points):
+        point = problem.result(valid_tickers, weights)
+        del point["tickers"]
+        yield {"target_return": round(target, 6), **point}
+
+
+def optimize_sharpe_batch(problems: list[dict], max_workers: int = 8) -> list[dict]:
+    """
+    Solve many max-Sharpe problems in one call.
+
+    Each problem is {"tickers", "period"="2y", "risk_free"=0.0, "method"="slsqp",
+    "cov_estimator"="sample"}. Prices are fetched once per period for the union of
+    tickers, and each distinct (period, ticker set, cov_estimator) covariance is
+    estimated once and shared by every risk-free scenario on it, whatever order
+    the tickers are listed in. 'qp' problems sharing a covariance solve their
+    closed-form tangency portfolios together; the rest run on a thread pool.
+    Results come back in input order, each listing its tickers in the order
+    given; a failed problem yields {"error": ...}.
+
+    load_batch and solve_batch are the I/O and compute halves, for callers that
+    run them in different places (the API loads in-process, solves on the pool).
+    """
+    specs, shared = load_batch(problems)
+    return solve_batch(specs, shared, max_workers)
+
+
+def _batch_key(spec: tuple) -> tuple:
+    tickers, period, _, _, cov_estimator = spec
+    return period, tuple(sorted(tickers)), cov_estimator
+
+
+def load_batch(problems: list[dict]) -> tuple[list[tuple], dict[tuple, tuple | str]]:
+    """
+    Normalized (tickers, period, risk_free, method, cov_estimator) specs and, per
+    distinct (period, sorted tickers, cov_estimator), its (mu, cov, tickers) or
+    the error loading it.
+    """
+    specs = []
+    for problem in problems:
+        specs.append((
+            normalize_tickers(problem.get("tickers", [])),
+            problem.get("period", "2y"),
+            float(problem.get("risk_free", 0.0)),
+            problem.get("method", "slsqp"),
+            problem.get("cov_estimator", "sample"),
+        ))
+
+    # One price fetch per period, one cached covariance per ticker set
+    by_period: dict[str, list[str]] = {}
+    for tickers, period, *_ in specs:
+        by_period.setdefault(period, []).extend(tickers)
+    fetch_errors: dict[str, Exception] = {}
+    store = price_store.get_store()
+    for period, tickers in by_period.items():
+        try:
+            store.ensure(list(dict.fromkeys(tickers)), *store.period_range(period))
+        except Exception as exc:
+            fetch_errors[period] = exc
+
+    shared: dict[tuple, tuple | str] = {}
+    for spec in specs:
+        key = _batch_key(spec)
+        if key in shared:
+            continue
+        tickers, period, _, _, cov_estimator = spec
+        try:
+            if period in fetch_errors:
+                raise fetch_errors[period]
+            moments = _load_moments(tickers, period, cov_estimator)
+            shared[key] = (moments.mu, moments.cov, moments.tickers)
+        except Exception as exc:
+            shared[key] = str(exc)
+    return specs, shared
+
+
+def solve_batch(specs: list[tuple], shared: dict[tuple, tuple | str], max_workers: int = 8) -> list[dict]:
+    """The solves of optimize_sharpe_batch on what load_batch returned (no I/O)."""
+    results: list[dict | None] = [None] * len(specs)
+    groups: dict[tuple, list[int]] = {}
+    for i, spec in enumerate(specs):
+        groups.setdefault(_batch_key(spec), []).append(i)
+
+    pending: list[tuple[int, SharpeProblem, list[str]]] = []
+    for key, indices in groups.items():
+        entry = shared[key]
+        if isinstance(entry, str):
+            for i in indices:
+                results[i] = {"error": entry}
+            continue
+        mu, cov, valid = entry
+        base = SharpeProblem.from_moments(mu, cov)
+        qp = [i for i in indices if specs[i][3] == "qp"]
+        solved = _closed_form_tangency(base, [specs[i][2] for i in qp]) if qp else []
+        for i, weights in zip(qp, solved):
+            if weights is not None:
+                problem = SharpeProblem.from_moments(base.mu, base.cov, specs[i][2])
+                results[i] = _in_order(problem.result(valid, weights), specs[i][0])
+        for i in indices:
+            if results[i] is None:
+                pending.append((i, SharpeProblem.from_moments(base.mu, base.cov, specs[i][2]), valid))
+
+    def _solve(item: tuple[int, SharpeProblem, list[str]]) -> tuple[int, dict]:
+        i, problem, valid = item
+        try:
+            return i, _in_order(problem.result(valid, problem.solve(specs[i][3])), specs[i][0])
+        except Exception as exc:
+            return i, {"error": str(exc)}
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as pool:
+            for i, result in pool.map(_solve, pending):
+                results[i] = result
+    return results
+
+
+def _in_order(result: dict, tickers: list[str]) -> dict:
+    """`result` (from a problem shared between ticker orders) listing its tickers in `tickers` order."""
+    order = [t for t in tickers if t in result["weights"]]
+    return {**result, "tickers": order, "weights": {t: result["weights"][t] for t in order}}
+
+
+def _closed_form_tangency(problem: SharpeProblem, risk_frees: list[float]) -> list[np.ndarray | None]:
+    """
+    Vectorized closed-form tangency weights for several risk-free rates at once.
+
+    cov^-1 (mu - rf) = cov^-1 mu - rf * cov^-1 1 is linear in rf, so one solve
+    with two right-hand sides covers every rate. Entries are None where the
+    result is not long-only and the full QP is needed.
+    """
+    try:
+        base = covariance.solve(problem.cov, np.column_stack([problem.mu, np.ones(problem.n)]))
+    except np.linalg.LinAlgError:
+        return [None] * len(risk_frees)
+    rfs = np.asarray(risk_frees, dtype=float)
+    ys = base[:, :1] - base[:, 1:] * rfs
+    out: list[np.ndarray | None] = []
+    for k, rf in enumerate(rfs):
+        y = ys[:, k]
+        if np.any(problem.mu - rf > 0) and np.all(y >= 0) and y.sum() > 0:
+            metrics.observe_solve("tangency_qp", "closed_form")
+            out.append(y / y.sum())
+        else:
+            out.append(None)
+    return out
 
 
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+import io
+import zlib
+from typing import Iterable, Iterator
+
+import pandas as pd
+
+# ---------------------------------------------------------------------------
+# Chunked encoders for price-history downloads
+#
+# Each encoder turns the DataFrame chunks from PriceStore.iter_frames into a
+# byte stream one chunk at a time, so a response never holds more than one
+# chunk of rows.  CSV matches DataFrame.to_csv of the whole range; Arrow IPC
+# and Parquet need pyarrow, which is optional.
+# ---------------------------------------------------------------------------
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class ExportFormatUnavailable(Exception):
+    """Raised when a requested format needs an optional dependency that is not installed."""
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ExportFormatUnavailable("Arrow and Parquet exports need pyarrow (pip install pyarrow).")
+    return pa
+
+
+class _Drain(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last take()."""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def take(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts.clear()
+        return out
+
+
+def iter_csv(frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    header = True
+    for frame in frames:
+        yield frame.to_csv(header=header).encode()
+        header = False
+
+
+def _record_batches(frames: Iterable[pd.DataFrame]):
+    pa = _require_pyarrow()
+    for frame in frames:
+        yield pa.RecordBatch.from_pandas(frame.reset_index(), preserve_index=False)
+
+
+def iter_arrow(frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    pa = _require_pyarrow()
+    sink = _Drain()
+    writer = None
+    for batch in _record_batches(frames):
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, batch.schema)
+        writer.write_batch(batch)
+        yield sink.take()
+    if writer is not None:
+        writer.close()
+        yield sink.take()
+
+
+def iter_parquet(frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    pa = _require_pyarrow()
+    import pyarrow.parquet as pq
+
+    sink = _Drain()
+    writer = None
+    for batch in _record_batches(frames):
+        if writer is None:
+            writer = pq.ParquetWriter(sink, batch.schema)
+        writer.write_table(pa.Table.from_batches([batch]))  # one row group per chunk
+        yield sink.take()
+    if writer is not None:
+        writer.close()
+        yield sink.take()
+
+
+def encode(frames: Iterable[pd.DataFrame], fmt: str) -> Iterator[bytes]:
+    """Byte stream for `fmt` ("csv", "arrow", "parquet"); checks pyarrow before any chunk is produced."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format {fmt!r}; expected one of {', '.join(FORMATS)}.")
+    if fmt == "csv":
+        return iter_csv(frames)
+    _require_pyarrow()
+    return iter_arrow(frames) if fmt == "arrow" else iter_parquet(frames)
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream into one gzip member, flushing once per input chunk."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip header + trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,440 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from functools import reduce
+from pathlib import Path
+from typing import Callable, Iterator
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from singleflight import SingleFlight
+
+# ---------------------------------------------------------------------------
+# Local price-history store
+#
+# Close prices are cached per ticker as a memory-mapped NumPy record array
+# (date, close) plus a small JSON sidecar recording which calendar range has
+# already been fetched.  Requests only hit the fetcher for the date ranges
+# that are not covered yet; the bar for the current trading day is refreshed
+# once it is older than the TTL.  A symbol the fetcher has no data for is
+# remembered (in memory) as empty over the range asked for, for the same TTL,
+# so unknown symbols are not re-downloaded on every request.
+# ---------------------------------------------------------------------------
+
+_SERVER_DIR = Path(__file__).parent
+_DEFAULT_CACHE_DIR = _SERVER_DIR / ".price_cache"
+_BUNDLED_CSV = _SERVER_DIR / "stocks_2y.csv"
+
+DEFAULT_TTL_SECONDS = 15 * 60
+
+_RECORD_DTYPE = np.dtype([("date", "M8[D]"), ("close", "f8")])
+_PERIOD_RE = re.compile(r"^(\d+)(d|wk|mo|y)$")
+
+# fetcher(tickers, start, end) -> DataFrame of close prices, one column per
+# ticker, indexed by date, covering start..end inclusive.
+Fetcher = Callable[[list[str], date, date], pd.DataFrame]
+
+
+def period_start(period: str, today: date) -> date:
+    """Translate a yfinance-style period ('1y', '6mo', 'ytd', ...) into a start date."""
+    period = (period or "").strip().lower()
+    if period == "ytd":
+        return date(today.year, 1, 1)
+    if period == "max":
+        return date(1970, 1, 1)
+    m = _PERIOD_RE.match(period)
+    if not m:
+        raise ValueError(f"Unsupported period: {period!r}")
+    n, unit = int(m.group(1)), m.group(2)
+    if unit == "d":
+        return today - timedelta(days=n)
+    if unit == "wk":
+        return today - timedelta(weeks=n)
+    offset = pd.DateOffset(months=n) if unit == "mo" else pd.DateOffset(years=n)
+    return (pd.Timestamp(today) - offset).date()
+
+
+def yfinance_fetcher(tickers: list[str], start: date, end: date) -> pd.DataFrame:
+    import yfinance as yf
+
+    # yfinance treats `end` as exclusive
+    raw = yf.download(
+        tickers,
+        start=start.isoformat(),
+        end=(end + timedelta(days=1)).isoformat(),
+        auto_adjust=True,
+        progress=False,
+    )
+    if raw.empty:
+        return pd.DataFrame()
+    close = raw["Close"]
+    if isinstance(close, pd.Series):
+        close = close.to_frame(name=tickers[0])
+    return close
+
+
+class CsvFetcher:
+    """Offline fetcher backed by a wide Date x ticker close-price CSV (e.g. stocks_2y.csv)."""
+
+    def __init__(self, path: Path | str = _BUNDLED_CSV):
+        self.path = Path(path)
+        self.frame = pd.read_csv(self.path, index_col=0, parse_dates=True).sort_index()
+        self.calls = 0
+
+    @property
+    def last_date(self) -> date:
+        return self.frame.index[-1].date()
+
+    def __call__(self, tickers: list[str], start: date, end: date) -> pd.DataFrame:
+        self.calls += 1
+        available = [t for t in tickers if t in self.frame.columns]
+        return self.frame.loc[pd.Timestamp(start):pd.Timestamp(end), available]
+
+
+class _Series:
+    __slots__ = ("dates", "closes", "start", "end", "fetched_at")
+
+    def __init__(self, dates: np.ndarray, closes: np.ndarray, start: date, end: date, fetched_at: float):
+        self.dates = dates
+        self.closes = closes
+        self.start = start
+        self.end = end
+        self.fetched_at = fetched_at
+
+
+class PriceStore:
+    """
+    Close-price cache keyed by ticker and date.
+
+    Args:
+        cache_dir:    Directory for the on-disk cache, or None to keep everything in memory.
+        fetcher:      Callable used to download missing ranges (defaults to yfinance).
+        ttl_seconds:  Max age of a bar fetched on the same day it was traded.
+        today:        Callable returning the current date (overridable for offline data).
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | str | None = None,
+        fetcher: Fetcher | None = None,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        today: Callable[[], date] | None = None,
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.fetcher = fetcher or yfinance_fetcher
+        self.ttl_seconds = ttl_seconds
+        self._today = today or date.today
+        self._lock = threading.Lock()
+        self._series: dict[str, _Series] = {}
+        self._empty: dict[str, tuple[date, date, float]] = {}  # no data for start..end as of fetched_at
+        self._flight = SingleFlight()
+        self._listeners: list[Callable[[list[str] | None, date | None, date | None], None]] = []
+        self.stats = {"fetches": 0, "tickers_fetched": 0, "disk_loads": 0, "empty_cached": 0}
+
+    @classmethod
+    def offline(cls, csv_path: Path | str = _BUNDLED_CSV, cache_dir: Path | str | None = None) -> "PriceStore":
+        """Store served entirely from a local CSV, with 'today' pinned to its last row."""
+        fetcher = CsvFetcher(csv_path)
+        last = fetcher.last_date
+        return cls(cache_dir=cache_dir, fetcher=fetcher, today=lambda: last)
+
+    # ── Public API ──────────────────────────────────────────────────────────
+
+    def get_close_prices(self, tickers: list[str], period: str = "1y") -> pd.DataFrame:
+        """Close prices for `tickers` over `period`; tickers with no data are omitted."""
+        return self.get_range(tickers, *self.period_range(period))
+
+    def period_range(self, period: str) -> tuple[date, date]:
+        """(start, end) dates that `period` covers as of the store's today."""
+        today = self._today()
+        return period_start(period, today), today
+
+    def get_range(self, tickers: list[str], start: date, end: date) -> pd.DataFrame:
+        tickers = list(dict.fromkeys(tickers))
+        self.ensure(tickers, start, end)
+        return self._frame(tickers, start, end)
+
+    def iter_frames(self, tickers: list[str], start: date, end: date, chunk_rows: int = 1000) -> Iterator[pd.DataFrame]:
+        """
+        get_range as consecutive date chunks of at most `chunk_rows` rows.
+
+        Missing data is fetched up front. Chunks are cut from the cached
+        per-ticker arrays, so memory stays at one chunk (plus the date union)
+        however many tickers and years are requested. Concatenated, the chunks
+        equal get_range(tickers, start, end).
+        """
+        tickers = list(dict.fromkeys(tickers))
+        self.ensure(tickers, start, end)
+        lo, hi = np.datetime64(start, "D"), np.datetime64(end, "D")
+        slices: list[tuple[str, np.ndarray, np.ndarray]] = []
+        for ticker in tickers:
+            series = self._load(ticker)
+            if series is None:
+                continue
+            i = np.searchsorted(series.dates, lo, side="left")
+            j = np.searchsorted(series.dates, hi, side="right")
+            if j > i:
+                slices.append((ticker, series.dates[i:j], series.closes[i:j]))
+        return self._chunks(slices, max(int(chunk_rows), 1))
+
+    @staticmethod
+    def _chunks(slices: list[tuple[str, np.ndarray, np.ndarray]], chunk_rows: int) -> Iterator[pd.DataFrame]:
+        if not slices:
+            return
+        columns = [ticker for ticker, _, _ in slices]
+        all_dates = reduce(np.union1d, (dates for _, dates, _ in slices))
+        for k in range(0, len(all_dates), chunk_rows):
+            dates = all_dates[k:k + chunk_rows]
+            block = np.full((len(dates), len(slices)), np.nan)
+            for col, (_, ticker_dates, closes) in enumerate(slices):
+                i = np.searchsorted(ticker_dates, dates[0], side="left")
+                j = np.searchsorted(ticker_dates, dates[-1], side="right")
+                block[np.searchsorted(dates, ticker_dates[i:j]), col] = closes[i:j]
+            index = pd.DatetimeIndex(dates.astype("M8[ns]"), name="Date")
+            yield pd.DataFrame(block, index=index, columns=columns)
+
+    def ensure(self, tickers: list[str], start: date, end: date) -> None:
+        """
+        Fetch whatever part of start..end is not cached yet, batching tickers by range.
+
+        Tickers another thread is already fetching are waited on rather than
+        downloaded twice, then re-checked in case that fetch covered less.
+        """
+        pending = list(tickers)
+        while pending:
+            now = time.time()
+            plan: dict[tuple[date, date], list[str]] = {}
+            for ticker in pending:
+                for rng in self._missing(ticker, start, end, now):
+                    plan.setdefault(rng, []).append(ticker)
+            pending = []
+            for (fetch_start, fetch_end), group in plan.items():
+                joined = self._flight.run(
+                    group,
+                    lambda lead, s=fetch_start, e=fetch_end: self._fetch_missing(lead, s, e),
+                )
+                pending.extend(t for t in joined if t not in pending)
+
+    def is_current(self, tickers: list[str], start: date, end: date) -> bool:
+        """True if start..end is cached for every ticker and no live bar is due for a refresh."""
+        now = time.time()
+        return not any(self._missing(t, start, end, now) for t in tickers)
+
+    def subscribe(self, listener: Callable[[list[str] | None, date | None, date | None], None]) -> None:
+        """
+        Call listener(tickers, start, end) after bars for start..end are merged
+        for tickers; after invalidate() the range is (None, None), and tickers
+        is None when everything was dropped.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, tickers: list[str] | None, start: date | None = None, end: date | None = None) -> None:
+        for listener in list(self._listeners):
+            listener(tickers, start, end)
+
+    def fetch_stats(self) -> dict[str, dict[str, int]]:
+        """Per-ticker counts of fetches issued and requests coalesced onto an in-flight fetch."""
+        return self._flight.stats()
+
+    def invalidate(self, tickers: list[str] | None = None) -> None:
+        """Drop cached history for `tickers` (or everything) from memory and disk."""
+        with self._lock:
+            names = list(self._series) if tickers is None else tickers
+            if tickers is None:
+                self._empty.clear()
+            for ticker in names:
+                self._series.pop(ticker, None)
+                self._empty.pop(ticker, None)
+                if self.cache_dir is not None:
+                    for path in self._paths(ticker):
+                        path.unlink(missing_ok=True)
+            if tickers is None and self.cache_dir is not None:
+                for path in self.cache_dir.glob("*.npy"):
+                    path.unlink(missing_ok=True)
+                for path in self.cache_dir.glob("*.json"):
+                    path.unlink(missing_ok=True)
+        self._notify(None if tickers is None else list(tickers))
+
+    # ── Internals ───────────────────────────────────────────────────────────
+
+    def _missing(self, ticker: str, start: date, end: date, now: float) -> list[tuple[date, date]]:
+        series = self._load(ticker)
+        if series is None:
+            empty = self._empty.get(ticker)
+            if empty is not None and empty[0] <= start and end <= empty[1] and now - empty[2] <= self.ttl_seconds:
+                return []
+            return [(start, end)]
+
+        # Ranges always extend the covered span contiguously, so a gap between the
+        # cache and the request is fetched too
+        ranges: list[tuple[date, date]] = []
+        if start < series.start:
+            ranges.append((start, series.start - timedelta(days=1)))
+
+        # The last covered day may still have been trading when it was fetched
+        live = datetime.fromtimestamp(series.fetched_at).date() <= series.end
+        stale = live and now - series.fetched_at > self.ttl_seconds
+        if end > series.end or (stale and end >= series.end):
+            tail_start = series.end if live else series.end + timedelta(days=1)
+            ranges.append((tail_start, end))
+        return ranges
+
+    def _fetch_missing(self, tickers: list[str], start: date, end: date) -> None:
+        # Another caller may have filled the range between planning and leading
+        now = time.time()
+        still_missing = [t for t in tickers if self._missing(t, start, end, now)]
+        if still_missing:
+            self._fetch_and_merge(still_missing, start, end)
+
+    def _fetch_and_merge(self, tickers: list[str], start: date, end: date) -> None:
+        with metrics.span("download"):
+            frame = self.fetcher(tickers, start, end)
+        fetched_at = time.time()
+        self.stats["fetches"] += 1
+        self.stats["tickers_fetched"] += len(tickers)
+
+        updated: list[str] = []
+        for ticker in tickers:
+            col = frame[ticker].dropna() if ticker in frame.columns else pd.Series(dtype="f8")
+            dates = pd.DatetimeIndex(col.index).values.astype("M8[D]")
+            closes = col.to_numpy(dtype="f8")
+            with self._lock:
+                current = self._series.get(ticker)
+                if current is None:
+                    # Unknown symbol with no data: only remembered for the TTL, as it may be
+                    # a transient failure
+                    if not len(closes):
+                        self._empty[ticker] = (start, end, fetched_at)
+                        self.stats["empty_cached"] += 1
+                        continue
+                    self._empty.pop(ticker, None)
+                    merged = _Series(dates, closes, start, end, fetched_at)
+                else:
+                    merged = _merge(current, dates, closes, start, end, fetched_at)
+                self._series[ticker] = merged
+                self._persist(ticker, merged)
+            updated.append(ticker)
+        if updated:
+            self._notify(updated, start, end)
+
+    def _frame(self, tickers: list[str], start: date, end: date) -> pd.DataFrame:
+        lo, hi = np.datetime64(start, "D"), np.datetime64(end, "D")
+        columns: dict[str, pd.Series] = {}
+        for ticker in tickers:
+            series = self._load(ticker)
+            if series is None:
+                continue
+            i = np.searchsorted(series.dates, lo, side="left")
+            j = np.searchsorted(series.dates, hi, side="right")
+            if j <= i:
+                continue
+            index = pd.DatetimeIndex(series.dates[i:j].astype("M8[ns]"), name="Date")
+            columns[ticker] = pd.Series(np.asarray(series.closes[i:j]), index=index)
+        if not columns:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name="Date"))
+        frame = pd.concat(columns, axis=1).sort_index()
+        frame.index.name = "Date"
+        return frame
+
+    def _paths(self, ticker: str) -> tuple[Path, Path]:
+        stem = quote(ticker, safe="")
+        return self.cache_dir / f"{stem}.npy", self.cache_dir / f"{stem}.json"
+
+    def _load(self, ticker: str) -> _Series | None:
+        series = self._series.get(ticker)
+        if series is not None or self.cache_dir is None:
+            return series
+        data_path, meta_path = self._paths(ticker)
+        if not (data_path.exists() and meta_path.exists()):
+            return None
+        try:
+            meta = json.loads(meta_path.read_text())
+            records = np.load(data_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        series = _Series(
+            records["date"],
+            records["close"],
+            date.fromisoformat(meta["start"]),
+            date.fromisoformat(meta["end"]),
+            float(meta["fetched_at"]),
+        )
+        with self._lock:
+            self.stats["disk_loads"] += 1
+            return self._series.setdefault(ticker, series)
+
+    def _persist(self, ticker: str, series: _Series) -> None:
+        if self.cache_dir is None:
+            return
+        data_path, meta_path = self._paths(ticker)
+        records = np.empty(len(series.dates), dtype=_RECORD_DTYPE)
+        records["date"] = series.dates
+        records["close"] = series.closes
+        # Write-then-rename so readers never see a half-written file; temp names are
+        # unique since compute-pool workers share cache_dir
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix=data_path.name, suffix=".tmp", delete=False) as f:
+            np.save(f, records)
+        os.replace(f.name, data_path)
+        meta = {"start": series.start.isoformat(), "end": series.end.isoformat(), "fetched_at": series.fetched_at}
+        with tempfile.NamedTemporaryFile("w", dir=self.cache_dir, prefix=meta_path.name, suffix=".tmp", delete=False) as f:
+            f.write(json.dumps(meta))
+        os.replace(f.name, meta_path)
+
+
+def _merge(current: _Series, dates: np.ndarray, closes: np.ndarray, start: date, end: date, fetched_at: float) -> _Series:
+    # Newly fetched bars win over cached ones for the same date
+    keep = ~np.isin(current.dates, dates)
+    all_dates = np.concatenate([np.asarray(current.dates)[keep], dates])
+    all_closes = np.concatenate([np.asarray(current.closes)[keep], closes])
+    order = np.argsort(all_dates, kind="stable")
+    return _Series(
+        all_dates[order],
+        all_closes[order],
+        min(current.start, start),
+        max(current.end, end),
+        fetched_at if end >= current.end else current.fetched_at,
+    )
+
+
+# ── Module-level default store ───────────────────────────────────────────────
+
+_default_store: PriceStore | None = None
+_default_lock = threading.Lock()
+
+
+def get_store() -> PriceStore:
+    """
+    Shared store used by the analytics modules.
+
+    PRICE_SOURCE=csv serves prices from the bundled stocks_2y.csv instead of Yahoo;
+    PRICE_CACHE_DIR overrides where the on-disk cache lives.
+    """
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            cache_dir = os.environ.get("PRICE_CACHE_DIR") or _DEFAULT_CACHE_DIR
+            if os.environ.get("PRICE_SOURCE", "").lower() == "csv":
+                _default_store = PriceStore.offline(cache_dir=None)
+            else:
+                _default_store = PriceStore(cache_dir=cache_dir)
+        return _default_store
+
+
+def set_store(store: PriceStore | None) -> None:
+    """Replace the shared store (pass None to rebuild it from the environment on next use)."""
+    global _default_store
+    with _default_lock:
+        _default_store = store
+
+
+def get_close_prices(tickers: list[str], period: str = "1y") -> pd.DataFrame:
+    return get_store().get_close_prices(tickers, period)
@@ -0,0 +1,113 @@
+import csv
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+# ---------------------------------------------------------------------------
+# Security reference data (stock_market.csv) parsed once per process
+#
+# The CSV is turned into column tuples plus a symbol -> row dict, and that
+# table is cached as a pickle snapshot keyed by the CSV's mtime and size, so
+# startup only parses the CSV again after it changes.
+# ---------------------------------------------------------------------------
+
+_CSV_PATH = Path(__file__).parent / "stock_market.csv"
+_SNAPSHOT_DIR = Path(__file__).parent / ".reference_cache"
+_SNAPSHOT_VERSION = 1
+
+
+class SecurityTable:
+    """Column-oriented security master with O(1) symbol lookups."""
+
+    __slots__ = ("symbols", "names", "sectors", "industries", "markets", "source", "_index")
+
+    def __init__(self, symbols, names, sectors, industries, markets):
+        self.symbols: tuple[str, ...] = tuple(symbols)
+        self.names: tuple[str, ...] = tuple(names)
+        self.sectors: tuple[str, ...] = tuple(sectors)
+        self.industries: tuple[str, ...] = tuple(industries)
+        self.markets: tuple[str, ...] = tuple(markets)
+        # Where the table was loaded from: "csv" or "snapshot" (set by load_securities)
+        self.source = "csv"
+        # First occurrence wins for duplicated symbols
+        index: dict[str, int] = {}
+        for i, symbol in enumerate(self.symbols):
+            index.setdefault(symbol, i)
+        self._index = index
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._index
+
+    def sector(self, symbol: str, default: str = "") -> str:
+        i = self._index.get(symbol)
+        return self.sectors[i] if i is not None else default
+
+    def rows(self) -> list[dict[str, str]]:
+        """Rows in the {name, symbol, sector, industry, market} shape served by /api/stocks."""
+        return [
+            {"name": n, "symbol": s, "sector": sec, "industry": ind, "market": m}
+            for s, n, sec, ind, m in zip(self.symbols, self.names, self.sectors, self.industries, self.markets)
+        ]
+
+    def __getstate__(self):
+        return (self.symbols, self.names, self.sectors, self.industries, self.markets)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+
+def _parse_csv(path: Path) -> SecurityTable:
+    columns: tuple[list[str], ...] = ([], [], [], [], [])
+    with path.open("r", encoding="utf-8", newline="") as csv_file:
+        for row in csv.DictReader(csv_file):
+            symbol = (row.get("ticker") or "").strip().upper()
+            if not symbol:
+                continue
+            values = (
+                symbol,
+                (row.get("name") or "").strip(),
+                (row.get("sector") or "").strip(),
+                (row.get("industry") or "").strip(),
+                (row.get("market") or "").strip(),
+            )
+            for column, value in zip(columns, values):
+                column.append(value)
+    return SecurityTable(*columns)
+
+
+def load_securities(csv_path: Path | str = _CSV_PATH, snapshot_dir: Path | str | None = _SNAPSHOT_DIR) -> SecurityTable:
+    """Load the table from its snapshot if the CSV is unchanged, else parse and re-snapshot."""
+    csv_path = Path(csv_path)
+    stat = csv_path.stat()
+    key = (_SNAPSHOT_VERSION, stat.st_mtime_ns, stat.st_size)
+
+    snapshot = Path(snapshot_dir) / f"{csv_path.stem}.pickle" if snapshot_dir is not None else None
+    if snapshot is not None and snapshot.exists():
+        try:
+            with snapshot.open("rb") as f:
+                cached_key, table = pickle.load(f)
+            if cached_key == key:
+                table.source = "snapshot"
+                return table
+        except Exception:
+            pass
+
+    table = _parse_csv(csv_path)
+    if snapshot is not None:
+        try:
+            snapshot.parent.mkdir(parents=True, exist_ok=True)
+            # Every spawned compute worker loads this at import, so cold starts race:
+            # each writes its own temp file and renames it into place whole
+            with tempfile.NamedTemporaryFile(dir=snapshot.parent, prefix=snapshot.name, suffix=".tmp", delete=False) as f:
+                pickle.dump((key, table), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f.name, snapshot)
+        except OSError:
+            pass
+    return table
+
+
+SECURITIES = load_securities()
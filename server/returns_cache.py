@@ -0,0 +1,306 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import price_store
+from optimize import clean_returns
+
+# ---------------------------------------------------------------------------
+# Cache of aligned returns and annualized moments per ticker set
+#
+# Entries are keyed by (sorted tickers, start, end) and hold the aligned
+# returns plus their column sums and Gram matrix R'R, from which mean and
+# covariance follow.  Holding the Gram matrix lets a new ticker set be derived
+# from a cached one on the same rows instead of recomputed:
+#
+#   superset (base + new tickers): G = G_base plus R'R_new for the new columns
+#   subset: G = G_cached[s, s]
+#
+# Rows only match when the tickers share a calendar: a ticker that trades
+# every day (crypto) changes which days survive alignment, so a set with a
+# different row index is built from its own returns.
+#
+# Entries are evicted least-recently-used once their total size passes
+# max_bytes, and dropped as soon as the price store merges bars inside their
+# date range for any of their tickers (backfilling older history keeps them).
+# ---------------------------------------------------------------------------
+
+_Key = tuple[tuple[str, ...], date, date]
+
+
+class Moments(NamedTuple):
+    """Aligned daily returns and annualized mean / covariance, columns in the caller's ticker order."""
+
+    tickers: list[str]
+    returns: pd.DataFrame
+    mu: np.ndarray
+    cov: np.ndarray
+
+
+class _Entry:
+    __slots__ = ("tickers", "returns", "sums", "gram", "mu", "cov", "nbytes")
+
+    def __init__(self, returns: pd.DataFrame, sums: np.ndarray | None = None, gram: np.ndarray | None = None):
+        values = returns.to_numpy(dtype=float)
+        n = len(values)
+        self.tickers: list[str] = list(returns.columns)
+        self.returns = returns
+        self.sums = values.sum(axis=0) if sums is None else sums
+        self.gram = values.T @ values if gram is None else gram
+        self.mu = self.sums / n * 252
+        self.cov = (self.gram - np.outer(self.sums, self.sums) / n) / (n - 1) * 252
+        self.nbytes = values.nbytes + returns.index.nbytes + self.gram.nbytes + self.cov.nbytes + 2 * self.sums.nbytes
+
+    def select(self, order: list[str]) -> Moments:
+        pos = {t: i for i, t in enumerate(self.tickers)}
+        tickers = [t for t in order if t in pos]
+        idx = np.array([pos[t] for t in tickers])
+        return Moments(tickers, self.returns[tickers], self.mu[idx], self.cov[np.ix_(idx, idx)])
+
+
+def _extend(base: _Entry, returns: pd.DataFrame) -> _Entry:
+    """Entry for `returns` (base's columns plus new ones, on base's rows) from base's Gram matrix."""
+    values = returns.to_numpy(dtype=float)
+    cols = {t: i for i, t in enumerate(returns.columns)}
+    old = np.array([cols[t] for t in base.tickers])
+    new = np.array([i for t, i in cols.items() if t not in set(base.tickers)], dtype=int)
+
+    gram = np.empty((len(cols), len(cols)))
+    gram[np.ix_(old, old)] = base.gram
+    cross = values.T @ values[:, new]
+    gram[:, new] = cross
+    gram[new, :] = cross.T
+    sums = np.empty(len(cols))
+    sums[old] = base.sums
+    sums[new] = values[:, new].sum(axis=0)
+    return _Entry(returns, sums, gram)
+
+
+def _restrict(cached: _Entry, returns: pd.DataFrame) -> _Entry:
+    """Entry for `returns` (a subset of cached's columns, on cached's rows) from cached's Gram matrix."""
+    pos = {t: i for i, t in enumerate(cached.tickers)}
+    idx = np.array([pos[t] for t in returns.columns])
+    return _Entry(returns, cached.sums[idx], cached.gram[np.ix_(idx, idx)])
+
+
+class ReturnsCache:
+    """
+    LRU cache of aligned returns and mean / covariance, bounded by memory.
+
+    get(tickers, period) is a drop-in for clean_returns(get_close_prices(...))
+    plus the annualized moments; it raises the same ValueError when there is
+    not enough data.
+    """
+
+    def __init__(self, max_bytes: int | None = None, store: price_store.PriceStore | None = None):
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("RETURNS_CACHE_MB", "256")) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._store = store
+        self._subscribed: price_store.PriceStore | None = None
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[_Key, _Entry] = OrderedDict()
+        self._aliases: dict[_Key, _Key] = {}  # requested ticker set -> the valid set it resolved to
+        self._versions: dict[str, int] = {}  # bumped per ticker whenever its prices change
+        self._generation = 0                 # bumped on a full invalidation
+        self.bytes = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "derived_superset": 0,
+            "derived_subset": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    # ── Public API ──────────────────────────────────────────────────────────
+
+    def get(self, tickers: list[str], period: str = "1y") -> Moments:
+        store = self._get_store()
+        start, end = store.period_range(period)
+        order = list(dict.fromkeys(tickers))
+        requested: _Key = (tuple(sorted(order)), start, end)
+
+        with self._lock:
+            key = self._aliases.get(requested)
+            entry = self._entries.get(key) if key is not None else None
+        if entry is not None and store.is_current(entry.tickers, start, end):
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+            return entry.select(order)
+
+        # Fetch first: our own fetch notifies invalidate(), and only changes after it should count
+        store.ensure(list(requested[0]), start, end)
+        versions, generation = self._snapshot(requested[0])
+        raw = store.get_range(list(requested[0]), start, end)
+        returns = clean_returns(raw, list(requested[0]))
+        valid: _Key = (tuple(returns.columns), start, end)
+
+        with self._lock:
+            entry = self._entries.get(valid)
+        if entry is not None:
+            kind = "hits"
+        else:
+            with metrics.span("covariance"):
+                entry, kind = self._build(returns, valid)
+
+        with self._lock:
+            self.stats[kind] += 1
+            if self._unchanged(valid[0], versions, generation):
+                self._put(valid, entry)
+                self._aliases[requested] = valid
+        return entry.select(order)
+
+    def invalidate(self, tickers: list[str] | None = None, start: date | None = None, end: date | None = None) -> None:
+        """Drop every entry that contains one of `tickers` (all entries if None) and overlaps start..end."""
+        with self._lock:
+            if tickers is None:
+                self._generation += 1
+                dropped = list(self._entries)
+            else:
+                names = set(tickers)
+                for t in names:
+                    self._versions[t] = self._versions.get(t, 0) + 1
+                dropped = [
+                    (key_names, s, e) for key_names, s, e in self._entries
+                    if names.intersection(key_names) and (start is None or start <= e) and (end is None or end >= s)
+                ]
+            for key in dropped:
+                self.bytes -= self._entries.pop(key).nbytes
+            if dropped:
+                self._aliases = {a: k for a, k in self._aliases.items() if k in self._entries}
+                self.stats["invalidations"] += len(dropped)
+
+    def info(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["derived_superset"] + self.stats["derived_subset"]
+            return {
+                **self.stats,
+                "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # ── Internals ───────────────────────────────────────────────────────────
+
+    def _build(self, returns: pd.DataFrame, valid: _Key) -> tuple[_Entry, str]:
+        names, index = set(valid[0]), returns.index
+        base = self._largest(valid[1], valid[2], lambda e: set(e.tickers) < names and e.returns.index.equals(index))
+        if base is not None:
+            return _extend(base, returns), "derived_superset"
+        cached = self._largest(valid[1], valid[2], lambda e: set(e.tickers) > names and e.returns.index.equals(index))
+        if cached is not None:
+            return _restrict(cached, returns), "derived_subset"
+        return _Entry(returns), "misses"
+
+    def _get_store(self) -> price_store.PriceStore:
+        store = self._store or price_store.get_store()
+        if store is not self._subscribed:
+            # New (or replaced) shared store: nothing cached so far came from it
+            self.invalidate()
+            store.subscribe(self.invalidate)
+            self._subscribed = store
+        return store
+
+    def _largest(self, start: date, end: date, accept) -> _Entry | None:
+        with self._lock:
+            best = None
+            for (names, s, e), entry in self._entries.items():
+                if s == start and e == end and (best is None or len(names) > len(best.tickers)) and accept(entry):
+                    best = entry
+            return best
+
+    def _snapshot(self, tickers: tuple[str, ...]) -> tuple[dict[str, int], int]:
+        with self._lock:
+            return {t: self._versions.get(t, 0) for t in tickers}, self._generation
+
+    def _unchanged(self, tickers: tuple[str, ...], versions: dict[str, int], generation: int) -> bool:
+        # Prices that changed while this entry was being built would make it stale on arrival
+        return generation == self._generation and all(self._versions.get(t, 0) == versions.get(t, 0) for t in tickers)
+
+    def _put(self, key: _Key, entry: _Entry) -> None:
+        if entry.nbytes > self.max_bytes:
+            return
+        if key in self._entries:
+            self.bytes -= self._entries.pop(key).nbytes
+        self._entries[key] = entry
+        self.bytes += entry.nbytes
+        while self.bytes > self.max_bytes:
+            old_key, old = self._entries.popitem(last=False)
+            self.bytes -= old.nbytes
+            self.stats["evictions"] += 1
+        self._aliases = {a: k for a, k in self._aliases.items() if k in self._entries}
+
+
+_default_cache: ReturnsCache | None = None
+_default_lock = threading.Lock()
+
+
+def get_cache() -> ReturnsCache:
+    """Shared cache over the shared price store; RETURNS_CACHE_MB sets its size (default 256)."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ReturnsCache()
+        return _default_cache
+
+
+def get_moments(tickers: list[str], period: str = "1y") -> Moments:
+    return get_cache().get(tickers, period)
+
+
+if __name__ == "__main__":
+    store = price_store.PriceStore.offline()
+    cache = ReturnsCache(store=store)
+    universe = list(price_store.CsvFetcher().frame.columns)
+
+    def check(cache, tickers, store=store):
+        moments = cache.get(tickers)
+        returns = clean_returns(store.get_close_prices(tickers, "1y"), tickers)
+        mu, cov = returns.mean().to_numpy() * 252, np.cov(returns.T.to_numpy()) * 252
+        assert moments.tickers == list(returns.columns) and moments.returns.equals(returns)
+        assert np.allclose(moments.mu, mu, rtol=1e-10) and np.allclose(moments.cov, cov, rtol=1e-10, atol=1e-14)
+        return moments
+
+    for label, tickers in [
+        ("miss", universe[:8]),
+        ("hit", universe[:8][::-1]),
+        ("superset", universe[:8] + universe[8:10]),
+        ("subset", universe[2:6]),
+    ]:
+        start = time.perf_counter()
+        moments = check(cache, tickers)
+        ms = (time.perf_counter() - start) * 1000
+        print(f"{label:>8}: {len(moments.tickers)} tickers in {ms:.2f} ms")
+
+    # A ticker trading every day next to business-day ones: whatever is cached
+    # first, every set comes out as if computed fresh
+    fetcher = price_store.CsvFetcher()
+    fetcher.frame = fetcher.frame.reindex(pd.date_range(fetcher.frame.index[0], fetcher.frame.index[-1]))
+    steps = np.random.default_rng(0).normal(0, 0.03, len(fetcher.frame))
+    fetcher.frame["BTC-USD"] = 30_000 * np.exp(np.cumsum(steps))
+    last = fetcher.last_date
+    mixed_store = price_store.PriceStore(fetcher=fetcher, today=lambda: last)
+    mixed = ReturnsCache(store=mixed_store)
+    for tickers in [
+        universe[:3],
+        universe[:3] + ["BTC-USD"],
+        universe[:2],
+        universe[:2] + ["BTC-USD"],
+        universe[:3] + ["BTC-USD"] + universe[3:5],
+    ]:
+        check(mixed, tickers, mixed_store)
+    print(f"   mixed: {mixed.info()}")
+
+    store.invalidate([universe[0]])
+    print(cache.info())
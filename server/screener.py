@@ -0,0 +1,237 @@
+import time
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from reference_data import SECURITIES
+from diversity import _classify_symbol, calc_hhi, calc_industry_totals, clean_holdings
+from test_stock import _extract_weighted_tickers
+
+# ---------------------------------------------------------------------------
+# "Which stock should I add?" screener
+#
+# simulate_add_stock answers the question for one symbol by rerunning both
+# pipelines.  Here every candidate is scored at once: the current holdings
+# keep their dollar weights, the added amount goes to the candidate, and with
+# w the current weights, V their value and a the added amount,
+#
+#   return(c) = (V * mu.w + a * mu_c) / (V + a)
+#   var(c)    = (V^2 * w'Sw + 2 V a (Sw)_c + a^2 S_cc) / (V + a)^2
+#
+# so one product S[:, held] @ w gives every candidate's volatility.  Sector HHI
+# works the same way from the sector totals.  The covariance of the whole
+# universe plus the holdings comes from the returns cache, so later screens
+# over the same period reuse it.
+# ---------------------------------------------------------------------------
+
+RANKINGS = {
+    "sharpe": ("sharpe", True),      # highest resulting Sharpe first
+    "vol": ("annual_vol", False),    # lowest resulting volatility first
+    "hhi": ("hhi", False),           # most diversifying (lowest sector HHI) first
+}
+
+# Tickers with fewer closes than this share of the business days in the window
+# are left out of the universe, so one recent listing doesn't shorten everyone's
+# window.  Business days rather than the longest series: a ticker that trades
+# every day (crypto) would otherwise put every stock at ~70% coverage
+MIN_COVERAGE = 0.9
+
+
+def _candidates(sector: str | None) -> list[str]:
+    sector_norm = (sector or "").strip().lower()
+    symbols: dict[str, None] = {}
+    for symbol, row_sector in zip(SECURITIES.symbols, SECURITIES.sectors):
+        if not sector_norm or row_sector.lower() == sector_norm:
+            symbols.setdefault(symbol)
+    return list(symbols)
+
+
+def _covered(close, tickers: list[str], keep: set[str]) -> list[str]:
+    counts = close.notna().sum()
+    days = len(pd.bdate_range(close.index[0], close.index[-1])) if len(close) else 0
+    return [t for t in tickers if t in counts.index and (t in keep or counts[t] >= MIN_COVERAGE * days)]
+
+
+def screen_additions(
+    holdings: list[dict[str, Any]],
+    added_value: float,
+    period: str = "1y",
+    risk_free: float = 0.0,
+    sector: str | None = None,
+    top_k: int = 20,
+    rank_by: str = "sharpe",
+) -> dict[str, Any]:
+    """
+    Score adding `added_value` dollars of each universe symbol (optionally one
+    sector) to `holdings`, and return the top_k by `rank_by`.
+
+    Each result has the resulting Sharpe, return, volatility and sector HHI,
+    and their change from the current portfolio. load_screen and score_screen
+    are the I/O and compute halves, for callers that run them apart (the API
+    loads in-process, scores on the compute pool).
+    """
+    return score_screen(load_screen(holdings, added_value, period, sector, rank_by), risk_free, top_k)
+
+
+def load_screen(
+    holdings: list[dict[str, Any]],
+    added_value: float,
+    period: str = "1y",
+    sector: str | None = None,
+    rank_by: str = "sharpe",
+) -> dict[str, Any]:
+    """Validated inputs plus the cached moments of the holdings and candidate universe."""
+    from price_store import get_close_prices
+    from returns_cache import get_moments
+
+    if added_value <= 0:
+        raise ValueError("added_value must be > 0.")
+    if rank_by not in RANKINGS:
+        raise ValueError(f"rank_by must be one of {', '.join(RANKINGS)}.")
+    candidates = _candidates(sector)
+    if not candidates:
+        raise ValueError(f"No symbols in sector {sector!r}.")
+
+    started = time.perf_counter()
+    held, held_values = _extract_weighted_tickers(holdings if isinstance(holdings, list) else [])
+    if not held:
+        raise ValueError("Need at least one holding with a current value.")
+
+    universe = list(dict.fromkeys([*held, *candidates]))
+    close = get_close_prices(universe, period)
+    prices_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    with metrics.span("screen_moments"):
+        moments = get_moments(_covered(close, universe, set(held)), period)
+    if not any(t in moments.tickers for t in held):
+        raise ValueError("None of the holdings have enough price history to score.")
+    return {
+        "holdings": holdings,
+        "added_value": float(added_value),
+        "period": period,
+        "sector": sector,
+        "rank_by": rank_by,
+        "candidates": candidates,
+        "held": held,
+        "held_values": held_values,
+        "moments": (moments.tickers, moments.mu, moments.cov, len(moments.returns)),
+        "timings": {"prices": prices_ms, "load": round((time.perf_counter() - started) * 1000, 2)},
+    }
+
+
+def score_screen(inputs: dict[str, Any], risk_free: float = 0.0, top_k: int = 20) -> dict[str, Any]:
+    """Score and rank every candidate from what load_screen returned (no I/O)."""
+    started = time.perf_counter()
+    holdings, held, held_values, candidates = inputs["holdings"], inputs["held"], inputs["held_values"], inputs["candidates"]
+    tickers, mu, cov, days = inputs["moments"]
+    pos = {t: i for i, t in enumerate(tickers)}
+    priced = [t for t in held if t in pos]
+
+    with metrics.span("screen_score"):
+        h = np.array([pos[t] for t in priced])
+        values = np.array([held_values[t] for t in priced])
+        V, a = values.sum(), inputs["added_value"]
+        w = values / V
+        cov_w = cov[:, h] @ w                      # (S w) for every ticker
+        base_var = float(w @ cov_w[h])
+        base_ret = float(mu[h] @ w)
+
+        scored = [t for t in candidates if t in pos]
+        c = np.array([pos[t] for t in scored], dtype=int)
+        total = V + a
+        ret = (V * base_ret + a * mu[c]) / total
+        var = (V * V * base_var + 2 * V * a * cov_w[c] + a * a * cov[c, c]) / (total * total)
+        vol = np.sqrt(np.maximum(var, 0.0))
+        sharpe = np.divide(ret - risk_free, vol, out=np.zeros_like(vol), where=vol > 0)
+
+        # Sector HHI (0..10,000) as /api/diversity reports it: its sector overrides
+        # (gold ETFs, cash), mutual funds left out of the metric
+        sectors = calc_industry_totals([h for h in clean_holdings(holdings) if not h["mutual_fund"]])
+        sector_totals = {row["industry"]: row["value"] for row in sectors["breakdown"]}
+        all_value = sectors["total_value"]
+        base_hhi = calc_hhi(sectors["breakdown"])
+        sum_sq = sum(v * v for v in sector_totals.values())
+        cand_sector_total = np.array([sector_totals.get(_classify_symbol(t)[0] or "Unknown", 0.0) for t in scored])
+        hhi = (sum_sq + 2 * a * cand_sector_total + a * a) / (all_value + a) ** 2 * 10000
+
+    base_vol = float(np.sqrt(max(base_var, 0.0)))
+    base_sharpe = (base_ret - risk_free) / base_vol if base_vol > 0 else 0.0
+
+    key, descending = RANKINGS[inputs["rank_by"]]
+    column = {"sharpe": sharpe, "annual_vol": vol, "hhi": hhi}[key]
+    order = np.argsort(-column if descending else column, kind="stable")[:max(int(top_k), 1)]
+    names = dict(zip(SECURITIES.symbols[::-1], SECURITIES.names[::-1]))  # first occurrence wins
+
+    results = [
+        {
+            "symbol": scored[i],
+            "name": names.get(scored[i], ""),
+            "sector": SECURITIES.sector(scored[i]),
+            "already_held": scored[i] in held_values,
+            "sharpe": round(float(sharpe[i]), 6),
+            "annual_return": round(float(ret[i]), 6),
+            "annual_vol": round(float(vol[i]), 6),
+            "hhi": round(float(hhi[i])),
+            "sharpe_delta": round(float(sharpe[i]) - base_sharpe, 6),
+            "vol_delta": round(float(vol[i]) - base_vol, 6),
+            "hhi_delta": round(float(hhi[i]) - base_hhi),
+        }
+        for i in order
+    ]
+    return {
+        "input": {
+            "added_value": round(a, 2),
+            "period": inputs["period"],
+            "risk_free": risk_free,
+            "sector": inputs["sector"],
+            "rank_by": inputs["rank_by"],
+            "top_k": top_k,
+        },
+        "baseline": {
+            "tickers": priced,
+            "sharpe": round(base_sharpe, 6),
+            "annual_return": round(base_ret, 6),
+            "annual_vol": round(base_vol, 6),
+            "hhi": round(base_hhi),
+        },
+        "screened": len(scored),
+        "skipped": [t for t in candidates if t not in pos],
+        "days": days,
+        "results": results,
+        "timings": {
+            "prices": inputs["timings"]["prices"],
+            "total": round(inputs["timings"]["load"] + (time.perf_counter() - started) * 1000, 2),
+        },
+    }
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    os.environ.setdefault("PRICE_SOURCE", "csv")
+    import price_store
+    from test_stock import simulate_add_stock
+
+    held = sys.argv[1:] or ["MSFT", "AMZN", "NFLX", "IBM"]
+    holdings = [{"symbol": t, "currentValue": f"${10_000 * (i + 1):,.2f}"} for i, t in enumerate(held)]
+    screen = screen_additions(holdings, 5_000.0, top_k=5)
+    print(f"screened {screen['screened']} symbols in {screen['timings']['total']} ms; baseline {screen['baseline']}")
+    for row in screen["results"]:
+        print(row)
+
+    # Cross-check the closed form against the full weight vector on the same covariance
+    from returns_cache import get_moments
+
+    universe = list(dict.fromkeys([*held, *_candidates(None)]))
+    m = get_moments(_covered(price_store.get_close_prices(universe, "1y"), universe, set(held)), "1y")
+    for row in screen["results"]:
+        values = {t: 10_000.0 * (i + 1) for i, t in enumerate(held)}
+        values[row["symbol"]] = values.get(row["symbol"], 0.0) + 5_000.0
+        w = np.array([values.get(t, 0.0) for t in m.tickers]) / sum(values.values())
+        assert abs(np.sqrt(w @ m.cov @ w) - row["annual_vol"]) < 1e-6, row
+    best = screen["results"][0]
+    assert simulate_add_stock(holdings, best["symbol"], 5_000.0)["simulated"]["diversity"]["metrics"]["hhi"] == best["hhi"]
+    print("closed form matches direct computation")
@@ -0,0 +1,108 @@
+import threading
+from typing import Callable, Hashable, Iterable
+
+
+class _Call:
+    __slots__ = ("done", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    In-process request coalescing.
+
+    Callers hand over a set of keys (e.g. tickers); keys that nobody is working
+    on are run by the caller as one batch, keys already in flight are waited on
+    instead of being fetched again.  Per-key counters record how many fetches
+    were issued and how many callers piggybacked on someone else's.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self._stats: dict[Hashable, dict[str, int]] = {}
+
+    def run(self, keys: Iterable[Hashable], fn: Callable[[list], None]) -> list:
+        """
+        Call fn(leading_keys) for the keys not already in flight and block until
+        every other key's in-flight call has finished.
+
+        Returns the keys that were waited on rather than run here; the caller
+        should re-check them, since the call it joined may have covered less
+        than it needed.
+        """
+        lead: list[Hashable] = []
+        joined: list[Hashable] = []
+        waits: dict[int, _Call] = {}
+        own = _Call()
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                stats = self._stats.setdefault(key, {"issued": 0, "coalesced": 0})
+                call = self._calls.get(key)
+                if call is None:
+                    self._calls[key] = own
+                    stats["issued"] += 1
+                    lead.append(key)
+                else:
+                    stats["coalesced"] += 1
+                    joined.append(key)
+                    waits[id(call)] = call
+
+        if lead:
+            try:
+                fn(lead)
+            except BaseException as exc:
+                own.error = exc
+                raise
+            finally:
+                with self._lock:
+                    for key in lead:
+                        if self._calls.get(key) is own:
+                            del self._calls[key]
+                own.done.set()
+
+        for call in waits.values():
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+        return joined
+
+    def stats(self) -> dict[Hashable, dict[str, int]]:
+        with self._lock:
+            return {key: dict(value) for key, value in self._stats.items()}
+
+    def in_flight(self) -> list[Hashable]:
+        with self._lock:
+            return list(self._calls)
+
+
+if __name__ == "__main__":
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import date
+
+    from price_store import PriceStore
+
+    # N concurrent requests for overlapping ticker sets against a slow fetcher
+    fetch_calls: list[list[str]] = []
+
+    def slow_fetcher(tickers: list[str], start: date, end: date):
+        import pandas as pd
+
+        fetch_calls.append(list(tickers))
+        time.sleep(0.5)
+        index = pd.bdate_range(start, end, name="Date")
+        return pd.DataFrame({t: range(1, len(index) + 1) for t in tickers}, index=index, dtype=float)
+
+    store = PriceStore(fetcher=slow_fetcher, today=lambda: date(2025, 6, 30))
+    n = 16
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        frames = list(pool.map(lambda _: store.get_close_prices(["AAPL", "MSFT", "NVDA"], "1y"), range(n)))
+
+    print(f"{n} callers -> {len(fetch_calls)} fetch(es): {fetch_calls}")
+    print(store.fetch_stats())
+    assert len(fetch_calls) == 1
+    assert all(f.equals(frames[0]) for f in frames)
@@ -0,0 +1,200 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+import price_store
+
+# ---------------------------------------------------------------------------
+# Max-Sharpe solutions per portfolio, for optimize-from-holdings
+#
+# The extension re-posts nearly the same holdings on every page scrape.
+# Solutions are memoized by (ticker set, period, risk_free, method,
+# cov_estimator, as-of date of the prices), so an unchanged portfolio is
+# answered without a solve.  Separately, the last optimum of each ticker set
+# (whatever the risk-free rate or day) is kept as a warm start for the next
+# solve.
+#
+# "iterations_saved" is only counted against a like-for-like solve: a memo
+# hit saves the iterations of the solve it memoized, and a solve started from
+# a cached optimum is compared with the last solve of the same ticker set and
+# risk-free rate that had no optimum to start from (its baseline).
+#
+# Memoized solutions are dropped when the price store merges bars for one of
+# their tickers; warm starts and baselines are kept, since yesterday's optimum
+# is still a good place to start.  Each map holds at most max_entries.
+# ---------------------------------------------------------------------------
+
+_SetKey = tuple[tuple[str, ...], str, str, str]                  # tickers, period, method, cov_estimator
+_RateKey = tuple[tuple[str, ...], str, str, str, float]          # ... plus risk_free
+_Key = tuple[tuple[str, ...], str, str, str, float, date | None]  # ... plus as-of
+
+
+class SolutionCache:
+    def __init__(self, max_entries: int | None = None, store: price_store.PriceStore | None = None):
+        if max_entries is None:
+            max_entries = int(os.environ.get("SOLUTION_CACHE_SIZE", "1024"))
+        self.max_entries = max_entries
+        self._store = store
+        self._subscribed: price_store.PriceStore | None = None
+        self._lock = threading.Lock()
+        self._results: OrderedDict[_Key, tuple[dict, int | None]] = OrderedDict()  # result, its iterations
+        self._optima: OrderedDict[_SetKey, dict[str, float]] = OrderedDict()
+        self._baselines: dict[_RateKey, int] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "warm_current": 0,
+            "warm_cached_optimum": 0,
+            "iterations_saved": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def set_key(tickers: list[str], period: str, method: str, cov_estimator: str) -> _SetKey:
+        return tuple(sorted(tickers)), period, method, cov_estimator
+
+    def get(self, set_key: _SetKey, risk_free: float, as_of: date | None) -> tuple[dict, int | None] | None:
+        """(memoized result, iterations its solve took), or None."""
+        self._get_store()
+        key = (*set_key, float(risk_free), as_of)
+        with self._lock:
+            hit = self._results.get(key)
+            if hit is None:
+                self.stats["misses"] += 1
+                return None
+            self._results.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["iterations_saved"] += hit[1] or 0
+            return hit
+
+    def warm_start(self, set_key: _SetKey, tickers: list[str]) -> np.ndarray | None:
+        """The last optimum for this ticker set as weights over `tickers`, if any."""
+        with self._lock:
+            weights = self._optima.get(set_key)
+        if weights is None:
+            return None
+        return np.array([weights.get(t, 0.0) for t in tickers])
+
+    def baseline(self, set_key: _SetKey, risk_free: float) -> int | None:
+        """Iterations of the last solve of this ticker set and rate that did not start from a cached optimum."""
+        with self._lock:
+            return self._baselines.get((*set_key, float(risk_free)))
+
+    def put(
+        self,
+        set_key: _SetKey,
+        risk_free: float,
+        as_of: date | None,
+        result: dict,
+        start: str,
+        iterations: int | None,
+        saved: int | None = None,
+    ) -> None:
+        """Memoize `result`, solved from `start` in `iterations`; `saved` is its saving against baseline(), if any."""
+        self._get_store()
+        with self._lock:
+            self._results[(*set_key, float(risk_free), as_of)] = (result, iterations)
+            self._optima[set_key] = dict(result["weights"])
+            self._optima.move_to_end(set_key)
+            if start != "cached_optimum" and iterations is not None:
+                self._baselines[(*set_key, float(risk_free))] = iterations
+            if start in ("current", "cached_optimum"):
+                self.stats[f"warm_{start}"] += 1
+            self.stats["iterations_saved"] += max(saved or 0, 0)
+            for entries in (self._results, self._optima):
+                while len(entries) > self.max_entries:
+                    entries.popitem(last=False)
+            if len(self._baselines) > self.max_entries:
+                self._baselines = {k: v for k, v in self._baselines.items() if k[:4] in self._optima}
+
+    def invalidate(self, tickers: list[str] | None = None, start: date | None = None, end: date | None = None) -> None:
+        """Drop memoized solutions that contain one of `tickers` (all of them if None)."""
+        with self._lock:
+            names = None if tickers is None else set(tickers)
+            dropped = [k for k in self._results if names is None or names.intersection(k[0])]
+            for key in dropped:
+                del self._results[key]
+            self.stats["invalidations"] += len(dropped)
+
+    def info(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                "solutions": len(self._results),
+                "warm_starts": len(self._optima),
+                "max_entries": self.max_entries,
+            }
+
+    def _get_store(self) -> price_store.PriceStore:
+        store = self._store or price_store.get_store()
+        if store is not self._subscribed:
+            self.invalidate()
+            store.subscribe(self.invalidate)
+            self._subscribed = store
+        return store
+
+
+_default_cache: SolutionCache | None = None
+_default_lock = threading.Lock()
+
+
+def get_cache() -> SolutionCache:
+    """Shared cache over the shared price store; SOLUTION_CACHE_SIZE caps its entries (default 1024)."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = SolutionCache()
+        return _default_cache
+
+
+if __name__ == "__main__":
+    import time
+    from datetime import timedelta
+
+    from optimize import optimize_sharpe_warm
+    from returns_cache import ReturnsCache
+
+    store = price_store.PriceStore.offline()
+    cache = SolutionCache(store=store)
+    tickers = list(price_store.CsvFetcher().frame.columns)[:12]
+    moments = ReturnsCache(store=store).get(tickers, "1y")
+    set_key = cache.set_key(moments.tickers, "1y", "slsqp", "sample")
+    as_of = moments.returns.index[-1].date()
+    current = np.random.default_rng(0).random(len(moments.tickers))
+
+    def solve(rf: float) -> tuple[dict, str]:
+        hit = cache.get(set_key, rf, as_of)
+        if hit is not None:
+            return hit[0], f"memoized ({hit[1]} iterations saved)"
+        starts = {}
+        previous = cache.warm_start(set_key, moments.tickers)
+        if previous is not None:
+            starts["cached_optimum"] = previous
+        starts["current"] = current
+        result = optimize_sharpe_warm(moments.mu, moments.cov, moments.tickers, rf, "slsqp", starts)
+        solve = result.pop("solve")
+        baseline = cache.baseline(set_key, rf) if solve["start"] == "cached_optimum" else None
+        saved = baseline - solve["iterations"] if baseline is not None else None
+        cache.put(set_key, rf, as_of, result, solve["start"], solve["iterations"], saved)
+        return result, f"from {solve['start']} in {solve['iterations']} iterations (saved: {saved})"
+
+    for rf in (0.0, 0.02, 0.02):
+        start = time.perf_counter()
+        result, how = solve(rf)
+        print(f"rf={rf}: sharpe {result['sharpe']} {how}, {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    # A new day for the same portfolio: no memo, but the last optimum as the start,
+    # compared with the solve from the current weights at the same rate
+    as_of += timedelta(days=1)
+    result, how = solve(0.0)
+    print(f"rf=0.0, next day: sharpe {result['sharpe']} {how}")
+    assert "saved: None" not in how
+
+    store.invalidate([moments.tickers[0]])
+    assert cache.get(set_key, 0.0, as_of) is None and cache.warm_start(set_key, moments.tickers) is not None
+    print(cache.info())
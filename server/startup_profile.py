@@ -0,0 +1,63 @@
+"""
+Startup timeline for the API server.
+
+Import this first in main.py so T0 is as close to process start as possible.
+Phases are recorded once (the first time they are marked) and lazily loaded
+modules record how long their first import took, giving an importtime-style
+breakdown without running under `python -X importtime`.
+"""
+import importlib
+import sys
+import threading
+import time
+
+_T0 = time.perf_counter()
+_lock = threading.Lock()
+_phases: dict[str, float] = {}
+_imports: dict[str, float] = {}
+
+
+def _elapsed_ms(since: float = _T0) -> float:
+    return round((time.perf_counter() - since) * 1000, 2)
+
+
+def mark(phase: str) -> None:
+    """Record the first time `phase` is reached, in ms since T0."""
+    if phase in _phases:
+        return
+    with _lock:
+        _phases.setdefault(phase, _elapsed_ms())
+
+
+def timed_import(name: str):
+    """Import `name`, recording its cost if this is the first import in the process."""
+    if name in sys.modules:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    with _lock:
+        _imports.setdefault(name, _elapsed_ms(start))
+    return module
+
+
+def warm_up(modules: list[str]) -> threading.Thread:
+    """Import `modules` on a daemon thread so first requests don't pay for them."""
+
+    def _run():
+        for name in modules:
+            timed_import(name)
+        mark("warmup_complete")
+
+    thread = threading.Thread(target=_run, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def report() -> dict:
+    with _lock:
+        return {
+            "uptime_ms": _elapsed_ms(),
+            "phases_ms": dict(sorted(_phases.items(), key=lambda kv: kv[1])),
+            "imports_ms": dict(_imports),
+            "loaded": {name: name in sys.modules for name in ("numpy", "pandas", "scipy", "yfinance")},
+        }
@@ -0,0 +1,129 @@
+import heapq
+import re
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import Iterable, Iterator
+
+# ---------------------------------------------------------------------------
+# Prebuilt search index over the market reference rows
+#
+# Rows are sorted once by (symbol, name) and referred to by their position in
+# that order, so every posting list is already sorted and merging lists keeps
+# the canonical order.  Symbol prefixes are contiguous ranges of the sorted
+# symbol array (a flattened prefix trie: one bisect per lookup instead of a
+# node per character); name tokens and character trigrams map to posting
+# lists; sectors map to their pre-sorted rows.
+# ---------------------------------------------------------------------------
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class StockSearchIndex:
+    """
+    Ranked, bounded search over rows with "symbol", "name" and "sector" keys.
+
+    Ranking: exact symbol match, then symbol prefix, then a name word starting
+    with the query, then any other substring of "SYMBOL name". Within each
+    tier rows keep (symbol, name) order.
+    """
+
+    def __init__(self, rows: Iterable[dict[str, str]]):
+        self.rows = sorted(rows, key=lambda r: (r["symbol"], r["name"]))
+        self._symbols = [r["symbol"] for r in self.rows]
+        self._haystacks = [f'{r["symbol"]} {r["name"]}'.lower() for r in self.rows]
+        self._sectors = [r["sector"].lower() for r in self.rows]
+
+        self._by_sector: dict[str, list[int]] = {}
+        tokens: dict[str, list[int]] = {}
+        grams: dict[str, list[int]] = {}
+        for i, row in enumerate(self.rows):
+            self._by_sector.setdefault(self._sectors[i], []).append(i)
+            for token in set(_TOKEN_RE.findall(row["name"].lower())):
+                tokens.setdefault(token, []).append(i)
+            for gram in _trigrams(self._haystacks[i]):
+                grams.setdefault(gram, []).append(i)
+
+        self._token_keys = sorted(tokens)
+        self._token_postings = [tokens[t] for t in self._token_keys]
+        self._grams = grams
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def search(self, search: str | None = None, sector: str | None = None, limit: int | None = 200) -> list[dict[str, str]]:
+        query = (search or "").strip().lower()
+        sector_norm = (sector or "").strip().lower()
+        k = limit if limit is not None and limit > 0 else None
+
+        if not query:
+            ids: Iterable[int] = self._by_sector.get(sector_norm, []) if sector_norm else range(len(self.rows))
+            return [self.rows[i] for i in islice(ids, k)]
+
+        ranked = self._ranked(query)
+        if sector_norm:
+            ranked = (i for i in ranked if self._sectors[i] == sector_norm)
+        return [self.rows[i] for i in islice(ranked, k)]
+
+    # ── Tiers ───────────────────────────────────────────────────────────────
+
+    def _ranked(self, query: str) -> Iterator[int]:
+        seen: set[int] = set()
+        tiers = (
+            self._exact_symbol(query),
+            self._symbol_prefix(query),
+            self._name_prefix(query),
+            self._substring(query),
+        )
+        for tier in tiers:
+            for i in tier:
+                if i not in seen:
+                    seen.add(i)
+                    yield i
+
+    def _exact_symbol(self, query: str) -> range:
+        symbol = query.upper()
+        return range(bisect_left(self._symbols, symbol), bisect_right(self._symbols, symbol))
+
+    def _symbol_prefix(self, query: str) -> range:
+        # Every symbol starting with the prefix sorts between it and prefix + U+FFFF
+        prefix = query.upper()
+        return range(bisect_left(self._symbols, prefix), bisect_left(self._symbols, prefix + "\uffff"))
+
+    def _name_prefix(self, query: str) -> Iterator[int]:
+        if not _TOKEN_RE.fullmatch(query):
+            return iter(())
+        lo = bisect_left(self._token_keys, query)
+        hi = bisect_left(self._token_keys, query + "\uffff")
+        postings = self._token_postings[lo:hi]
+        if len(postings) == 1:
+            return iter(postings[0])
+        return _dedupe_sorted(heapq.merge(*postings))
+
+    def _substring(self, query: str) -> Iterator[int]:
+        if len(query) < 3:
+            candidates: Iterable[int] = range(len(self.rows))
+        else:
+            lists = [self._grams.get(g) for g in _trigrams(query)]
+            if any(lst is None for lst in lists):
+                return iter(())
+            lists.sort(key=len)
+            # Walk the rarest trigram's postings lazily; the others are sorted, so bisect
+            candidates = (i for i in lists[0] if all(_contains(lst, i) for lst in lists[1:]))
+        return (i for i in candidates if query in self._haystacks[i])
+
+
+def _contains(sorted_ids: list[int], i: int) -> bool:
+    j = bisect_left(sorted_ids, i)
+    return j < len(sorted_ids) and sorted_ids[j] == i
+
+
+def _dedupe_sorted(ids: Iterable[int]) -> Iterator[int]:
+    last = -1
+    for i in ids:
+        if i != last:
+            yield i
+            last = i
@@ -1,49 +1,28 @@
-import csv
+import contextvars
 import math
-import re
-from pathlib import Path
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any
 
-_CSV_PATH = Path(__file__).parent / "stock_market.csv"
+from currency import parse_currency
+from reference_data import SECURITIES
+from stock_search import StockSearchIndex
+
 _SKIP_SYMBOLS = {"pending activity", "account total", "-", "", "cash", "account:", "grand total"}
 _VALUE_KEYS = ("value", "currentValue", "curVal", "cur_val", "current_value")
 
-
-def _parse_currency(value: Any) -> float:
-    if isinstance(value, (int, float)):
-        return float(value)
-    cleaned = re.sub(r"[^0-9.\-]", "", str(value))
-    try:
-        return float(cleaned)
-    except ValueError:
-        return 0.0
-
-
-def _load_market_rows() -> list[dict[str, str]]:
-    rows: list[dict[str, str]] = []
-    with _CSV_PATH.open("r", encoding="utf-8", newline="") as csv_file:
-        reader = csv.DictReader(csv_file)
-        for row in reader:
-            item = {
-                "name": (row.get("name") or "").strip(),
-                "symbol": (row.get("ticker") or "").strip().upper(),
-                "sector": (row.get("sector") or "").strip(),
-                "industry": (row.get("industry") or "").strip(),
-                "market": (row.get("market") or "").strip(),
-            }
-            if item["symbol"]:
-                rows.append(item)
-    return rows
+# Runs the baseline/simulated optimize and volatility branches of simulate_add_stock
+_BRANCH_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="simulate-add")
 
 
-_MARKET_ROWS = _load_market_rows()
-_SYMBOL_TO_SECTOR = {row["symbol"]: row["sector"] for row in _MARKET_ROWS}
+_MARKET_ROWS = SECURITIES.rows()
+_SEARCH_INDEX = StockSearchIndex(_MARKET_ROWS)
 
 
 def _holding_value(row: dict[str, Any]) -> float:
     for key in _VALUE_KEYS:
         if key in row:
-            return _parse_currency(row.get(key))
+            return parse_currency(row.get(key))
     return 0.0
 
 
@@ -51,7 +30,7 @@ def _clean_for_diversity(raw_holdings: list[dict[str, Any]]) -> list[dict[str, A
     cleaned: list[dict[str, Any]] = []
     for row in raw_holdings:
         symbol = str(row.get("symbol", "") or "").strip().upper()
-        sector = _SYMBOL_TO_SECTOR.get(symbol) or str(row.get("industry", "") or "").strip() or "Unknown"
+        sector = SECURITIES.sector(symbol) or str(row.get("industry", "") or "").strip() or "Unknown"
         value = _holding_value(row)
         if math.isfinite(value) and value >= 0:
             cleaned.append({"industry": sector, "value": value})
@@ -142,44 +121,78 @@ def _extract_weighted_tickers(raw_holdings: list[dict[str, Any]]) -> tuple[list[
     return tickers, symbol_values
 
 
-def _safe_optimize(tickers: list[str], period: str, risk_free: float) -> dict[str, Any]:
+def _safe_optimize(tickers: list[str], risk_free: float, moments: Any) -> dict[str, Any]:
     if len(tickers) < 2:
         return {"error": "Need at least 2 tickers for optimization."}
     try:
-        from optimize import optimize_sharpe
-        return optimize_sharpe(tickers, period=period, risk_free=risk_free)
+        from optimize import optimize_sharpe_moments
+        if isinstance(moments, Exception):
+            raise moments
+        mu, cov, valid = moments
+        return optimize_sharpe_moments(mu, cov, valid, risk_free=risk_free)
     except Exception as exc:
         return {"error": str(exc)}
 
 
-def _safe_volatility(tickers: list[str], period: str) -> dict[str, Any]:
+def _shared_moments(base_tickers: list[str], sim_tickers: list[str], period: str) -> tuple[Any, Any]:
+    """
+    (mu, cov, tickers) for the baseline and simulated ticker sets after a single
+    price fetch. The simulated set is derived from the baseline's cache entry,
+    adding only the new column. A failed side is returned as the exception so
+    its branch can report it.
+    """
+    from price_store import get_store
+    from returns_cache import get_moments
+
+    store = get_store()
+    store.ensure(sim_tickers, *store.period_range(period))
+    sides = []
+    for tickers in (base_tickers, sim_tickers):
+        try:
+            moments = get_moments(tickers, period)
+            sides.append((moments.mu, moments.cov, moments.tickers))
+        except ValueError as exc:
+            sides.append(exc)
+    return sides[0], sides[1]
+
+
+def _closes(tickers: list[str], period: str) -> Any:
+    """(`period`, 5-year) closes for the volatility branch, or the exception fetching them."""
+    if not tickers:
+        return None
+    try:
+        from price_store import get_close_prices
+        return get_close_prices(tickers, period), get_close_prices(tickers, "5y")
+    except Exception as exc:
+        return exc
+
+
+def _submit_branch(fn, *args) -> Future:
+    # Run in a copy of the caller's context so the branch's metric spans reach the caller's request
+    return _BRANCH_POOL.submit(contextvars.copy_context().run, _timed, fn, *args)
+
+
+def _timed(fn, *args, **kwargs) -> tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, round((time.perf_counter() - start) * 1000, 2)
+
+
+def _safe_volatility(tickers: list[str], period: str, closes: Any) -> dict[str, Any]:
     if not tickers:
         return {"error": "No valid tickers for volatility analysis."}
     try:
-        from compute_volatility import analyze_tickers_volatility
-        return analyze_tickers_volatility(tickers, period=period)
+        from compute_volatility import analyze_prices_volatility
+        if isinstance(closes, Exception):
+            raise closes
+        return analyze_prices_volatility(tickers, period, *closes)
     except Exception as exc:
         return {"error": str(exc)}
 
 
 def list_stock_choices(search: str | None = None, sector: str | None = None, limit: int | None = 200) -> list[dict[str, str]]:
-    rows: list[dict[str, str]] = []
-    search_norm = (search or "").strip().lower()
-    sector_norm = (sector or "").strip().lower()
-
-    for item in _MARKET_ROWS:
-        if search_norm:
-            haystack = f'{item["symbol"]} {item["name"]}'.lower()
-            if search_norm not in haystack:
-                continue
-        if sector_norm and item["sector"].lower() != sector_norm:
-            continue
-        rows.append(item)
-
-    rows.sort(key=lambda r: (r["symbol"], r["name"]))
-    if limit is not None and limit > 0:
-        return rows[:limit]
-    return rows
+    """Ranked matches from the prebuilt index: exact symbol, symbol prefix, name word, substring."""
+    return _SEARCH_INDEX.search(search=search, sector=sector, limit=limit)
 
 
 def simulate_add_stock(
@@ -189,14 +202,26 @@ def simulate_add_stock(
     period: str = "1y",
     risk_free: float = 0.0,
 ) -> dict[str, Any]:
+    return simulate_from_inputs(load_simulation(holdings, added_symbol, added_value, period), risk_free)
+
+
+def load_simulation(
+    holdings: list[dict[str, Any]],
+    added_symbol: str,
+    added_value: float,
+    period: str = "1y",
+) -> dict[str, Any]:
+    """
+    The I/O half of simulate_add_stock: validated inputs plus the moments and
+    closes both sides need, through the price store and returns cache.
+    """
     symbol = (added_symbol or "").strip().upper()
     if not symbol:
         raise ValueError("added_symbol is required.")
     if added_value <= 0:
         raise ValueError("added_value must be > 0.")
 
-    valid_symbols = {row["symbol"] for row in _MARKET_ROWS}
-    if symbol not in valid_symbols:
+    if symbol not in SECURITIES:
         raise ValueError(f"{symbol} was not found in stock_market.csv.")
 
     base_holdings = holdings if isinstance(holdings, list) else []
@@ -205,25 +230,62 @@ def simulate_add_stock(
     base_tickers, base_values = _extract_weighted_tickers(base_holdings)
     sim_tickers, sim_values = _extract_weighted_tickers(simulated_holdings)
 
+    started = time.perf_counter()
+    try:
+        base_moments, sim_moments = _shared_moments(base_tickers, sim_tickers, period)
+    except Exception as exc:
+        base_moments = sim_moments = exc
+    base_closes, sim_closes = _closes(base_tickers, period), _closes(sim_tickers, period)
+
+    return {
+        "symbol": symbol,
+        "added_value": float(added_value),
+        "period": period,
+        "baseline": (base_holdings, base_tickers, base_values, base_moments, base_closes),
+        "simulated": (simulated_holdings, sim_tickers, sim_values, sim_moments, sim_closes),
+        "load_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def simulate_from_inputs(inputs: dict[str, Any], risk_free: float = 0.0) -> dict[str, Any]:
+    """The compute half of simulate_add_stock, on what load_simulation returned (no I/O)."""
+    period = inputs["period"]
+    base_holdings, base_tickers, base_values, base_moments, base_closes = inputs["baseline"]
+    simulated_holdings, sim_tickers, sim_values, sim_moments, sim_closes = inputs["simulated"]
+
+    # Baseline and simulated branches are independent: run all four at once so
+    # the request costs roughly as much as the slowest one
+    started = time.perf_counter()
+    branches = {
+        "baseline_optimize": _submit_branch(_safe_optimize, base_tickers, risk_free, base_moments),
+        "baseline_volatility": _submit_branch(_safe_volatility, base_tickers, period, base_closes),
+        "simulated_optimize": _submit_branch(_safe_optimize, sim_tickers, risk_free, sim_moments),
+        "simulated_volatility": _submit_branch(_safe_volatility, sim_tickers, period, sim_closes),
+    }
+    results = {name: future.result() for name, future in branches.items()}
+    timings = {"returns": inputs["load_ms"], **{name: ms for name, (_, ms) in results.items()}}
+    timings["total"] = round(inputs["load_ms"] + (time.perf_counter() - started) * 1000, 2)
+
     return {
         "input": {
-            "added_symbol": symbol,
-            "added_value": round(float(added_value), 2),
+            "added_symbol": inputs["symbol"],
+            "added_value": round(inputs["added_value"], 2),
             "period": period,
             "risk_free": risk_free,
         },
         "baseline": {
             "diversity": format_diversity(base_holdings),
-            "optimize": _safe_optimize(base_tickers, period=period, risk_free=risk_free),
-            "volatility": _safe_volatility(base_tickers, period=period),
+            "optimize": results["baseline_optimize"][0],
+            "volatility": results["baseline_volatility"][0],
             "tickers": base_tickers,
             "value_by_ticker": {k: round(v, 2) for k, v in base_values.items()},
         },
         "simulated": {
             "diversity": format_diversity(simulated_holdings),
-            "optimize": _safe_optimize(sim_tickers, period=period, risk_free=risk_free),
-            "volatility": _safe_volatility(sim_tickers, period=period),
+            "optimize": results["simulated_optimize"][0],
+            "volatility": results["simulated_volatility"][0],
             "tickers": sim_tickers,
             "value_by_ticker": {k: round(v, 2) for k, v in sim_values.items()},
         },
+        "timings_ms": timings,
     }
@@ -0,0 +1,260 @@
+import json
+import math
+import os
+import tempfile
+import threading
+from collections import deque
+from datetime import date
+from pathlib import Path
+
+# ---------------------------------------------------------------------------
+# Incremental volatility state
+#
+# Each ticker keeps its last 121 daily returns in a ring buffer plus running
+# Welford (count, mean, M2) accumulators for the 20- and 120-day windows and a
+# running sum of log(1 + r) for the 20-day compounded return.  A new close is
+# applied in O(1); a second close for the same date (intraday refresh)
+# replaces the day's return instead of appending one.
+#
+# State is persisted as a JSON snapshot plus a journal of per-ticker states:
+# an update appends one line per touched ticker, and the journal is folded
+# into a fresh snapshot every COMPACT_EVERY lines.  Loading reads the
+# snapshot and replays the journal, the last line for a ticker winning.
+# ---------------------------------------------------------------------------
+
+SHORT_WINDOW = 20
+LONG_WINDOW = 120
+_WINDOWS = (SHORT_WINDOW, LONG_WINDOW)
+_RESYNC_EVERY = 1000  # recompute accumulators from the buffer to cap float drift
+COMPACT_EVERY = 1000  # journal lines before they are folded into the snapshot
+
+
+class _Window:
+    __slots__ = ("size", "n", "mean", "m2")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x: float) -> None:
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def remove(self, x: float) -> None:
+        if self.n <= 1:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        old_mean = self.mean
+        self.n -= 1
+        self.mean = old_mean - (x - old_mean) / self.n
+        self.m2 = max(self.m2 - (x - old_mean) * (x - self.mean), 0.0)
+
+    def annualized_std(self) -> float:
+        if self.n < self.size:
+            return math.nan
+        return math.sqrt(self.m2 / (self.n - 1)) * math.sqrt(252)
+
+
+class TickerVolatilityState:
+    """Streaming vol20 / vol120 / ret20 for one ticker."""
+
+    def __init__(self):
+        self.returns: deque[float] = deque(maxlen=LONG_WINDOW + 1)
+        self.windows = {size: _Window(size) for size in _WINDOWS}
+        self.log_sum = 0.0
+        self.last_close: float | None = None
+        self.prev_close: float | None = None
+        self.last_date: date | None = None
+        self._updates = 0
+
+    def update(self, close: float, day: date) -> bool:
+        """Apply a close for `day`. Returns False if the bar was ignored as stale or invalid."""
+        if not (math.isfinite(close) and close > 0):
+            return False
+        if self.last_date is not None and day < self.last_date:
+            return False
+
+        if self.last_date is not None and day == self.last_date:
+            # Same-day refresh: replace today's close and today's return
+            if self.prev_close is not None and self.returns:
+                self._pop_latest()
+                self._push(close / self.prev_close - 1)
+            self.last_close = close
+            return True
+
+        if self.last_close is not None:
+            self._push(close / self.last_close - 1)
+        self.prev_close = self.last_close
+        self.last_close = close
+        self.last_date = day
+        return True
+
+    def signals(self) -> dict:
+        vol20 = self.windows[SHORT_WINDOW].annualized_std()
+        vol120 = self.windows[LONG_WINDOW].annualized_std()
+        ret20 = math.expm1(self.log_sum) if self.windows[SHORT_WINDOW].n == SHORT_WINDOW else math.nan
+        spike = bool(math.isfinite(vol20) and math.isfinite(vol120) and vol20 > 1.5 * vol120)
+        return {
+            "vol20":            round(vol20, 6) if math.isfinite(vol20) else None,
+            "vol120":           round(vol120, 6) if math.isfinite(vol120) else None,
+            "volatility_spike": spike,
+            "spike_direction":  ("up" if ret20 >= 0 else "down") if (spike and math.isfinite(ret20)) else None,
+            "as_of":            self.last_date.isoformat() if self.last_date else None,
+        }
+
+    def _push(self, r: float) -> None:
+        buf = self.returns
+        for size, window in self.windows.items():
+            if len(buf) >= size:
+                window.remove(buf[-size])
+            window.add(r)
+        if len(buf) >= SHORT_WINDOW:
+            self.log_sum -= math.log1p(buf[-SHORT_WINDOW])
+        self.log_sum += math.log1p(r)
+        buf.append(r)
+
+        self._updates += 1
+        if self._updates % _RESYNC_EVERY == 0:
+            self._resync()
+
+    def _pop_latest(self) -> None:
+        buf = self.returns
+        r = buf.pop()
+        for size, window in self.windows.items():
+            window.remove(r)
+            if len(buf) >= size:
+                window.add(buf[-size])
+        self.log_sum -= math.log1p(r)
+        if len(buf) >= SHORT_WINDOW:
+            self.log_sum += math.log1p(buf[-SHORT_WINDOW])
+
+    def _resync(self) -> None:
+        values = list(self.returns)
+        for size, window in self.windows.items():
+            window.n, window.mean, window.m2 = 0, 0.0, 0.0
+            for x in values[-size:]:
+                window.add(x)
+        self.log_sum = sum(math.log1p(x) for x in values[-SHORT_WINDOW:])
+
+    def to_dict(self) -> dict:
+        return {
+            "returns": list(self.returns),
+            "last_close": self.last_close,
+            "prev_close": self.prev_close,
+            "last_date": self.last_date.isoformat() if self.last_date else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TickerVolatilityState":
+        state = cls()
+        state.returns.extend(float(x) for x in data.get("returns", []))
+        state.last_close = data.get("last_close")
+        state.prev_close = data.get("prev_close")
+        state.last_date = date.fromisoformat(data["last_date"]) if data.get("last_date") else None
+        state._resync()
+        return state
+
+
+class VolatilityStream:
+    """
+    Per-ticker streaming state, seeded from price history on first sight of a
+    ticker and persisted as JSON (snapshot + journal) so it survives restarts.
+    """
+
+    def __init__(self, path: Path | str | None = None):
+        self.path = Path(path) if path is not None else None
+        self.journal = self.path.with_name(self.path.name + ".journal") if self.path is not None else None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # serializes journal appends and compaction
+        self._journal_lines = 0
+        self.states: dict[str, TickerVolatilityState] = {}
+        if self.path is not None and (self.path.exists() or self.journal.exists()):
+            self.load()
+
+    def seed(self, ticker: str, closes) -> TickerVolatilityState:
+        """
+        Build a ticker's state from a date-indexed close Series. Seeding runs
+        outside the lock, so if a concurrent update installed the ticker first,
+        that state (with any bar already applied) is kept and returned.
+        """
+        state = TickerVolatilityState()
+        for ts, close in closes.dropna().items():
+            state.update(float(close), ts.date())
+        with self._lock:
+            return self.states.setdefault(ticker, state)
+
+    def update(self, bars: list[dict], history=None) -> dict[str, dict]:
+        """
+        Apply bars ({"ticker", "close", "date"}) and return signals for the touched
+        tickers. `history(tickers)` supplies a close DataFrame for unseen tickers.
+        """
+        unseen = list(dict.fromkeys(b["ticker"] for b in bars if b["ticker"] not in self.states))
+        if unseen and history is not None:
+            frame = history(unseen)
+            for ticker in unseen:
+                if ticker in frame.columns:
+                    self.seed(ticker, frame[ticker])
+
+        touched: dict[str, TickerVolatilityState] = {}
+        with self._lock:
+            for bar in bars:
+                state = self.states.setdefault(bar["ticker"], TickerVolatilityState())
+                state.update(float(bar["close"]), bar["date"])
+                touched[bar["ticker"]] = state
+            result = {ticker: state.signals() for ticker, state in touched.items()}
+            records = {ticker: state.to_dict() for ticker, state in touched.items()}
+        self._append(records)
+        return result
+
+    def signals(self, tickers: list[str] | None = None) -> dict[str, dict]:
+        with self._lock:
+            names = list(self.states) if tickers is None else [t for t in tickers if t in self.states]
+            return {t: self.states[t].signals() for t in names}
+
+    def save(self) -> None:
+        """Write a full snapshot and start an empty journal."""
+        if self.path is None:
+            return
+        with self._save_lock:
+            self._compact()
+
+    def load(self) -> None:
+        payload = json.loads(self.path.read_text()) if self.path.exists() else {}
+        lines = 0
+        if self.journal.exists():
+            with open(self.journal) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn last line from a crash mid-append
+                    payload[record["ticker"]] = record["state"]
+                    lines += 1
+        with self._lock:
+            self.states = {ticker: TickerVolatilityState.from_dict(data) for ticker, data in payload.items()}
+        self._journal_lines = lines
+
+    def _append(self, records: dict[str, dict]) -> None:
+        if self.path is None or not records:
+            return
+        with self._save_lock:
+            with open(self.journal, "a") as f:
+                f.write("".join(json.dumps({"ticker": t, "state": state}) + "\n" for t, state in records.items()))
+            self._journal_lines += len(records)
+            if self._journal_lines >= COMPACT_EVERY:
+                self._compact()
+
+    def _compact(self) -> None:
+        # Caller holds _save_lock, so no journal line lands between the snapshot and the truncation
+        with self._lock:
+            payload = {ticker: state.to_dict() for ticker, state in self.states.items()}
+        # Unique temp name: write-then-rename without racing another writer's temp file
+        with tempfile.NamedTemporaryFile("w", dir=self.path.parent, prefix=self.path.name, suffix=".tmp", delete=False) as f:
+            f.write(json.dumps(payload))
+        os.replace(f.name, self.path)
+        open(self.journal, "w").close()
+        self._journal_lines = 0